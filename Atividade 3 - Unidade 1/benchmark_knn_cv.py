@@ -0,0 +1,53 @@
+"""
+Author: Yolanda Dantas
+Date: apr. 2022.
+Exercise 3, unit 1
+Goal: compare today's single holdout per feature with
+repeated k-fold cross-validation
+
+Run from this folder: python benchmark_knn_cv.py
+"""
+
+import contextlib
+import importlib
+import io
+import time
+
+import matplotlib
+
+matplotlib.use('Agg')
+
+# pylint: disable=wrong-import-position
+from knn_cv import knn_cross_validate
+
+SEEDS = range(1, 11)
+
+
+def main():
+    """Time the holdout and the cross-validation of every feature and
+    print their RMSE side by side."""
+    # the mission script fits its models when imported
+    with contextlib.redirect_stdout(io.StringIO()):
+        mission = importlib.import_module('mission_155_solutions_refactored')
+
+    start = time.perf_counter()
+    holdout = {col: mission.knn_train_test_1(col, 'price', mission.numeric_cars)
+               for col in mission.train_cols}
+    holdout_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cross_validation = {col: knn_cross_validate(col, 'price', mission.numeric_cars, [5],
+                                                n_folds=5, seeds=SEEDS).iloc[0]
+                        for col in mission.train_cols}
+    cv_time = time.perf_counter() - start
+
+    print(f'single holdout, k=5:           {holdout_time * 1000:8.1f} ms')
+    print(f'5-fold x {len(SEEDS)} seeds, k=5:        {cv_time * 1000:8.1f} ms')
+    for col in sorted(holdout, key=lambda name: cross_validation[name]['rmse_mean']):
+        scores = cross_validation[col]
+        print(f"{col:18} holdout {holdout[col]:8.0f}  "
+              f"cv {scores['rmse_mean']:8.0f} +- {scores['rmse_std']:6.0f}")
+
+
+if __name__ == '__main__':
+    main()
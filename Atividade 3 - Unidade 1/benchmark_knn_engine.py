@@ -0,0 +1,78 @@
+"""
+Author: Yolanda Dantas
+Date: apr. 2022.
+Exercise 3, unit 1
+Goal: compare the k sweeps of the mission with knn_engine
+
+Run from this folder: python benchmark_knn_engine.py
+"""
+
+import contextlib
+import functools
+import importlib
+import io
+import time
+
+import matplotlib
+
+matplotlib.use('Agg')
+
+# pylint: disable=wrong-import-position
+from knn_engine import knn_train_test_sweep
+
+
+def load_mission():
+    """Import the mission script, which fits its models when imported,
+    without printing its output."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return importlib.import_module('mission_155_solutions_refactored')
+
+
+def sweep_mission(mission):
+    """Run the k sweeps of the mission with one fit per k."""
+    results = {}
+    for col in mission.train_cols:
+        results[col] = mission.knn_train_test_2(col, 'price', mission.numeric_cars)
+    for nr_best_feats in range(2, 6):
+        results[nr_best_feats] = mission.knn_train_test_4(
+            mission.sorted_features[:nr_best_feats], 'price', mission.numeric_cars)
+    return results
+
+
+def sweep_engine(mission):
+    """Run the same k sweeps with one neighbor search per feature set."""
+    results = {}
+    for col in mission.train_cols:
+        results[col] = knn_train_test_sweep(col, 'price', mission.numeric_cars,
+                                            [1, 3, 5, 7, 9])
+    for nr_best_feats in range(2, 6):
+        results[nr_best_feats] = knn_train_test_sweep(
+            mission.sorted_features[:nr_best_feats], 'price', mission.numeric_cars,
+            list(range(1, 25)))
+    return results
+
+
+def best_time(function, repeat=5):
+    """Return the best wall time of some runs and the last result."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main():
+    """Time both sweeps and check that they give the same results."""
+    mission = load_mission()
+    mission_time, mission_results = best_time(functools.partial(sweep_mission, mission))
+    engine_time, engine_results = best_time(functools.partial(sweep_engine, mission))
+
+    print(f'mission functions: {mission_time * 1000:8.1f} ms')
+    print(f'knn_engine:        {engine_time * 1000:8.1f} ms')
+    print(f'speedup: {mission_time / engine_time:.1f}x')
+    print('identical results:', mission_results == engine_results)
+
+
+if __name__ == '__main__':
+    main()
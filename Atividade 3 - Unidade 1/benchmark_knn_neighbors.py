@@ -0,0 +1,67 @@
+"""
+Author: Yolanda Dantas
+Date: apr. 2022.
+Exercise 3, unit 1
+Goal: compare the neighbor-search backends on numeric_cars
+and on synthetic data 1000 times larger
+
+Run from this folder: python benchmark_knn_neighbors.py
+"""
+
+import time
+
+import numpy as np
+
+from knn_engine import holdout_split
+from knn_neighbors import BACKENDS, build_index, choose_backend, knn_rmse_sweep
+from knn_preprocessing import load_matrix
+
+K_VALUES = list(range(1, 25))
+QUERY_ROWS = 2000
+
+
+def synthetic_cars(matrix, scale, seed=1):
+    """Resample the rows of numeric_cars scale times with a small jitter
+    on the normalized features."""
+    rng = np.random.default_rng(seed)
+    rows = matrix[rng.integers(len(matrix), size=len(matrix) * scale)]
+    rows[:, :-1] += rng.normal(scale=0.01, size=rows[:, :-1].shape)
+    return rows
+
+
+def time_backend(backend, train_x, train_y, test_x, test_y):
+    """Return the build and query times of a backend in milliseconds."""
+    start = time.perf_counter()
+    index = build_index(train_x, backend)
+    built = time.perf_counter()
+    knn_rmse_sweep(index, train_y, test_x, test_y, K_VALUES)
+    return (built - start) * 1000, (time.perf_counter() - built) * 1000
+
+
+def run(name, matrix):
+    """Print the build and query times of every backend per feature count."""
+    train_rows, test_rows = holdout_split(len(matrix))
+    test_rows = test_rows[:QUERY_ROWS]
+    print(f'{name}: {len(train_rows)} training rows, {len(test_rows)} queries, 24 k values')
+    for n_features in (1, 4, 8, 14):
+        train_x = matrix[train_rows, :n_features]
+        test_x = matrix[test_rows, :n_features]
+        timings = [time_backend(backend, train_x, matrix[train_rows, -1],
+                                test_x, matrix[test_rows, -1]) for backend in BACKENDS]
+        print(f'  {n_features:2} features, auto={choose_backend(*train_x.shape):9}',
+              '  '.join(f'{backend} {build:7.1f} + {query:8.1f} ms'
+                        for backend, (build, query) in zip(BACKENDS, timings)))
+
+
+def main():
+    """Compare the backends on numeric_cars and on a synthetic copy 1000 times larger."""
+    cars_matrix = np.asarray(load_matrix()[0])
+    # warm up the first sklearn calls so they do not count for brute force
+    time_backend('brute', cars_matrix[:50, :1], cars_matrix[:50, -1],
+                 cars_matrix[50:60, :1], cars_matrix[50:60, -1])
+    run('numeric_cars', cars_matrix)
+    run('synthetic x1000', synthetic_cars(cars_matrix, 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+"""
+Author: Yolanda Dantas
+Date: apr. 2022.
+Exercise 3, unit 1
+Goal: time the parallel KNN grid search over all feature
+subsets with up to 4 features
+
+Run from this folder: python benchmark_knn_search.py [n_jobs]
+"""
+
+import sys
+import time
+
+from knn_preprocessing import TARGET_COL, load_numeric_cars
+from knn_search import all_subsets, search_grid
+
+
+if __name__ == '__main__':
+    n_jobs = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    numeric_cars = load_numeric_cars()
+    subsets = all_subsets(list(numeric_cars.columns.drop(TARGET_COL)), 4)
+
+    start = time.perf_counter()
+    results = search_grid(numeric_cars, subsets, range(1, 25),
+                          seeds=(1,), n_jobs=n_jobs)
+    elapsed = time.perf_counter() - start
+
+    print(f'{len(subsets)} subsets x 24 k values: {elapsed:.1f} s')
+    print(results.sort_values('rmse').head(10).to_string(index=False))
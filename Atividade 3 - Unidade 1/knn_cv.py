@@ -0,0 +1,63 @@
+"""
+Author: Yolanda Dantas
+Date: apr. 2022.
+Exercise 3, unit 1
+Goal: score the KNN configurations of the mission with
+repeated k-fold cross-validation
+"""
+
+import functools
+
+import numpy as np
+import pandas as pd
+
+from knn_engine import knn_k_sweep
+
+
+@functools.lru_cache(maxsize=None)
+def kfold_indices(n_rows, n_folds=5, seed=1):
+    """Return the (train, test) row positions of each fold for a seed.
+
+    The folds are computed once per (n_rows, n_folds, seed) and kept as
+    read-only integer arrays, so every feature set reuses the same shuffle.
+    """
+    shuffled = np.random.default_rng(seed).permutation(n_rows)
+    folds = []
+    for test_rows in np.array_split(shuffled, n_folds):
+        train_rows = np.setdiff1d(shuffled, test_rows, assume_unique=True)
+        train_rows.flags.writeable = False
+        test_rows.flags.writeable = False
+        folds.append((train_rows, test_rows))
+    return tuple(folds)
+
+
+def cross_validate(features, target, k_values, n_folds=5, seeds=(1,)):
+    """Return the RMSE of every fold and seed for each k value.
+
+    features and target are NumPy arrays; each fold only gathers its own
+    rows, the DataFrame is never shuffled or reindexed. Tied neighbors are
+    broken by training order instead of replaying sklearn's search.
+    """
+    rmses = {k_value: [] for k_value in k_values}
+    for seed in seeds:
+        for train_rows, test_rows in kfold_indices(len(target), n_folds, seed):
+            k_rmses = knn_k_sweep(features[train_rows], target[train_rows],
+                                  features[test_rows], target[test_rows], k_values,
+                                  match_sklearn=False)
+            for k_value, rmse in k_rmses.items():
+                rmses[k_value].append(rmse)
+    return rmses
+
+
+def knn_cross_validate(train_cols, target_col, _df, k_values, n_folds=5, seeds=(1,)):
+    """Run repeated k-fold KNN tests and return the mean and standard
+    deviation of the RMSE for each k value."""
+    if isinstance(train_cols, str):
+        train_cols = [train_cols]
+    features = _df[list(train_cols)].to_numpy(dtype=float)
+    target = _df[target_col].to_numpy(dtype=float)
+
+    rmses = cross_validate(features, target, k_values, n_folds, seeds)
+    return pd.DataFrame({'k': list(rmses),
+                         'rmse_mean': [np.mean(values) for values in rmses.values()],
+                         'rmse_std': [np.std(values) for values in rmses.values()]})
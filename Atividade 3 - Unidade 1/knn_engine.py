@@ -0,0 +1,96 @@
+"""
+Author: Yolanda Dantas
+Date: apr. 2022.
+Exercise 3, unit 1
+Goal: run the KNN k sweeps of the mission with one
+neighbor search per feature set and split
+"""
+
+import numpy as np
+from sklearn.neighbors import KDTree, KNeighborsRegressor
+
+
+def holdout_split(n_rows, seed=1):
+    """Return the train and test row positions used by knn_train_test_N.
+
+    np.random.permutation of the index labels shuffles the same way as
+    a permutation of the row positions, so the split is identical.
+    """
+    np.random.seed(seed)
+    shuffled = np.random.permutation(n_rows)
+    last_train_row = int(n_rows / 2)
+    return shuffled[:last_train_row], shuffled[last_train_row:]
+
+
+def sorted_neighbors(train_x, test_x):
+    """Return the training rows sorted by distance to each test row
+    and the matching squared distances, ties kept in training order."""
+    distances = ((test_x[:, np.newaxis, :] - train_x[np.newaxis, :, :]) ** 2).sum(axis=2)
+    order = np.argsort(distances, axis=1, kind='stable')
+    return order, np.take_along_axis(distances, order, axis=1)
+
+
+def tied_rows(distances, k_value):
+    """Return a mask of the test rows whose k-th and (k+1)-th neighbors
+    are at the same distance, so they have no unique set of k neighbors."""
+    if k_value >= distances.shape[1]:
+        return np.zeros(len(distances), dtype=bool)
+    return np.isclose(distances[:, k_value - 1], distances[:, k_value],
+                      rtol=1e-9, atol=1e-12)
+
+
+def sklearn_neighbors(train_x, train_y, query_x, k_value, searchers):
+    """Return the k neighbors KNeighborsRegressor(n_neighbors=k) picks.
+
+    With its default 'auto' algorithm it searches a KD-tree (leaf_size=30)
+    while there are at most 15 features and k is below half of the
+    training rows, and uses brute force otherwise. Querying the same
+    structure, built once and kept in searchers, gives the same ties.
+    """
+    if train_x.shape[1] <= 15 and k_value < len(train_y) // 2:
+        if 'kd_tree' not in searchers:
+            searchers['kd_tree'] = KDTree(train_x, leaf_size=30)
+        return searchers['kd_tree'].query(query_x, k=k_value, return_distance=False)
+    if 'brute' not in searchers:
+        searchers['brute'] = KNeighborsRegressor(n_neighbors=k_value).fit(train_x, train_y)
+    return searchers['brute'].kneighbors(query_x, n_neighbors=k_value, return_distance=False)
+
+
+def knn_k_sweep(train_x, train_y, test_x, test_y, k_values,  # pylint: disable=too-many-arguments
+                match_sklearn=True):
+    """Return the RMSE of a KNN regressor for every k value.
+
+    Predictions for all k come from the cumulative sums of the sorted
+    neighbor targets. With match_sklearn, test rows with tied neighbors
+    are predicted with the neighbors KNeighborsRegressor itself picks, so
+    the results match knn_train_test_2 and knn_train_test_4; otherwise
+    ties go to the first training rows.
+    """
+    order, distances = sorted_neighbors(train_x, test_x)
+    neighbor_sums = np.cumsum(train_y[order[:, :max(k_values)]], axis=1)
+
+    searchers = {}
+    k_rmses = {}
+    for k_value in k_values:
+        predicted_labels = neighbor_sums[:, k_value - 1] / k_value
+
+        tied = tied_rows(distances, k_value) if match_sklearn else None
+        if tied is not None and tied.any():
+            neighbors = sklearn_neighbors(train_x, train_y, test_x[tied], k_value, searchers)
+            predicted_labels[tied] = np.mean(train_y[neighbors], axis=1)
+
+        # Same reduction as mean_squared_error, without its input checks.
+        k_rmses[k_value] = np.sqrt(np.mean((test_y - predicted_labels) ** 2))
+    return k_rmses
+
+
+def knn_train_test_sweep(train_cols, target_col, _df, k_values, seed=1):
+    """Run KNN test for every k value on the mission holdout split
+    and return the RMSE, like knn_train_test_2 and knn_train_test_4."""
+    if isinstance(train_cols, str):
+        train_cols = [train_cols]
+    features = _df[list(train_cols)].to_numpy(dtype=float)
+    target = _df[target_col].to_numpy(dtype=float)
+    train_rows, test_rows = holdout_split(len(_df), seed)
+    return knn_k_sweep(features[train_rows], target[train_rows],
+                       features[test_rows], target[test_rows], k_values)
@@ -0,0 +1,62 @@
+"""
+Author: Yolanda Dantas
+Date: apr. 2022.
+Exercise 3, unit 1
+Goal: build the neighbor-search index of a training split
+once and reuse it for every k value and test batch
+"""
+
+import numpy as np
+from sklearn.neighbors import NearestNeighbors
+
+BACKENDS = ('brute', 'kd_tree', 'ball_tree')
+
+
+def choose_backend(n_rows, n_features):
+    """Pick the neighbor-search backend for a training split.
+
+    Small splits are fastest with brute force. Up to 15 features the
+    KD-tree wins on numeric_cars-like data (benchmark_knn_neighbors.py);
+    above that it stops pruning, and only very large splits still gain
+    from a ball tree.
+    """
+    if n_rows < 1000:
+        return 'brute'
+    if n_features <= 15:
+        return 'kd_tree'
+    if n_rows >= 50000:
+        return 'ball_tree'
+    return 'brute'
+
+
+def build_index(train_x, backend='auto'):
+    """Fit the neighbor-search index of a training split.
+
+    backend is one of BACKENDS, or 'auto' to let choose_backend decide.
+    """
+    train_x = np.asarray(train_x, dtype=float)
+    if backend == 'auto':
+        backend = choose_backend(*train_x.shape)
+    if backend not in BACKENDS:
+        raise ValueError(f'Unknown neighbor-search backend: {backend}')
+    return NearestNeighbors(algorithm=backend, leaf_size=30).fit(train_x)
+
+
+def knn_predict_sweep(index, train_y, test_x, k_values):
+    """Return the predictions of every k value for a test batch.
+
+    The index is queried once for the largest k; the prediction for each k
+    is the mean of the k nearest targets, taken from cumulative sums.
+    """
+    neighbors = index.kneighbors(np.asarray(test_x, dtype=float),
+                                 n_neighbors=max(k_values), return_distance=False)
+    neighbor_sums = np.cumsum(np.asarray(train_y)[neighbors], axis=1)
+    return {k_value: neighbor_sums[:, k_value - 1] / k_value for k_value in k_values}
+
+
+def knn_rmse_sweep(index, train_y, test_x, test_y, k_values):
+    """Return the RMSE of every k value for a test batch, like knn_k_sweep
+    but for splits too large to sort every training row."""
+    predictions = knn_predict_sweep(index, train_y, test_x, k_values)
+    return {k_value: np.sqrt(np.mean((test_y - predicted_labels) ** 2))
+            for k_value, predicted_labels in predictions.items()}
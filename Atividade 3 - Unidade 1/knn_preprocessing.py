@@ -0,0 +1,112 @@
+"""
+Author: Yolanda Dantas
+Date: apr. 2022.
+Exercise 3, unit 1
+Goal: fit the cleaning and normalization of imports-85 once,
+apply it to new cars and cache the result as memory-mapped
+.npy files
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+FOLDER = os.path.dirname(os.path.abspath(__file__))
+DATA_PATH = os.path.join(FOLDER, 'imports-85.data')
+CACHE_FOLDER = os.path.join(FOLDER, '.cache')
+
+COLS = ['symboling', 'normalized-losses', 'make', 'fuel-type',
+        'aspiration', 'num-of-doors', 'body-style', 'drive-wheels',
+        'engine-location', 'wheel-base', 'length', 'width', 'height',
+        'curb-weight', 'engine-type', 'num-of-cylinders', 'engine-size',
+        'fuel-system', 'bore', 'stroke', 'compression-rate', 'horsepower',
+        'peak-rpm', 'city-mpg', 'highway-mpg', 'price']
+
+# Select only the columns with continuous values from -
+# https://archive.ics.uci.edu/ml/machine-learning-databases/autos/imports-85.names
+CONTINUOUS_VALUES_COLS = ['normalized-losses', 'wheel-base', 'length',
+                          'width', 'height', 'curb-weight', 'engine-size',
+                          'bore', 'stroke', 'compression-rate', 'horsepower',
+                          'peak-rpm', 'city-mpg', 'highway-mpg', 'price']
+TARGET_COL = 'price'
+
+
+def to_numeric(cars):
+    """Keep the continuous columns as floats, with '?' as NaN."""
+    return cars[CONTINUOUS_VALUES_COLS].replace('?', np.nan).astype('float')
+
+
+def fit_preprocessing(cars):
+    """Learn the imputation means and the min/max used to normalize.
+
+    Follows the mission: rows without price are dropped first, the means
+    are taken from the remaining rows and the min/max after imputation.
+    """
+    numeric_cars = to_numeric(cars).dropna(subset=[TARGET_COL])
+    means = numeric_cars.mean()
+    numeric_cars = numeric_cars.fillna(means)
+    return {'columns': CONTINUOUS_VALUES_COLS,
+            'means': means.tolist(),
+            'mins': numeric_cars.min().tolist(),
+            'maxs': numeric_cars.max().tolist()}
+
+
+def transform(cars, params):
+    """Impute and normalize a batch of cars with fitted parameters.
+
+    Every column except the target ends up in the 0 to 1 range of the
+    training data; the target is kept as it is (NaN for unknown prices).
+    """
+    numeric_cars = to_numeric(cars)
+    means = pd.Series(params['means'], index=params['columns'])
+    mins = pd.Series(params['mins'], index=params['columns'])
+    maxs = pd.Series(params['maxs'], index=params['columns'])
+
+    price_col = numeric_cars[TARGET_COL]
+    numeric_cars = numeric_cars.fillna(means.drop(TARGET_COL))
+    numeric_cars = (numeric_cars - mins) / (maxs - mins)
+    numeric_cars[TARGET_COL] = price_col
+    return numeric_cars
+
+
+def file_hash(path):
+    """Return the sha256 of a file."""
+    with open(path, 'rb') as data_file:
+        return hashlib.sha256(data_file.read()).hexdigest()
+
+
+def load_matrix(data_path=DATA_PATH, cache_folder=CACHE_FOLDER):
+    """Return the cleaned numeric_cars matrix and the fitted parameters.
+
+    The matrix (continuous columns, price last) is saved as .npy under a
+    folder named after the hash of the data file and memory-mapped on the
+    next runs, so pandas only parses the file when it changes.
+    """
+    folder = os.path.join(cache_folder, file_hash(data_path))
+    matrix_path = os.path.join(folder, 'numeric_cars.npy')
+    params_path = os.path.join(folder, 'params.json')
+
+    if not os.path.exists(matrix_path):
+        cars = pd.read_csv(data_path, names=COLS)
+        params = fit_preprocessing(cars)
+        numeric_cars = transform(cars, params).dropna(subset=[TARGET_COL])
+        os.makedirs(folder, exist_ok=True)
+        with open(params_path, 'w', encoding='utf-8') as params_file:
+            json.dump(params, params_file)
+        # the matrix is written last and renamed, so a half-written cache
+        # is never mistaken for a complete one
+        np.save(matrix_path + '.tmp.npy', numeric_cars.to_numpy())
+        os.replace(matrix_path + '.tmp.npy', matrix_path)
+
+    with open(params_path, encoding='utf-8') as params_file:
+        params = json.load(params_file)
+    return np.load(matrix_path, mmap_mode='r'), params
+
+
+def load_numeric_cars(data_path=DATA_PATH, cache_folder=CACHE_FOLDER):
+    """Return numeric_cars as in the mission, read from the cache."""
+    matrix, params = load_matrix(data_path, cache_folder)
+    return pd.DataFrame(matrix, columns=params['columns'], copy=False)
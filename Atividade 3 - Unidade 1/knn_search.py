@@ -0,0 +1,85 @@
+"""
+Author: Yolanda Dantas
+Date: apr. 2022.
+Exercise 3, unit 1
+Goal: search feature subsets, k values and seeds of the
+KNN mission in parallel
+"""
+
+import itertools
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from knn_engine import holdout_split, knn_k_sweep
+
+# Arrays of the current worker process, set by _attach_data.
+_DATA = {}
+
+
+def all_subsets(columns, max_size):
+    """Return every subset of the columns with 1 to max_size columns."""
+    return [subset for size in range(1, max_size + 1)
+            for subset in itertools.combinations(columns, size)]
+
+
+def _attach_data(features_path, target_path):
+    """Memory-map the arrays saved by search_grid in a worker process."""
+    _DATA['features'] = np.load(features_path, mmap_mode='r')
+    _DATA['target'] = np.load(target_path, mmap_mode='r')
+
+
+def _run_batch(batch, k_values):
+    """Run the k sweep of each (column positions, seed) pair of a batch
+    and return one row per k value."""
+    features = _DATA['features']
+    target = _DATA['target']
+    rows = []
+    for positions, seed in batch:
+        train_rows, test_rows = holdout_split(len(target), seed)
+        subset = features[:, positions]
+        k_rmses = knn_k_sweep(subset[train_rows], target[train_rows],
+                              subset[test_rows], target[test_rows], k_values)
+        rows.extend((positions, seed, k_value, rmse) for k_value, rmse in k_rmses.items())
+    return rows
+
+
+def _batches(tasks, n_jobs):
+    """Split the tasks in about four batches per worker, like joblib's
+    automatic batching, so the pool overhead is paid per batch."""
+    batch_size = max(1, len(tasks) // (4 * n_jobs))
+    return [tasks[start:start + batch_size] for start in range(0, len(tasks), batch_size)]
+
+
+def search_grid(_df, subsets, k_values, seeds=(1,), target_col='price', n_jobs=None):
+    """Run the KNN holdout test for every feature subset, k value and seed
+    in a process pool and return a tidy table with one row per RMSE.
+
+    The feature matrix is saved once as .npy and memory-mapped by the
+    workers, so no copy of numeric_cars is pickled per task.
+    """
+    n_jobs = n_jobs or os.cpu_count()
+    columns = list(_df.columns)
+    subsets = [[subset] if isinstance(subset, str) else list(subset) for subset in subsets]
+    tasks = [([columns.index(col) for col in subset], seed)
+             for subset in subsets for seed in seeds]
+
+    with tempfile.TemporaryDirectory() as folder:
+        features_path = os.path.join(folder, 'features.npy')
+        target_path = os.path.join(folder, 'target.npy')
+        np.save(features_path, _df.to_numpy(dtype=float))
+        np.save(target_path, _df[target_col].to_numpy(dtype=float))
+
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_attach_data,
+                                 initargs=(features_path, target_path)) as executor:
+            batches = executor.map(_run_batch, _batches(tasks, n_jobs),
+                                   itertools.repeat(list(k_values)))
+            rows = [row for batch in batches for row in batch]
+
+    return pd.DataFrame(
+        [(tuple(columns[i] for i in positions), len(positions), seed, k_value, rmse)
+         for positions, seed, k_value, rmse in rows],
+        columns=['features', 'n_features', 'seed', 'k', 'rmse'])
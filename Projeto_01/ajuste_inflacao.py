@@ -0,0 +1,207 @@
+"""
+Autor: Matheus Silva
+Data: Maio 2022
+Este módulo ajusta os preços da gasolina pela inflação
+a partir da série mensal do IPCA (IBGE, tabela 1737 do
+SIDRA), em vez da coluna Preco_Atualizado calculada à
+mão no excel.
+
+O número-índice é o produto acumulado das variações
+mensais, calculado de uma vez com numpy; quando chegam
+meses novos, eles são encadeados a partir do último
+índice guardado, sem recalcular a série inteira. Os
+preços são levados para qualquer mês de referência
+dividindo o índice da referência pelo índice do mês
+de cada preço.
+
+Uso (baixa os meses novos do IPCA e regrava os preços
+ajustados para abril de 2022):
+    python ajuste_inflacao.py --baixar --referencia 2022-04
+"""
+import argparse
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from series_tempo import ler_serie
+
+URL_SIDRA = "https://apisidra.ibge.gov.br/values/t/1737/n1/all/v/63/p/{periodos}"
+CAMINHO_IPCA = "data/ipca-mensal.csv"
+CAMINHO_GASOLINA = "data/gasolina_precos-2004-2021.csv"
+CAMINHO_ATUALIZADOS = "data/gasolina_precos_atualizada-2004-2021.csv"
+REFERENCIA = "2022-04"
+COLUNAS_IPCA = ["Tempo", "Variacao", "Indice"]
+
+def indice_acumulado(variacoes, base=1.0):
+    """Number index of a run of monthly variations.
+    Args:
+        variacoes (array): monthly variations in percent.
+        base (float): index of the month before the first variation.
+    Return:
+        ndarray: index at the end of each month.
+    """
+    return base * np.cumprod(1 + np.asarray(variacoes, dtype=float) / 100)
+
+def estender_indice(df_ipca, df_novos):
+    """Append months to the IPCA series, chaining their index from the
+    last month already in it.
+    Args:
+        df_ipca (DataFrame): "Tempo", "Variacao" and "Indice", sorted by month.
+        df_novos (DataFrame): "Tempo" and "Variacao" of the months to add;
+            months already in df_ipca are ignored.
+    Return:
+        df_ipca (DataFrame): the extended series.
+    """
+    if not df_ipca.empty:
+        df_novos = df_novos[df_novos["Tempo"] > df_ipca["Tempo"].iloc[-1]]
+    base = df_ipca["Indice"].iloc[-1] if not df_ipca.empty else 1.0
+    df_novos = df_novos.sort_values("Tempo")
+    df_novos = df_novos.assign(Indice=indice_acumulado(df_novos["Variacao"], base))
+    return pd.concat([df_ipca, df_novos[["Tempo", "Variacao", "Indice"]]], ignore_index=True)
+
+def serie_vazia():
+    """IPCA series without months."""
+    return pd.DataFrame({"Tempo": pd.Series(dtype="datetime64[ns]"),
+                         "Variacao": pd.Series(dtype=float),
+                         "Indice": pd.Series(dtype=float)})
+
+def ler_ipca(caminho=CAMINHO_IPCA):
+    """Read the saved monthly IPCA series.
+    Args:
+        caminho (str): csv with "Tempo" (month) and "Variacao" (percent),
+            and "Indice" when written by atualizar_ipca.
+    Return:
+        df_ipca (DataFrame): "Tempo", "Variacao" and "Indice", sorted by month.
+    """
+    df_ipca = pd.read_csv(caminho, parse_dates=["Tempo"]).sort_values("Tempo", ignore_index=True)
+    if "Indice" not in df_ipca.columns:
+        df_ipca["Indice"] = indice_acumulado(df_ipca["Variacao"])
+    return df_ipca
+
+def baixar_variacoes(inicio=None, sessao=None):
+    """Monthly IPCA variations from the IBGE SIDRA api.
+    Args:
+        inicio (Timestamp): first month to download, the whole series when None.
+        sessao (Session): http session, a new one is created when None.
+    Return:
+        df_novos (DataFrame): "Tempo" (first day of the month) and "Variacao".
+    """
+    # o requests só é importado quando há download, o app.py não precisa dele
+    from baixar_serie_historica import TIMEOUT, criar_sessao # pylint: disable=import-outside-toplevel
+
+    periodos = "all" if inicio is None else \
+               f"{inicio:%Y%m}-{pd.Timestamp.today():%Y%m}"
+    resposta = (sessao or criar_sessao()).get(URL_SIDRA.format(periodos=periodos),
+                                              timeout=TIMEOUT)
+    resposta.raise_for_status()
+    cabecalho, *linhas = resposta.json()
+    chave_mes = next(chave for chave, rotulo in cabecalho.items() if rotulo == "Mês (Código)")
+    df_novos = pd.DataFrame({
+        "Tempo": pd.to_datetime([linha[chave_mes] for linha in linhas], format="%Y%m"),
+        # meses sem valor publicado vêm como "..." ou "-"
+        "Variacao": pd.to_numeric([linha["V"] for linha in linhas], errors="coerce")})
+    return df_novos.dropna()
+
+def atualizar_ipca(caminho=CAMINHO_IPCA, sessao=None):
+    """Download the months after the last saved one and append them.
+    Args:
+        caminho (str): csv with the monthly IPCA series.
+        sessao (Session): http session, a new one is created when None.
+    Return:
+        df_ipca (DataFrame): the updated series.
+    """
+    try:
+        df_ipca = ler_ipca(caminho)
+    except FileNotFoundError:
+        logging.info("%s not found, downloading the whole IPCA series", caminho)
+        df_ipca = serie_vazia()
+
+    inicio = None if df_ipca.empty else df_ipca["Tempo"].iloc[-1] + pd.DateOffset(months=1)
+    tamanho = len(df_ipca)
+    df_ipca = estender_indice(df_ipca, baixar_variacoes(inicio, sessao))
+    if tamanho and list(pd.read_csv(caminho, nrows=0).columns) == COLUNAS_IPCA:
+        # meses novos no fim da série: basta acrescentar as linhas ao arquivo
+        df_ipca.iloc[tamanho:].to_csv(caminho, mode="a", header=False, index=False,
+                                      date_format="%Y-%m-%d")
+    else:
+        # arquivo novo, ou salvo só com "Tempo" e "Variacao": regrava com o índice
+        df_ipca[COLUNAS_IPCA].to_csv(caminho, index=False, date_format="%Y-%m-%d")
+    return df_ipca
+
+def fatores(df_ipca, tempos, referencia=REFERENCIA):
+    """Deflators that bring prices of some dates to a reference month.
+    Args:
+        df_ipca (DataFrame): series returned by ler_ipca.
+        tempos (array): dates of the prices; each one takes the index of
+            its month.
+        referencia (str): reference month, e.g. "2022-04".
+    Return:
+        ndarray: index of the reference over the index of each date.
+    Raise:
+        ValueError: when a date or the reference is outside the series.
+    """
+    meses = df_ipca["Tempo"].to_numpy()
+    indice = df_ipca["Indice"].to_numpy()
+    datas = np.append(pd.to_datetime(tempos).to_numpy(), pd.Timestamp(referencia).to_datetime64())
+    posicoes = np.searchsorted(meses, datas, side="right") - 1
+    ultimo_mes = meses[-1] + np.timedelta64(31, "D") if len(meses) else None
+    if len(meses) == 0 or posicoes.min() < 0 or datas.max() >= ultimo_mes:
+        raise ValueError("Datas fora da série do IPCA")
+    return indice[posicoes[-1]] / indice[posicoes[:-1]]
+
+def ajustar_precos(df_precos, df_ipca, referencia=REFERENCIA, coluna="Preco_Media"):
+    """Prices adjusted by the IPCA to a reference month, in one pass.
+    Args:
+        df_precos (DataFrame): price column, indexed by date (series_tempo.py).
+        df_ipca (DataFrame): series returned by ler_ipca.
+        referencia (str): reference month, e.g. "2022-04".
+        coluna (str): price column.
+    Return:
+        df_precos (DataFrame): the prices plus "Preco_Atualizado".
+    """
+    return df_precos.assign(Preco_Atualizado=(
+        df_precos[coluna] * fatores(df_ipca, df_precos.index, referencia)).round(2))
+
+def conferir_precos(df_ajustados, caminho=CAMINHO_ATUALIZADOS):
+    """Compare adjusted prices with the ones saved in a file, e.g. the
+    Preco_Atualizado column calculated in excel.
+    Args:
+        df_ajustados (DataFrame): prices returned by ajustar_precos.
+        caminho (str): csv with "Tempo" and "Preco_Atualizado".
+    Return:
+        df_diferencas (DataFrame): saved and computed "Preco_Atualizado"
+        and their "Diferenca", per date present in both.
+    """
+    df_salvos = ler_serie(caminho)[["Preco_Atualizado"]]
+    df_diferencas = df_salvos.join(df_ajustados[["Preco_Atualizado"]], how="inner",
+                                   lsuffix="_Salvo", rsuffix="_Calculado")
+    return df_diferencas.assign(Diferenca=(df_diferencas["Preco_Atualizado_Calculado"] -
+                                           df_diferencas["Preco_Atualizado_Salvo"]).round(2))
+
+def main():
+    """Update the IPCA series and rewrite the adjusted prices file."""
+    parser = argparse.ArgumentParser(description="Preços da gasolina ajustados pelo IPCA.")
+    parser.add_argument("--baixar", action="store_true",
+                        help="baixa do SIDRA os meses do IPCA que ainda não estão salvos")
+    parser.add_argument("--referencia", default=REFERENCIA, help="mês de referência, AAAA-MM")
+    parser.add_argument("--ipca", default=CAMINHO_IPCA)
+    parser.add_argument("--precos", default=CAMINHO_GASOLINA)
+    parser.add_argument("--saida", default=CAMINHO_ATUALIZADOS)
+    parser.add_argument("--conferir", action="store_true",
+                        help="compara os preços calculados com os da saída antes de regravá-la")
+    args = parser.parse_args()
+
+    df_ipca = atualizar_ipca(args.ipca) if args.baixar or not os.path.exists(args.ipca) \
+              else ler_ipca(args.ipca)
+    df_ajustados = ajustar_precos(ler_serie(args.precos), df_ipca, args.referencia)
+    if args.conferir and os.path.exists(args.saida):
+        df_diferencas = conferir_precos(df_ajustados, args.saida)
+        print(df_diferencas.to_string())
+        print(f"Maior diferença: R${df_diferencas['Diferenca'].abs().max():.2f}")
+    df_ajustados.to_csv(args.saida, date_format="%Y-%m-%d")
+    print(f"Preços ajustados para {args.referencia} gravados em {args.saida}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Autor: Matheus Silva
+Data: Maio 2022
+Este módulo calcula as anotações dos gráficos matplotlib
+do app.py a partir das séries carregadas, em vez de
+valores e coordenadas digitados à mão: os pontos de
+destaque (início, picos, mínimo, último valor e extremos
+de cada período) saem de reduções vetorizadas com numpy,
+e cada rótulo é ancorado no próprio ponto, com um
+deslocamento em pontos tipográficos que depende só do
+tipo do destaque.
+
+Como as anotações são calculadas dentro das funções que
+desenham as figuras, elas ficam no mesmo cache do PNG
+(render_png) e são refeitas sozinhas quando os dados mudam.
+"""
+import numpy as np
+import pandas as pd
+
+from periodos import MANDATOS, extremos, fatias
+
+# deslocamento do rótulo em relação ao ponto (x e y, em pontos) e alinhamento horizontal
+POSICOES = {"inicio": (0, -12, "center"),
+            "pico": (0, 12, "center"),
+            "maximo": (0, 12, "center"),
+            "minimo": (0, -12, "center"),
+            "fim": (-8, 0, "right")}
+COLUNAS_DESTAQUES = ["Tempo", "Valor", "Tipo", "Deslocamento_X", "Deslocamento_Y",
+                     "Alinhamento"]
+
+def formatar_real(valor):
+    """Valor em reais no formato brasileiro, e.g. "R$6,41"."""
+    return f"R${valor:.2f}".replace(".", ",")
+
+def formatar_percentual(valor):
+    """Percentual no formato brasileiro, e.g. "14,64%"."""
+    return f"{valor:.2f}%".replace(".", ",")
+
+def posicionar(df_destaques, posicoes=None):
+    """Label offset and alignment of each highlighted point, from its type.
+    Args:
+        df_destaques (DataFrame): "Tempo", "Valor" and "Tipo" (a key of POSICOES).
+        posicoes (dict): types whose placement differs from POSICOES, e.g.
+            to keep apart the labels of two series drawn on twin axes.
+    Return:
+        df_destaques (DataFrame): COLUNAS_DESTAQUES.
+    """
+    posicoes = {**POSICOES, **(posicoes or {})}
+    deslocamento_x, deslocamento_y, alinhamento = \
+        zip(*df_destaques["Tipo"].map(posicoes)) if len(df_destaques) else ((), (), ())
+    return df_destaques.assign(Deslocamento_X=list(deslocamento_x),
+                               Deslocamento_Y=list(deslocamento_y),
+                               Alinhamento=list(alinhamento))
+
+def picos(valores):
+    """Interior points strictly above both neighbours.
+    Args:
+        valores (array): values in time order.
+    Return:
+        ndarray: boolean mask of the local maxima.
+    """
+    valores = np.asarray(valores, dtype=float)
+    mascara = np.zeros(len(valores), dtype=bool)
+    mascara[1:-1] = (valores[1:-1] > valores[:-2]) & (valores[1:-1] > valores[2:])
+    return mascara
+
+def destaques(df_serie, coluna, n_picos=0, pontas=("fim",), posicoes=None):
+    """Points of a series worth a label, already positioned.
+    Args:
+        df_serie (DataFrame): series indexed by sorted dates.
+        coluna (str): column to annotate; missing values are skipped.
+        n_picos (int): highest local maxima to label.
+        pontas (tuple): other points to label, among "inicio" (first
+            value), "minimo" (global minimum) and "fim" (last value).
+        posicoes (dict): placement overrides, see posicionar.
+    Return:
+        df_destaques (DataFrame): COLUNAS_DESTAQUES in time order; a point
+        chosen twice keeps the type of the later rule (e.g. "fim" over "pico").
+    """
+    serie = df_serie[coluna].dropna()
+    if serie.empty:
+        return pd.DataFrame(columns=COLUNAS_DESTAQUES)
+    valores = serie.to_numpy(dtype=float)
+    tipos = {0: "inicio"} if "inicio" in pontas else {}
+    candidatos = np.flatnonzero(picos(valores))
+    for posicao in candidatos[np.argsort(-valores[candidatos], kind="stable")][:n_picos]:
+        tipos[int(posicao)] = "pico"
+    if "minimo" in pontas:
+        tipos[int(np.argmin(valores))] = "minimo"
+    if "fim" in pontas:
+        tipos[len(valores) - 1] = "fim"
+    linhas = np.array(sorted(tipos), dtype="int64")
+    return posicionar(pd.DataFrame({"Tempo": serie.index[linhas], "Valor": valores[linhas],
+                                    "Tipo": [tipos[linha] for linha in linhas]}), posicoes)
+
+def destaques_periodos(df_serie, coluna, periodos=MANDATOS):
+    """Maximum and minimum of each period, already positioned.
+    The labels grow away from the middle of their period, leaving room
+    for the period name, and inwards at the two ends of the series.
+    Args:
+        df_serie (DataFrame): series indexed by sorted dates.
+        coluna (str): column to annotate.
+        periodos (DataFrame): "Periodo", "Inicio" and "Fim", sorted by "Inicio".
+    Return:
+        df_destaques (DataFrame): "Periodo" and COLUNAS_DESTAQUES, the
+        maximum and the minimum of each period with rows.
+    """
+    df_extremos = extremos(df_serie, coluna, periodos)
+    meios = pd.Series({nome: fatia.index[len(fatia) // 2]
+                       for nome, fatia in fatias(df_serie, periodos).items() if len(fatia)},
+                      dtype="datetime64[ns]")
+    df_destaques = pd.concat([
+        pd.DataFrame({"Periodo": df_extremos["Periodo"], "Tempo": df_extremos["Tempo_" + tipo],
+                      "Valor": df_extremos[tipo], "Tipo": tipo.lower()})
+        for tipo in ["Maximo", "Minimo"]], ignore_index=True)
+    df_destaques = posicionar(df_destaques)
+    meio = meios.reindex(df_destaques["Periodo"]).to_numpy()
+    tempos = df_destaques["Tempo"].to_numpy(meio.dtype)
+    alinhamento = np.where(tempos < meio, "right", "left")
+    alinhamento[tempos == df_serie.index[0]] = "left"
+    alinhamento[tempos == df_serie.index[-1]] = "right"
+    return df_destaques.assign(Alinhamento=alinhamento)
+
+def lado_livre(indice, fatia):
+    """Horizontal position, in axes coordinates, for the name of a period:
+    the middle of the larger stretch of the series outside it.
+    Args:
+        indice (DatetimeIndex): sorted dates of the whole series.
+        fatia (DataFrame): rows of the period, from periodos.fatias.
+    Return:
+        float: position between 0 and 1.
+    """
+    if len(fatia) == 0 or len(indice) < 2:
+        return 0.5
+    inicio, fim = (np.array([fatia.index[0], fatia.index[-1]], dtype=indice.dtype)
+                   - indice[0].to_datetime64()) / (indice[-1] - indice[0]).to_timedelta64()
+    return (fim + 1) / 2 if inicio + fim < 1 else inicio / 2
+
+def linhas_grade(valores, passo=1.0):
+    """Round values inside the range of a series, for reference lines.
+    Args:
+        valores (array): values of the series.
+        passo (float): spacing of the lines.
+    Return:
+        ndarray: multiples of passo between the minimum and the maximum.
+    """
+    valores = np.asarray(valores, dtype=float)
+    valores = valores[~np.isnan(valores)]
+    if valores.size == 0:
+        return valores
+    return np.arange(np.ceil(valores.min() / passo), np.floor(valores.max() / passo) + 1) * passo
+
+def anotar(ax, df_destaques, formato, **estilo):
+    """Draw the labels of positioned highlighted points.
+    Args:
+        ax (Axes): matplotlib axes of the series.
+        df_destaques (DataFrame): COLUNAS_DESTAQUES, from destaques or
+            destaques_periodos.
+        formato (function): value -> label text, e.g. formatar_real.
+        estilo: extra text properties (color, fontsize, weight...).
+    """
+    for destaque in df_destaques.itertuples(index=False):
+        ax.annotate(formato(destaque.Valor), xy=(destaque.Tempo, destaque.Valor),
+                    xytext=(destaque.Deslocamento_X, destaque.Deslocamento_Y),
+                    textcoords="offset points", horizontalalignment=destaque.Alinhamento,
+                    verticalalignment="center", **estilo)
+
+def rotular_valores(ax, valores, formato, posicao_x=-0.05, **estilo):
+    """Label reference values at the left of the axes, at their own height.
+    Args:
+        ax (Axes): matplotlib axes.
+        valores (array): values in data coordinates, e.g. from linhas_grade.
+        formato (function): value -> label text.
+        posicao_x (float): label center, in axes coordinates.
+        estilo: extra text properties.
+    """
+    for valor in valores:
+        ax.text(posicao_x, valor, formato(valor), horizontalalignment="center",
+                verticalalignment="center", transform=ax.get_yaxis_transform(), **estilo)
+
+def rotular_anos(ax, indice, **estilo):
+    """Label the first and last year of a series at the bottom of the axes.
+    Args:
+        ax (Axes): matplotlib axes of the series.
+        indice (DatetimeIndex): sorted dates of the series.
+        estilo: extra text properties.
+    """
+    for tempo, alinhamento in [(indice[0], "left"), (indice[-1], "right")]:
+        ax.text(tempo, 0, str(tempo.year), horizontalalignment=alinhamento,
+                verticalalignment="center", transform=ax.get_xaxis_transform(), **estilo)
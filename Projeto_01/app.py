@@ -4,16 +4,29 @@ Data: Maio 2022
 Este projeto constrói uma aplicação
 streamlit para visualização de dados
 dos preços da gasolina no Brasil.
+
+Com METRICAS=1 no ambiente, o tempo de cada leitura
+e de cada gráfico é gravado no results.log (metricas.py).
 """
+import glob
+import io
 import logging
+import os
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-from matplotlib import style
-import matplotlib.pyplot as plt
-#pylint: disable = unused-variable
+from ajuste_inflacao import CAMINHO_GASOLINA, CAMINHO_IPCA, ajustar_precos, ler_ipca
+from cache_parquet import PASTA_CACHE, ler_cache, ler_indice, ler_linhas
+from cubo_precos import PASTA_CUBO
+from leitor_anp import ler_arquivo
+from metricas import instrumentar
+from series_tempo import alinhar, ler_serie, reamostrar
+from periodos import MANDATOS, fatias
+from anotacoes import anotar, destaques, destaques_periodos, formatar_percentual, \
+                      formatar_real, lado_livre, linhas_grade, rotular_anos, \
+                      rotular_valores
+from motor_precos import ESTADOS_REGIAO, PASTA_ESTADOS, PASTA_REGIOES, carregar_series, \
+                         medias_periodo, montar_motor, serie_periodo
+#pylint: disable = unused-variable, redefined-outer-name, import-outside-toplevel
 
 # configurando o logging
 logging.basicConfig(
@@ -22,54 +35,137 @@ logging.basicConfig(
     filemode="w",
     format="%(name)s - %(levelname)s - %(message)s")
 
-def read_data(file_path):
+CAMINHO_INFLACAO = "data/inflacao-semestral-gasolina-2004-2021.csv"
+# faixa da meta de inflação destacada no gráfico, em %
+META_INFLACAO = (0.0, 4.5)
+
+@instrumentar(arquivo=lambda args: args["file_path"])
+def read_data(file_path, nrows=None):
     """Read data from csv.
     Args:
         file_path (str): file path to read.
+        nrows (int): number of rows to read, the whole file when None.
     Return:
         df_file (DataFrame): returns the file read as a dataframe.
     """
     try:
-        if "ca-" in file_path:
-            df_file = pd.read_csv(file_path, sep = ";", encoding="ISO-8859-1")
-        else:
-            df_file = pd.read_csv(file_path)
+        if nrows is None:
+            df_file = ler_cache(file_path)
+            if df_file is not None:
+                return df_file
+        # o leitor é escolhido pela primeira linha do arquivo (leitor_anp.py)
+        df_file = ler_arquivo(file_path, nrows)
         return df_file
-    except FileNotFoundError: # pylint: disable=bare-except
+    except FileNotFoundError:
         logging.error("Error read_csv. We were not able to find %s", file_path)
-        return pd.Dataframe()
+        return pd.DataFrame()
+
+@st.experimental_memo(max_entries=16, show_spinner=False)
+def read_data_cached(file_path, mtime, nrows=None): # pylint: disable=unused-argument
+    """Read data once per process, shared by every session.
+    Args:
+        file_path (str): file path to read.
+        mtime (float): file modification time, part of the cache key so an
+            updated file is read again.
+        nrows (int): number of rows to read, the whole file when None.
+    Return:
+        df_file (DataFrame): returns the file read as a dataframe.
+    """
+    return read_data(file_path, nrows)
+
+def versao_caminho(caminho):
+    """Version of a file or folder. The mtime of a folder only changes when
+    an entry is added or removed, so a folder is versioned by its files.
+    Args:
+        caminho (str): file or folder path.
+    Return:
+        float or tuple: modification time of a file; number of files and
+        latest modification time of the files inside a folder; None when
+        the path does not exist.
+    """
+    if os.path.isdir(caminho):
+        mtimes = [os.path.getmtime(arquivo)
+                  for arquivo in glob.glob(os.path.join(caminho, "**", "*"), recursive=True)
+                  if os.path.isfile(arquivo)]
+        return len(mtimes), max(mtimes, default=None)
+    return os.path.getmtime(caminho) if os.path.exists(caminho) else None
+
+def versao_dados(*caminhos):
+    """Version of the data behind a chart.
+    Args:
+        caminhos (str): files or folders the chart is drawn from.
+    Return:
+        tuple: version of each path, see versao_caminho.
+    """
+    return tuple(versao_caminho(caminho) for caminho in caminhos)
 
-def plot_valor_gasolina():
+def load_data(file_path, nrows=None):
+    """Read data through the cache, keyed by the file modification time.
+    Args:
+        file_path (str): file path to read.
+        nrows (int): number of rows to read, the whole file when None.
+    Return:
+        df_file (DataFrame): returns the file read as a dataframe.
+    """
+    try:
+        mtime = os.path.getmtime(file_path)
+    except OSError:
+        mtime = None
+    return read_data_cached(file_path, mtime, nrows)
+
+@st.experimental_memo(max_entries=8, show_spinner=False)
+def read_serie_cached(file_path, mtime): # pylint: disable=unused-argument
+    """Parse a time series once per file version (series_tempo.py).
+    Args:
+        file_path (str): csv with a "Tempo" column.
+        mtime (float): file modification time, part of the cache key.
+    Return:
+        df_serie (DataFrame): the series indexed by "Tempo".
+    """
+    return ler_serie(file_path)
+
+def load_serie(file_path):
+    """Read a time series through the cache, keyed by the file modification time."""
+    return read_serie_cached(file_path, versao_dados(file_path)[0])
+
+@instrumentar()
+def plot_valor_gasolina(gas_precos):
     """Plota um gráfico line chart de título "Valor de
     venda da gasolina (2004 - 2021) usando plotly.express".
     """
-    line_chart1 = px.line(gas_precos, x="Tempo", y="Preco_Media",
+    import plotly.express as px
+
+    line_chart1 = px.line(gas_precos.reset_index(), x="Tempo", y="Preco_Media",
                       title = "Valor de venda da gasolina (2004 - 2021)",
                       labels={"Preco_Media": "Litro da gasolina (R$) - Média"})
     st.plotly_chart(line_chart1, use_container_width=True)
 
-def plot_inflacao_gasolina():
+@instrumentar()
+def plot_inflacao_gasolina(serie_inflacao):
     """Plota um gráfico line chart de título "Valor de
     venda e inflação da gasolina (2004 - 2021) usando plotly.express".
     """
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
     # Create figure with secondary y-axis
     line_chart2 = make_subplots(specs=[[{"secondary_y": True}]])
     # Add traces
     line_chart2.add_trace(
-        go.Scatter(x=inflacao_gasolina["Tempo"],
-                   y=inflacao_gasolina["ipca_media_semestral"],
+        go.Scatter(x=serie_inflacao.index,
+                   y=serie_inflacao["ipca_media_semestral"],
                    name="IPCA Média Semestral"),
         secondary_y=False,
     )
     line_chart2.add_trace(
-        go.Scatter(x=inflacao_gasolina["Tempo"],
-                   y=inflacao_gasolina["ipca_acumulado"],
+        go.Scatter(x=serie_inflacao.index,
+                   y=serie_inflacao["ipca_acumulado"],
                    name="IPCA Acumulado"),
         secondary_y=False,
     )
     line_chart2.add_trace(
-        go.Scatter(x=gas_precos["Tempo"],
-                   y=gas_precos["Preco_Media"],
+        go.Scatter(x=serie_inflacao.index,
+                   y=serie_inflacao["Preco_Media"],
                    name="Preço da gasolina"),
         secondary_y=True, #second y-axis
     )
@@ -83,11 +179,14 @@ def plot_inflacao_gasolina():
     line_chart2.update_yaxes(title_text="Litro da gasolina (R$) - Média", secondary_y=True)
     st.plotly_chart(line_chart2)
 
-def plot_gasolina_ajustada():
+@instrumentar()
+def plot_gasolina_ajustada(precos_atualizados):
     """Plota um gráfico line chart com dados do
     preço da gasolina e valores da inflação usando plotly.express.
     """
-    line_chart3 = px.line(precos_atualizados, x="Tempo", y=["Preço sem ajuste",
+    import plotly.express as px
+
+    line_chart3 = px.line(precos_atualizados.reset_index(), x="Tempo", y=["Preço sem ajuste",
                                                         "Preço ajustado"])
     line_chart3.update_layout(
         title = "Valor de venda da gasolina (2004 - 2021)",
@@ -100,131 +199,86 @@ def plot_gasolina_ajustada():
     )
     st.plotly_chart(line_chart3, use_container_width=True)
 
-def plot_inflacao_presidentes():
-    """Plota um gráfico line chart da inflação acumulada
+def figura_inflacao_presidentes(inflacao_gasolina):
+    """Desenha um gráfico line chart da inflação acumulada
     com mandatos presidenciais usando matplotlib.
     """
-    lula = inflacao_gasolina[(inflacao_gasolina["Tempo"] >= "2003-01-01") &
-                         (inflacao_gasolina["Tempo"] <= "2010-12-01")]
-    dilma = inflacao_gasolina[(inflacao_gasolina["Tempo"] >= "2010-12-01") &
-                              (inflacao_gasolina["Tempo"] <= "2016-06-01")]
-    temer = inflacao_gasolina[(inflacao_gasolina["Tempo"] >= "2016-06-01") &
-                              (inflacao_gasolina["Tempo"] <= "2018-12-01")]
-    bolsonaro = inflacao_gasolina[(inflacao_gasolina["Tempo"] >= "2018-12-01") &
-                                  (inflacao_gasolina["Tempo"] <= "2021-12-01")]
+    from matplotlib.figure import Figure
 
     # Setting figure size
-    plt.figure(figsize=(8,6))
+    fig = Figure(figsize=(8,6))
+    ax = fig.add_subplot()
 
     # Plotting the inflaction variation by Presidents
-    plt.plot(lula["Tempo"], lula["ipca_acumulado"],
-             label="Lula", color="#49be25")
-    plt.plot(dilma["Tempo"], dilma["ipca_acumulado"],
-             label="Dilma", color="#be4d25")
-    plt.plot(temer["Tempo"], temer["ipca_acumulado"],
-             label="Temer", color="#9925be")
-    plt.plot(bolsonaro["Tempo"], bolsonaro["ipca_acumulado"],
-             label="Bolsonaro", color="#2596be")
+    for (nome, mandato), cor in zip(fatias(inflacao_gasolina).items(), MANDATOS["Cor"]):
+        ax.plot(mandato.index, mandato["ipca_acumulado"], label=nome, color=cor)
 
     # habilitando as legendas
-    plt.legend()
-    # definindo titulo e sub-titulo
-    plt.text(731516.0, 60, ""*22+"""Variação da inflação acumulada (2006-2021)""",
-             fontsize=14, weight="bold")
-    plt.text(731000.0, 55,
-             "Governos Lula(2004-2010), Dilma(2011-2016.1), Temer(2016.2-2018)\
-              e Bolsonaro(2019-2021)",
-             fontsize=10)
+    ax.legend()
+    # definindo titulo e sub-titulo, com os anos da própria série
+    ax.text(0.5, 1.09, "Variação da inflação acumulada "
+            f"({inflacao_gasolina.index[0].year}-{inflacao_gasolina.index[-1].year})",
+            horizontalalignment="center", transform=ax.transAxes, fontsize=14, weight="bold")
+    ax.text(0.5, 1.03, "Governos " + ", ".join(
+        f"{nome}({mandato.index[0].year}-{mandato.index[-1].year})"
+        for nome, mandato in fatias(inflacao_gasolina).items() if len(mandato)),
+            horizontalalignment="center", transform=ax.transAxes, fontsize=10)
     #definindo footer
-    plt.text(731000.0, -21, "Autoria: Yolanda" + " "*110 + "Fonte: IBGE",
-             color="#f0f0f0",
-             backgroundcolor="#4d4d4d",
-             size=11)
-
-    plt.savefig("imagens/inflacao_gasolina.png", format="png")
+    ax.text(0.5, -0.1, "Autoria: Yolanda" + " "*110 + "Fonte: IBGE",
+            horizontalalignment="center", transform=ax.transAxes,
+            color="#f0f0f0",
+            backgroundcolor="#4d4d4d",
+            size=11)
+    fig.tight_layout()
 
-    st.image("imagens/inflacao_gasolina.png")
+    return fig
 
-def plot_gasolina_ajustada_presidentes():
-    """Plota um gráfico line chart dos preços da gasolina
+def figura_gasolina_ajustada_presidentes(precos_atualizados):
+    """Desenha um gráfico line chart dos preços da gasolina
     ajustados pela inflação por mandatos presidenciais usando matplotlib.
     """
-    fig, (ax1, ax2, ax3, ax4) = plt.subplots(nrows=4, ncols=1, figsize=(6,8))
-    axes = [ax1, ax2, ax3, ax4]
+    from matplotlib.figure import Figure
 
+    fig = Figure(figsize=(6,8))
+    axes = fig.subplots(nrows=4, ncols=1)
+    ax1, ax4 = axes[0], axes[-1]
+
+    grade = linhas_grade(precos_atualizados["Preco_Atualizado"])
     for ax in axes:
-        ax.plot(precos_atualizados["Tempo"], precos_atualizados["Preco_Atualizado"],
+        ax.plot(precos_atualizados.index, precos_atualizados["Preco_Atualizado"],
                 color="#af0b1e", alpha=0.1)
         ax.set_yticklabels([])
         ax.set_xticklabels([])
-        ax.axhline(5, xmin=0.0, xmax=1, color="#625d56", linewidth=(0.5),
-                   alpha=0.2, linestyle="dashdot")
-        ax.axhline(6, xmin=0.0, xmax=1, color="#625d56", linewidth=(0.5),
-                   alpha=0.2, linestyle="dashdot")
+        for valor in grade:
+            ax.axhline(valor, xmin=0.0, xmax=1, color="#625d56", linewidth=0.5,
+                       alpha=0.2, linestyle="dashdot")
         ax.grid(False)
         ax.tick_params(bottom=0, left=0)
         for location in ["left", "right", "top", "bottom"]:
             ax.spines[location].set_visible(False)
 
-    lula_2 = precos_atualizados[(precos_atualizados["Tempo"] >= "2003-01-01") &
-                                (precos_atualizados["Tempo"] <= "2010-12-01")]
-    dilma_2 = precos_atualizados[(precos_atualizados["Tempo"] >= "2010-12-01") &
-                                 (precos_atualizados["Tempo"] <= "2016-06-01")]
-    temer_2 = precos_atualizados[(precos_atualizados["Tempo"] >= "2016-06-01") &
-                                 (precos_atualizados["Tempo"] <= "2018-12-01")]
-    bolsonaro_2 = precos_atualizados[(inflacao_gasolina["Tempo"] >= "2018-12-01") &
-                                     (precos_atualizados["Tempo"] <= "2021-12-01")]
-
-    #Lula"s chart elements
-    ax1.plot(lula_2["Tempo"], lula_2["Preco_Atualizado"], label="Lula", color="#49be25")
-    ax1.text(0.15, 0.95, "R$6,41", horizontalalignment="center", verticalalignment="center",
-             transform=ax1.transAxes, fontsize=12, color="#49be25")
-    ax1.text(0.37, 0.14, "R$5,23", horizontalalignment="center", verticalalignment="center",
-             transform=ax1.transAxes, fontsize=12, color="#49be25")
-    ax1.text(-0.05, 0.15, "R$5", horizontalalignment="center", verticalalignment="center",
-             transform=ax1.transAxes, fontsize=12, color="#625d56", alpha=0.2)
-    ax1.text(-0.05, 0.65, "R$6", horizontalalignment="center", verticalalignment="center",
-             transform=ax1.transAxes, fontsize=12, color="#625d56", alpha=0.2)
-    ax1.text(0.55, 0.4, "Governo Lula", horizontalalignment="center", verticalalignment="center",
-             transform=ax1.transAxes, fontsize=12, color="#49be25")
-    ax1.text(0.05, 0, "2004", horizontalalignment="center", verticalalignment="center",
-             transform=ax1.transAxes, fontsize=12, color="#625d56", alpha=0.2)
-    ax1.text(0.97, 0, "2021", horizontalalignment="center", verticalalignment="center",
-             transform=ax1.transAxes, fontsize=12, color="#625d56", alpha=0.2)
-
-    #Dilmas"s chart elements
-    ax2.plot(dilma_2["Tempo"], dilma_2["Preco_Atualizado"],label="Dilma", color="#be4d25")
-    ax2.text(0.58, -0.1, "R$4,77", horizontalalignment="center", verticalalignment="center",
-             transform=ax2.transAxes, fontsize=12, color="#be4d25")
-    ax2.text(0.40, 0.14, "R$5,30", horizontalalignment="center", verticalalignment="center",
-             transform=ax2.transAxes, fontsize=12, color="#be4d25")
-    ax2.text(0.55, 0.4, "Governo Dilma", horizontalalignment="center", verticalalignment="center",
-             transform=ax2.transAxes, fontsize=12, color="#be4d25")
-
-    #Temer"s chart elements
-    ax3.plot(temer_2["Tempo"], temer_2["Preco_Atualizado"], label="Temer", color="#9925be")
-    ax3.text(0.71, 0.0, "R$4,90", horizontalalignment="center", verticalalignment="center",
-             transform=ax3.transAxes, fontsize=12, color="#9925be")
-    ax3.text(0.79, 0.62, "R$5,74", horizontalalignment="center", verticalalignment="center",
-             transform=ax3.transAxes, fontsize=12, color="#9925be")
-    ax3.text(0.55, 0.4, "Governo Temer", horizontalalignment="center", verticalalignment="center",
-             transform=ax3.transAxes, fontsize=12, color="#9925be")
-
-    #Bolsonaro"s chart elements
-    ax4.plot(bolsonaro_2["Tempo"], bolsonaro_2["Preco_Atualizado"],
-             label="Bolsonaro", color="#2596be")
-    ax4.text(0.94, 1.02, "R$6,59", horizontalalignment="center", verticalalignment="center",
-             transform=ax4.transAxes, fontsize=12, color="#2596be")
-    ax4.text(0.9, 0.04, "R$4,98", horizontalalignment="center", verticalalignment="center",
-             transform=ax4.transAxes, fontsize=12, color="#2596be")
-    ax4.text(0.55, 0.4, "Governo Bolsonaro", horizontalalignment="center",
-             verticalalignment="center", transform=ax4.transAxes, fontsize=12, color="#2596be")
+    # cada mandato em um eixo, com o máximo e o mínimo do preço no período
+    mandatos = fatias(precos_atualizados)
+    df_destaques = destaques_periodos(precos_atualizados, "Preco_Atualizado")
+    for ax, nome, cor in zip(axes, MANDATOS["Periodo"], MANDATOS["Cor"]):
+        ax.plot(mandatos[nome].index, mandatos[nome]["Preco_Atualizado"], label=nome, color=cor)
+        anotar(ax, df_destaques[df_destaques["Periodo"] == nome], formatar_real,
+               fontsize=12, color=cor)
+        ax.text(lado_livre(precos_atualizados.index, mandatos[nome]), 0.2, f"Governo {nome}",
+                horizontalalignment="center",
+                verticalalignment="center", transform=ax.transAxes, fontsize=12, color=cor)
+
+    # linhas de referência e anos das pontas da série no primeiro eixo
+    rotular_valores(ax1, grade, lambda valor: f"R${valor:.0f}",
+                    fontsize=12, color="#625d56", alpha=0.2)
+    rotular_anos(ax1, precos_atualizados.index, fontsize=12, color="#625d56", alpha=0.2)
 
     # Title and subtitle
     ax4.text(0.48, 1.4, "Preço da gasolina ajustado pela inflação do período",
              horizontalalignment="center", verticalalignment="center",
              transform=ax1.transAxes, size=14, weight="bold")
-    ax4.text(0.48, 1.2, "Máximo e mínimo em cada governo entre 2004 e 2021",
+    ax4.text(0.48, 1.2, "Máximo e mínimo em cada governo entre "
+             f"{precos_atualizados.index[0].year} e {precos_atualizados.index[-1].year}",
              horizontalalignment="center", verticalalignment="center", transform=ax1.transAxes)
 
     # Credits
@@ -232,57 +286,51 @@ def plot_gasolina_ajustada_presidentes():
              horizontalalignment="center", verticalalignment="center",
              transform=ax4.transAxes, color = "#f0f0f0", backgroundcolor = "#4d4d4d", size=12)
 
-    plt.savefig("imagens/gasolina_ajustada_presidentes.png", format="png")
-
-    st.image("imagens/gasolina_ajustada_presidentes.png")
+    return fig
 
-def plot_meta_inflacao():
-    """Plota um gráfico line chart da inflação acumulada
+def figura_meta_inflacao(serie_inflacao):
+    """Desenha um gráfico line chart da inflação acumulada
     e preços da gasolina usando matplotlib.
     """
-    fig, ax1 = plt.subplots(figsize=(10,6))
+    from matplotlib.figure import Figure
 
-    ax1.plot(inflacao_gasolina["Tempo"], inflacao_gasolina["ipca_acumulado"], color="#db4b26")
+    fig = Figure(figsize=(10,6))
+    ax1 = fig.add_subplot()
+
+    ax1.plot(serie_inflacao.index, serie_inflacao["ipca_acumulado"], color="#db4b26")
     ax1.yaxis.set_ticklabels([])
     ax1.grid(False)
 
-    #Inflation data (sellected area between 0 and 4.5%)
-    ax1.axhline(2.25, xmin=0.0, xmax=1, color="#db4b26", alpha=0.1, linewidth=(30))
-    ax1.text(0.27, 0.32, "Meta de inflação", horizontalalignment="center",
-             verticalalignment="center", transform=ax1.transAxes, fontsize=12, weight="bold",
-             color="#db4b26", alpha=0.4)
-    ax1.text(-0.03, 0.22, "0%", horizontalalignment="center",verticalalignment="center",
-             transform=ax1.transAxes, fontsize=14, color="#db4b26", alpha=0.4)
-    ax1.text(-0.03, 0.3, "4,5%", horizontalalignment="center", verticalalignment="center",
-             transform=ax1.transAxes, fontsize=14, color="#db4b26", alpha=0.4)
-    ax1.text(0.08, 0.48, "14,64%", horizontalalignment="center", verticalalignment="center",
-             transform=ax1.transAxes, color="#db4b26", fontsize=12, weight="bold")
-    ax1.text(0.65, 0.565, "20,10%", horizontalalignment="center", verticalalignment="center",
-             transform=ax1.transAxes, color="#db4b26", fontsize=12, weight="bold")
-    ax1.text(0.847, 0.11, "-11,88%", horizontalalignment="center", verticalalignment="center",
-             transform=ax1.transAxes, color="#db4b26", fontsize=12, weight="bold", rotation=-79)
-    ax1.text(0.968, 0.88, "47,49%", horizontalalignment="center", verticalalignment="center",
-             transform=ax1.transAxes, color="#db4b26", fontsize=12, weight="bold", rotation=83)
+    #Inflation data (sellected area of the inflation target)
+    ax1.axhspan(*META_INFLACAO, color="#db4b26", alpha=0.1, linewidth=0)
+    ax1.text(0.27, sum(META_INFLACAO) / 2, "Meta de inflação", horizontalalignment="center",
+             verticalalignment="center", transform=ax1.get_yaxis_transform(), fontsize=12,
+             weight="bold", color="#db4b26", alpha=0.4)
+    rotular_valores(ax1, META_INFLACAO, lambda valor: f"{valor:g}%".replace(".", ","),
+                    posicao_x=-0.03, fontsize=14, color="#db4b26", alpha=0.4)
+    ax1.margins(y=0.12)
+    anotar(ax1, destaques(serie_inflacao, "ipca_acumulado", n_picos=2, pontas=("minimo", "fim")),
+           formatar_percentual, color="#db4b26", fontsize=12, weight="bold")
 
     ax2 = ax1.twinx()  # instantiate a second axes that shares the same x-axis
-    ax2.plot(inflacao_gasolina["Tempo"], gas_precos["Preco_Media"], color="#0a5891")
+    ax2.plot(serie_inflacao.index, serie_inflacao["Preco_Media"], color="#0a5891")
     ax2.grid(False)
     ax2.yaxis.set_ticklabels([])
     ax2.tick_params(axis="x", colors="#625d56")
 
     #Gasoline data
-    ax2.text(0.03, 0.1, "R$2,03", horizontalalignment="center", verticalalignment="center",
-            transform=ax2.transAxes, color="#0a5891", fontsize=12, weight="bold")
-    ax2.text(0.8, 0.61, "R$4,58", horizontalalignment="center", verticalalignment="center",
-            transform=ax2.transAxes, color="#0a5891", fontsize=12, weight="bold")
-    ax2.text(0.925, 0.88, "R$6,34", horizontalalignment="center", verticalalignment="center",
-            transform=ax2.transAxes, color="#0a5891", fontsize=12, weight="bold", rotation=74)
+    # as duas séries terminam no alto do gráfico: o último preço fica à direita e abaixo
+    ax2.margins(y=0.12)
+    anotar(ax2, destaques(serie_inflacao, "Preco_Media", n_picos=1, pontas=("inicio", "fim"),
+                          posicoes={"fim": (8, -12, "left")}),
+           formatar_real, color="#0a5891", fontsize=12, weight="bold")
 
     # Title and subtitle
     ax2.text(0.49, 1.1, "Gasolina inflaciona e tem aumento abrupto de preços no último ano",
              horizontalalignment="center", verticalalignment="center",
              transform=ax1.transAxes, size=17, weight="bold")
-    ax2.text(0.49, 1.05, "Preço médio da gasolina e inflação acumulada por ano entre 2004 e 2021",
+    ax2.text(0.49, 1.05, "Preço médio da gasolina e inflação acumulada por ano entre "
+             f"{serie_inflacao.index[0].year} e {serie_inflacao.index[-1].year}",
              horizontalalignment="center", verticalalignment="center", transform=ax1.transAxes)
 
     # Credits
@@ -293,110 +341,332 @@ def plot_meta_inflacao():
 
     fig.tight_layout()
 
-    plt.savefig("imagens/meta_inflacao_precos.png", format="png")
+    return fig
+
+FIGURAS = {"inflacao_presidentes": figura_inflacao_presidentes,
+           "gasolina_ajustada_presidentes": figura_gasolina_ajustada_presidentes,
+           "meta_inflacao": figura_meta_inflacao}
 
-    st.image("imagens/meta_inflacao_precos.png")
+@st.experimental_memo(max_entries=8, show_spinner=False)
+def render_png(nome, versao, _dados): # pylint: disable=unused-argument
+    """Renderiza uma figura matplotlib em PNG uma única vez por versão
+    dos dados; as próximas execuções, de qualquer sessão, usam os bytes
+    guardados. As anotações são calculadas dos dados dentro da figura
+    (anotacoes.py), então ficam no mesmo cache.
+    Args:
+        nome (str): chave de FIGURAS.
+        versao (tuple): versão dos dados, retornada por versao_dados.
+        _dados (tuple): dataframes passados para a figura (fora da chave).
+    Return:
+        bytes: imagem PNG.
+    """
+    from matplotlib import style
+
+    # Setting graph style only while this figure is drawn and saved,
+    # without changing the global rcParams of the other figures
+    buffer = io.BytesIO()
+    with style.context("fivethirtyeight"):
+        fig = FIGURAS[nome](*_dados)
+        fig.savefig(buffer, format="png")
+    fig.clear()
+    return buffer.getvalue()
+
+@instrumentar()
+def plot_inflacao_presidentes(serie_inflacao):
+    """Plota o gráfico da inflação acumulada com mandatos presidenciais."""
+    st.image(render_png("inflacao_presidentes", versao_dados(CAMINHO_INFLACAO),
+                        (serie_inflacao,)))
+
+@instrumentar()
+def plot_gasolina_ajustada_presidentes(precos_atualizados, versao):
+    """Plota o gráfico dos preços da gasolina ajustados pela inflação
+    por mandatos presidenciais.
+    """
+    st.image(render_png("gasolina_ajustada_presidentes", versao, (precos_atualizados,)))
+
+@instrumentar()
+def plot_meta_inflacao(serie_inflacao):
+    """Plota o gráfico da inflação acumulada e preços da gasolina."""
+    st.image(render_png("meta_inflacao", versao_dados(CAMINHO_INFLACAO, CAMINHO_GASOLINA),
+                        (serie_inflacao,)))
+
+@st.experimental_memo(max_entries=1, show_spinner=False)
+def motores_precos(versao): # pylint: disable=unused-argument
+    """Monta uma única vez por versão dos dados os motores de consulta
+    por estado e por região (motor_precos.py).
+    Args:
+        versao (tuple): versão dos dados, retornada por versao_dados.
+    Return:
+        tuple: (motor dos estados, motor das regiões).
+    """
+    df_estados, df_regioes = carregar_series()
+    return montar_motor(df_estados), montar_motor(df_regioes)
 
-def plot_regioes_estados_2021():
-    """Plota gráficos de barras com valores da gasolina
-    por região e estado usando plotly.express.
+def filtros_painel(motor_regioes):
+    """Desenha o painel lateral de filtros.
+    Args:
+        motor_regioes (dict): motor das regiões, de onde vêm os produtos e anos.
+    Return:
+        filtros (dict): "produto", "anos" (inicial, final), "regioes" e "estados".
     """
-    regioes_2021 = read_data("data/precos_regioes_2021.csv")
+    st.sidebar.header("Filtros")
+    produtos = list(motor_regioes["produtos"])
+    produto = st.sidebar.selectbox("Produto", produtos,
+                                   index=produtos.index("GASOLINA") if "GASOLINA" in produtos
+                                   else 0)
+    anos = sorted({int(semestre[:4]) for semestre in motor_regioes["semestres"]})
+    ano_inicial, ano_final = st.sidebar.slider("Anos", anos[0], anos[-1], (anos[-1], anos[-1]))
+    regioes = st.sidebar.multiselect("Regiões", list(ESTADOS_REGIAO), list(ESTADOS_REGIAO))
+    opcoes_estados = sorted(estado for regiao in regioes for estado in ESTADOS_REGIAO[regiao])
+    estados = st.sidebar.multiselect("Estados", opcoes_estados, opcoes_estados)
+    return {"produto": produto, "anos": (ano_inicial, ano_final), "regioes": regioes,
+            "estados": estados}
+
+def titulo_periodo(filtros):
+    """Produto e período dos filtros, para os títulos dos gráficos."""
+    ano_inicial, ano_final = filtros["anos"]
+    periodo = f"em {ano_inicial}" if ano_inicial == ano_final else \
+              f"({ano_inicial} - {ano_final})"
+    return f"{filtros['produto'].lower()} {periodo}"
+
+@instrumentar()
+def plot_regioes_estados(motor_estados, motor_regioes, filtros):
+    """Plota gráficos de barras com valores do produto
+    por região e estado no período escolhido usando plotly.express.
+    """
+    import plotly.express as px
+
+    regioes = medias_periodo(motor_regioes, filtros["produto"], filtros["regioes"] + ["Total"],
+                             *filtros["anos"])
 
-    bar_chart1 = px.bar(regioes_2021, x="Regiao_Sigla", y="Preco_Media", text_auto=".3s",
-                        title = "Valor de venda da gasolina por regiões em 2021",
-                        labels={"Regiao_Sigla": "Regiões",
-                                "Preco_Media": "Litro da Gasolina (R$) - Média"})
+    bar_chart1 = px.bar(regioes, x="Local", y="Preco_Media", text_auto=".3s",
+                        title = f"Valor de venda de {titulo_periodo(filtros)} por regiões",
+                        labels={"Local": "Regiões",
+                                "Preco_Media": "Preço (R$) - Média"})
     st.plotly_chart(bar_chart1, use_container_width=True)
 
-    estados_2021 = read_data("data/precos_estados_2021.csv")
+    estados = medias_periodo(motor_estados, filtros["produto"], filtros["estados"],
+                             *filtros["anos"])
 
-    bar_chart2 = px.bar(estados_2021, x="Estado_Sigla", y="Preco_Media", text_auto=".3s",
-                        title = "Valor de venda da gasolina por estados em 2021",
-                        labels={"Estado_Sigla": "Estados",
-                                "Preco_Media": "Litro da Gasolina (R$) - Média"})
+    bar_chart2 = px.bar(estados, x="Local", y="Preco_Media", text_auto=".3s",
+                        title = f"Valor de venda de {titulo_periodo(filtros)} por estados",
+                        labels={"Local": "Estados",
+                                "Preco_Media": "Preço (R$) - Média"})
     st.plotly_chart(bar_chart2, use_container_width=True)
 
-# Setting graph style
-style.use("fivethirtyeight")
+@instrumentar()
+def plot_serie_regioes(motor_regioes, filtros):
+    """Plota um gráfico line chart do preço médio semestral
+    das regiões escolhidas usando plotly.express.
+    """
+    import plotly.express as px
+
+    serie = serie_periodo(motor_regioes, filtros["produto"], filtros["regioes"] + ["Total"],
+                          *filtros["anos"])
+    line_chart5 = px.line(serie, x="Semestre", y="Preco_Media", color="Local",
+                          title = f"Valor de venda de {titulo_periodo(filtros)} por semestre",
+                          labels={"Local": "Regiões",
+                                  "Preco_Media": "Preço (R$) - Média"})
+    st.plotly_chart(line_chart5, use_container_width=True)
+
+@st.experimental_memo(max_entries=1, show_spinner=False)
+def indice_municipios(versao): # pylint: disable=unused-argument
+    """Índice dos municípios do cache parquet, lido uma única vez por versão.
+    Args:
+        versao (tuple): versão dos índices, retornada por versao_dados.
+    Return:
+        df_indice (DataFrame): faixas de linhas de cada município e produto.
+    """
+    return ler_indice("Municipio")
 
-st.title("Analisando o preço da gasolina brasileira (2004 - 2021)")
+@st.experimental_memo(max_entries=32, show_spinner=False)
+def precos_municipio(municipio, estado, produto, versao):
+    """Média mensal do preço de um município, lendo pelo índice só os
+    grupos de linhas onde ele está.
+    Args:
+        municipio (str): nome do município, e.g. "NATAL".
+        estado (str): sigla do estado do município.
+        produto (str): produto, e.g. "GASOLINA".
+        versao (tuple): versão dos índices, retornada por versao_dados.
+    Return:
+        df_mensal (DataFrame): "Tempo", "Preco_Media" e "Postos" por mês
+        (series_tempo.reamostrar); um mês sem coletas fica sem preço, um
+        vão na linha do gráfico.
+    """
+    df_indice = indice_municipios(versao)
+    df_indice = df_indice[(df_indice["chave"] == municipio) &
+                          (df_indice["Estado - Sigla"] == estado) &
+                          (df_indice["Produto"] == produto)]
+    df_linhas = ler_linhas(df_indice, ["Data da Coleta", "CNPJ da Revenda", "Valor de Venda"])
+    df_mensal = reamostrar(df_linhas.set_index("Data da Coleta").sort_index(), "mensal",
+                           {"Valor de Venda": "mean", "CNPJ da Revenda": "nunique"})
+    return df_mensal.rename(columns={"Valor de Venda": "Preco_Media",
+                                     "CNPJ da Revenda": "Postos"})\
+                    .rename_axis("Tempo").reset_index()
+
+@instrumentar()
+def plot_municipio():
+    """Plota um gráfico line chart do preço médio mensal de um
+    município escolhido, usando o índice do cache parquet.
+    """
+    import plotly.express as px
 
-st.subheader("A Streamlit web app by Matheus Silva and Yolanda Dantas")
+    indices = glob.glob(os.path.join(PASTA_CACHE, "ano=*", "semestre=*", "indice.parquet"))
+    if not indices:
+        st.info("Gere o cache com `python cache_parquet.py` para consultar os municípios.")
+        return
+    versao = versao_dados(*sorted(indices))
+    df_indice = indice_municipios(versao)
 
-st.markdown("Este projeto, apresentado na disciplina de Mlops da UFRN, visa analisar o \
-            comportamento do preço da gasolina brasileira em relação à inflação. Como base, \
-            utilizados dados disponibilizados pelo governo federal (ANP) na \
-            [série histórica de preços de combustíveis](\
-            https://www.gov.br/anp/pt-br/centrais-de-conteudo/dados-abertos/serie-historica-de-precos-de-combustiveis)\
-            que vai de 2004 até 2021. Cada ano possui dois arquivos, para cada semestre. \
-            Exemplo do arquivo csv do segundo semestre de 2021:")
+    coluna1, coluna2, coluna3 = st.columns(3)
+    estado = coluna1.selectbox("Estado", sorted(df_indice["Estado - Sigla"].unique()))
+    municipio = coluna2.selectbox("Município", sorted(
+        df_indice.loc[df_indice["Estado - Sigla"] == estado, "chave"].unique()))
+    produtos = sorted(df_indice.loc[(df_indice["Estado - Sigla"] == estado) &
+                                    (df_indice["chave"] == municipio), "Produto"].unique())
+    produto = coluna3.selectbox("Produto", produtos,
+                                index=produtos.index("GASOLINA") if "GASOLINA" in produtos else 0)
 
-st.caption("ca_2021_02.head()")
+    df_mensal = precos_municipio(municipio, estado, produto, versao)
+    line_chart4 = px.line(df_mensal, x="Tempo", y="Preco_Media", hover_data=["Postos"],
+                          title=f"Valor de venda de {produto.lower()} em {municipio} - {estado}",
+                          labels={"Preco_Media": "Preço (R$) - Média mensal"})
+    st.plotly_chart(line_chart4, use_container_width=True)
 
-ca_2021_02 = read_data("data/serie_historica_combustiveis/ca-2021-02.csv")
+def secao_gasolina():
+    """Seção com a série histórica e o preço médio da gasolina."""
+    st.markdown("Cada ano da série histórica possui dois arquivos, para cada semestre. \
+                Exemplo do arquivo csv do segundo semestre de 2021:")
 
-# Mostrando head do arquivo ca_2021_02
-st.dataframe(ca_2021_02.head())
+    st.caption("ca_2021_02.head()")
 
-st.markdown("Após o download dos arquivos csv foi feito um tratamento de dados\
-            coletando a média do preço da gasolina anual entre 2004 e 2021.")
+    ca_2021_02 = load_data("data/serie_historica_combustiveis/ca-2021-02.csv", nrows=5)
 
-gas_precos = read_data("data/gasolina_precos-2004-2021.csv")
+    # Mostrando head do arquivo ca_2021_02
+    st.dataframe(ca_2021_02)
 
-# Mostrando o arquivo gasolina_precos-2004-2021
-st.dataframe(gas_precos)
+    st.markdown("Após o download dos arquivos csv foi feito um tratamento de dados\
+                coletando a média do preço da gasolina anual entre 2004 e 2021.")
 
-st.markdown("Dataframe em gráfico de linha:")
+    gas_precos = load_serie(CAMINHO_GASOLINA)
 
-# Grafico: Valor de venda da gasolina (2004 - 2021)
-plot_valor_gasolina()
+    # Mostrando o arquivo gasolina_precos-2004-2021
+    st.dataframe(gas_precos)
 
-st.markdown("Já os dados da [série histórica da inflação (IPCA) para gasolina](\
-            https://sidra.ibge.gov.br/Busca?q=ipca) foram obtidos através do IBGE, \
-            que calcula os índides de inflação mensalmente\
-            (tabelas 655, 657, 2938, 1419 e 7060). \
-            Abaixo podemos visualizar parte do arquivo csv gerado após a junção das \
-            tabelas e optenção de médias semestrais no excel:")
+    st.markdown("Dataframe em gráfico de linha:")
 
-inflacao_gasolina = read_data("data/inflacao-semestral-gasolina-2004-2021.csv")
+    # Grafico: Valor de venda da gasolina (2004 - 2021)
+    plot_valor_gasolina(gas_precos)
 
-# Mostrando o arquivo inflacao-semestral-gasolina-2004-2021
-st.dataframe(inflacao_gasolina)
+def secao_inflacao():
+    """Seção com a inflação (IPCA) da gasolina e os mandatos presidenciais."""
+    st.markdown("Já os dados da [série histórica da inflação (IPCA) para gasolina](\
+                https://sidra.ibge.gov.br/Busca?q=ipca) foram obtidos através do IBGE, \
+                que calcula os índides de inflação mensalmente\
+                (tabelas 655, 657, 2938, 1419 e 7060). \
+                Abaixo podemos visualizar parte do arquivo csv gerado após a junção das \
+                tabelas e optenção de médias semestrais no excel:")
 
-# Grafico: Valor de venda e inflação da gasolina (2004 - 2021)
-plot_inflacao_gasolina()
+    inflacao_gasolina = load_serie(CAMINHO_INFLACAO)
 
-st.markdown("É possível ver os dados da inflação acumulada com destaques dos presidentes\
-            brasileiros:")
+    # Mostrando o arquivo inflacao-semestral-gasolina-2004-2021
+    st.dataframe(inflacao_gasolina)
 
-inflacao_gasolina["Tempo"] = pd.to_datetime(inflacao_gasolina["Tempo"])
+    # inflação e preço de cada semestre na mesma linha, casados pela data
+    serie_inflacao = alinhar(inflacao_gasolina, load_serie(CAMINHO_GASOLINA), tolerancia="31D")
 
-# Grafico: Inflação acumulada e mandatos presidenciais
-plot_inflacao_presidentes()
+    # Grafico: Valor de venda e inflação da gasolina (2004 - 2021)
+    plot_inflacao_gasolina(serie_inflacao)
 
-# Grafico: Inflação e preços da gasolina
-plot_meta_inflacao()
+    st.markdown("É possível ver os dados da inflação acumulada com destaques dos presidentes\
+                brasileiros:")
 
-st.markdown("Com o preço da gasolina foi possível fazer a atualização dos preços\
-            pela variação do [Índice de Preços ao Consumidor Amplo (IPCA)](\
-            https://www.ibge.gov.br/explica/inflacao.php) de abril de 2022.")
+    # Grafico: Inflação acumulada e mandatos presidenciais
+    plot_inflacao_presidentes(serie_inflacao)
 
-precos_atualizados = read_data("data/gasolina_precos_atualizada-2004-2021.csv")
-precos_atualizados = precos_atualizados.rename(columns = {"Preco_Media": "Preço sem ajuste",
-                                               "Preco_Atualizado": "Preço ajustado"})
+    # Grafico: Inflação e preços da gasolina
+    plot_meta_inflacao(serie_inflacao)
 
-# Grafico: Preços da gasolina ajustados pela inflação
-plot_gasolina_ajustada()
+def precos_ajustados():
+    """Ajusta os preços da gasolina pelo IPCA para o mês de referência
+    escolhido no painel lateral (ajuste_inflacao.py). Sem a série mensal
+    do IPCA, que não é versionada, a seção para com um erro.
+    Return:
+        tuple: (precos_atualizados, versão dos dados, mês de referência).
+    """
+    if not os.path.exists(CAMINHO_IPCA):
+        st.error(f"A série do IPCA ({CAMINHO_IPCA}) não foi encontrada. "
+                 "Gere-a com `python ajuste_inflacao.py --baixar` antes de abrir o dashboard.")
+        st.stop()
+    df_ipca = ler_ipca(CAMINHO_IPCA)
+    referencia = st.sidebar.selectbox("Mês de referência do IPCA",
+                                      [f"{tempo:%Y-%m}" for tempo in df_ipca["Tempo"][::-1]])
+    precos_atualizados = ajustar_precos(load_serie(CAMINHO_GASOLINA), df_ipca, referencia)
+    return precos_atualizados, versao_dados(CAMINHO_GASOLINA, CAMINHO_IPCA) + (referencia,), \
+           referencia
+
+def secao_precos_ajustados():
+    """Seção com os preços da gasolina ajustados pelo IPCA."""
+    precos_atualizados, versao, referencia = precos_ajustados()
+
+    st.markdown(f"Com o preço da gasolina foi possível fazer a atualização dos preços\
+                pela variação do [Índice de Preços ao Consumidor Amplo (IPCA)](\
+                https://www.ibge.gov.br/explica/inflacao.php) até {referencia}.")
+
+    precos_atualizados = precos_atualizados.rename(columns = {"Preco_Media": "Preço sem ajuste",
+                                                   "Preco_Atualizado": "Preço ajustado"})
+
+    # Grafico: Preços da gasolina ajustados pela inflação
+    plot_gasolina_ajustada(precos_atualizados)
+
+    precos_atualizados = precos_atualizados.rename(columns = {"Preço sem ajuste": "Preco_Media",
+                                                   "Preço ajustado": "Preco_Atualizado"})
+
+    # Grafico: Preços da gasolina ajustados pela inflação e mandatos presidenciais
+    plot_gasolina_ajustada_presidentes(precos_atualizados, versao)
+
+def secao_regioes_estados():
+    """Seção com os preços por regiões e estados, filtrados no painel lateral."""
+    cubos = sorted(glob.glob(os.path.join(PASTA_CUBO, "*", "cubo.parquet")))
+    motor_estados, motor_regioes = motores_precos(versao_dados(PASTA_ESTADOS, PASTA_REGIOES,
+                                                               *cubos))
+    filtros = filtros_painel(motor_regioes)
+
+    st.markdown("Vamos visualizar os dados de preço por regiões e estados, \
+                no produto, período e locais escolhidos no painel lateral:")
+
+    # Graficos valor de venda por estados e regiões no periodo escolhido
+    plot_regioes_estados(motor_estados, motor_regioes, filtros)
+
+    # Grafico: Valor de venda por semestre nas regiões escolhidas
+    plot_serie_regioes(motor_regioes, filtros)
+
+def secao_municipios():
+    """Seção com o histórico de preços de um município."""
+    st.markdown("Também é possível consultar o histórico de preços de um município, \
+                lido diretamente da série histórica através do índice por município:")
+
+    # Grafico: Valor de venda em um município
+    plot_municipio()
+
+# seção -> função que a desenha; só a seção escolhida importa
+# suas bibliotecas e monta seus gráficos
+SECOES = {"Preço da gasolina": secao_gasolina,
+          "Inflação": secao_inflacao,
+          "Preços ajustados": secao_precos_ajustados,
+          "Regiões e estados": secao_regioes_estados,
+          "Municípios": secao_municipios}
 
-precos_atualizados = precos_atualizados.rename(columns = {"Preço sem ajuste": "Preco_Media",
-                                               "Preço ajustado": "Preco_Atualizado"})
-precos_atualizados["Tempo"] = pd.to_datetime(precos_atualizados["Tempo"])
+st.title("Analisando o preço da gasolina brasileira (2004 - 2021)")
 
-# Grafico: Preços da gasolina ajustados pela inflação e mandatos presidenciais
-plot_gasolina_ajustada_presidentes()
+st.subheader("A Streamlit web app by Matheus Silva and Yolanda Dantas")
 
-st.markdown("Por último, vamos visualizar os dados de preço de 2021 por regiões e estados:")
+st.markdown("Este projeto, apresentado na disciplina de Mlops da UFRN, visa analisar o \
+            comportamento do preço da gasolina brasileira em relação à inflação. Como base, \
+            utilizados dados disponibilizados pelo governo federal (ANP) na \
+            [série histórica de preços de combustíveis](\
+            https://www.gov.br/anp/pt-br/centrais-de-conteudo/dados-abertos/serie-historica-de-precos-de-combustiveis)\
+            que vai de 2004 até 2021. Escolha a seção no painel lateral.")
 
-# Graficos valor de venda da gasolina por estados e regiões 2021
-plot_regioes_estados_2021()
+secao = st.sidebar.radio("Seção", list(SECOES))
+SECOES[secao]()
@@ -5,39 +5,213 @@ Este projeto recebe uma url do site do governo
 federal sobre a série histórica do preço dos
 combustíveis e baixa esses arquivos na pasta
 de destino explicitada.
+
+Os arquivos são baixados em paralelo com uma sessão
+http compartilhada. Arquivos já completos são ignorados
+e arquivos parciais são retomados com requisições Range.
 """
 #pylint: disable = invalid-name
-import shutil
+import argparse
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from metricas import ativar, instrumentar
+
+URL_BASE = "https://www.gov.br/anp/pt-br/centrais-de-conteudo/dados-abertos/arquivos/shpc/dsas/ca/"
+ARQUIVOS = [f"ca-{ano}-0{semestre}.csv" for ano in range(2004, 2022) for semestre in (1, 2)]
+PASTA_DESTINO = "data/serie_historica_combustiveis/"
+
+TAMANHO_BLOCO = 1024 * 1024
+TIMEOUT = 60
+
+def criar_sessao(max_conexoes=4):
+    """Create a requests session with a connection pool and retries.
+    Args:
+        max_conexoes (int): connections kept open to the host.
+    Return:
+        sessao (Session): session shared by every download.
+    """
+    sessao = requests.Session()
+    adaptador = HTTPAdapter(pool_connections=max_conexoes, pool_maxsize=max_conexoes,
+                            max_retries=Retry(total=3, backoff_factor=1,
+                                              status_forcelist=[500, 502, 503, 504]))
+    sessao.mount("http://", adaptador)
+    sessao.mount("https://", adaptador)
+    return sessao
+
+def ler_metadados(caminho):
+    """Read the ETag/Last-Modified saved next to a downloaded file.
+    Args:
+        caminho (str): downloaded file path.
+    Return:
+        metadados (dict): saved metadata, empty when there is none.
+    """
+    try:
+        with open(caminho + ".meta", encoding="utf-8") as arquivo_meta:
+            return json.load(arquivo_meta)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def escrever_metadados(caminho, metadados):
+    """Save the ETag/Last-Modified of a downloaded file.
+    Args:
+        caminho (str): downloaded file path.
+        metadados (dict): metadata to save.
+    """
+    with open(caminho + ".meta", "w", encoding="utf-8") as arquivo_meta:
+        json.dump(metadados, arquivo_meta)
+
+def consultar_servidor(web_address, sessao):
+    """Ask the server for the size and version of a file with a HEAD request.
+    Args:
+        web_address (str): file url.
+        sessao (Session): http session.
+    Return:
+        tuple: size (-1 when unknown), ETag or Last-Modified, and whether
+        Range requests are accepted.
+    """
+    cabecalho = sessao.head(web_address, allow_redirects=True, timeout=TIMEOUT)
+    cabecalho.raise_for_status()
+    return (int(cabecalho.headers.get("Content-Length", -1)),
+            cabecalho.headers.get("ETag") or cabecalho.headers.get("Last-Modified"),
+            cabecalho.headers.get("Accept-Ranges") == "bytes")
+
+def receber_arquivo(web_address, caminho, sessao, headers):
+    """Stream a GET response to disk, appending when the server answers
+    a Range request with 206 Partial Content.
+    Args:
+        web_address (str): file url.
+        caminho (str): local file path.
+        sessao (Session): http session.
+        headers (dict): request headers, with Range/If-Range when resuming.
+    Return:
+        tuple: bytes transferred and whether the download was resumed.
+    """
+    transferido = 0
+    with sessao.get(web_address, headers=headers, stream=True, timeout=TIMEOUT) as r:
+        r.raise_for_status()
+        retomado = r.status_code == 206
+        with open(caminho, "ab" if retomado else "wb") as f:
+            for bloco in r.iter_content(chunk_size=TAMANHO_BLOCO):
+                f.write(bloco)
+                transferido += len(bloco)
+    return transferido, retomado
+
+def caminho_local(args):
+    """Local path of the file downloaded by a baixar_arquivo call."""
+    return args["path"] + args["web_address"].split("/")[-1]
 
-def download_file(web_address, path):
+@instrumentar(arquivo=caminho_local)
+def baixar_arquivo(web_address, path, sessao):
+    """Download a file, skipping it when already complete and
+    resuming it with a Range request when partial.
+    Args:
+        web_address (str): file url.
+        path (str): file destination folder.
+        sessao (Session): http session.
+    Return:
+        resultado (dict): file name, status, bytes transferred and seconds.
+    """
+    inicio = time.perf_counter()
+    local_filename = web_address.split("/")[-1]
+    caminho = path + local_filename
+
+    tamanho_remoto, validador, aceita_range = consultar_servidor(web_address, sessao)
+
+    tamanho_local = os.path.getsize(caminho) if os.path.exists(caminho) else 0
+    validador_local = ler_metadados(caminho).get("validador")
+    if validador and validador_local and validador != validador_local:
+        # o arquivo mudou no servidor, o que existe localmente não serve mais
+        tamanho_local = 0
+
+    if tamanho_local and tamanho_local == tamanho_remoto:
+        return {"arquivo": local_filename, "status": "ignorado", "bytes": 0,
+                "segundos": time.perf_counter() - inicio}
+
+    headers = {}
+    if 0 < tamanho_local < tamanho_remoto and aceita_range:
+        headers["Range"] = f"bytes={tamanho_local}-"
+        if validador:
+            headers["If-Range"] = validador
+
+    escrever_metadados(caminho, {"validador": validador, "tamanho": tamanho_remoto})
+    transferido, retomado = receber_arquivo(web_address, caminho, sessao, headers)
+
+    return {"arquivo": local_filename, "status": "retomado" if retomado else "baixado",
+            "bytes": transferido, "segundos": time.perf_counter() - inicio}
+
+def download_file(web_address, path, sessao=None):
     """Download a file.
     Args:
         web_address (str): file url.
         path (str): file destination folder.
+        sessao (Session): http session, a new one is created when None.
     Return:
         local_filename (str): file name.
     """
-    local_filename = web_address.split("/")[-1]
-    with requests.get(web_address, stream=True) as r:
-        with open(path + local_filename, "wb") as f:
-            shutil.copyfileobj(r.raw, f)
-
-    return local_filename
-
-url = "https://www.gov.br/anp/pt-br/centrais-de-conteudo/dados-abertos/arquivos/shpc/dsas/ca/"
-lista = ["ca-2004-01.csv", "ca-2004-02.csv", "ca-2005-01.csv", "ca-2005-02.csv",
-         "ca-2006-01.csv", "ca-2006-02.csv", "ca-2007-01.csv", "ca-2007-02.csv",
-         "ca-2008-01.csv", "ca-2008-02.csv", "ca-2009-01.csv", "ca-2009-02.csv",
-         "ca-2010-01.csv", "ca-2010-02.csv", "ca-2011-01.csv", "ca-2011-02.csv",
-         "ca-2012-01.csv", "ca-2012-02.csv", "ca-2013-01.csv", "ca-2013-02.csv",
-         "ca-2014-01.csv", "ca-2014-02.csv", "ca-2015-01.csv", "ca-2015-02.csv",
-         "ca-2016-01.csv", "ca-2016-02.csv", "ca-2017-01.csv", "ca-2017-02.csv",
-         "ca-2018-01.csv", "ca-2018-02.csv", "ca-2019-01.csv", "ca-2019-02.csv",
-         "ca-2020-01.csv", "ca-2020-02.csv", "ca-2021-01.csv", "ca-2021-02.csv"]
-
-pasta_destino = "data/serie_historica_combustiveis/"
-
-for arquivo in lista:
-    nome_arquivo = download_file(url + arquivo, pasta_destino)
-    print(nome_arquivo + " baixado na pasta " + pasta_destino)
+    return baixar_arquivo(web_address, path, sessao or criar_sessao())["arquivo"]
+
+def baixar_serie(url, lista, pasta_destino, max_workers=4):
+    """Download every file of the list in parallel.
+    Args:
+        url (str): base url of the files.
+        lista (list): file names to download.
+        pasta_destino (str): file destination folder.
+        max_workers (int): files downloaded at the same time.
+    Return:
+        resultados (list): one result per file, in the order of lista.
+    """
+    os.makedirs(pasta_destino, exist_ok=True)
+    sessao = criar_sessao(max_workers)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futuros = [executor.submit(baixar_arquivo, url + arquivo, pasta_destino, sessao)
+                   for arquivo in lista]
+        resultados = []
+        for futuro in futuros:
+            resultado = futuro.result()
+            print(formatar_vazao(resultado))
+            resultados.append(resultado)
+    return resultados
+
+def formatar_vazao(resultado):
+    """Format the throughput of one download.
+    Args:
+        resultado (dict): result returned by baixar_arquivo.
+    Return:
+        string: file name, status, size, time and MiB/s.
+    """
+    mib = resultado["bytes"] / 2**20
+    segundos = resultado["segundos"]
+    vazao = mib / segundos if segundos else 0.0
+    return f"{resultado['arquivo']} {resultado['status']}: " \
+           f"{mib:.1f} MiB em {segundos:.1f} s ({vazao:.2f} MiB/s)"
+
+def main():
+    """Download the ANP historical series from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--url", default=URL_BASE)
+    parser.add_argument("--destino", default=PASTA_DESTINO)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--metricas", action="store_true",
+                        help="grava a medida de cada download no results.log")
+    args = parser.parse_args()
+    if args.metricas:
+        logging.basicConfig(filename="./results.log", level=logging.INFO, filemode="w",
+                            format="%(name)s - %(levelname)s - %(message)s")
+        ativar()
+
+    inicio = time.perf_counter()
+    resultados = baixar_serie(args.url, ARQUIVOS, args.destino, args.workers)
+    total = {"arquivo": "Total", "status": f"{len(resultados)} arquivos",
+             "bytes": sum(resultado["bytes"] for resultado in resultados),
+             "segundos": time.perf_counter() - inicio}
+    print(formatar_vazao(total))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Compara o tempo e o pico de memória de gerar os arquivos
+por estado e por região de um semestre chamando sh_estado
+e sh_regiao separadamente contra a leitura única feita
+por sh_estado_regiao, em memória e em blocos.
+
+Uso:
+    python benchmarks/benchmark_sh_estado_regiao.py \
+        data/serie_historica_combustiveis/ ca-2021-02.csv [tamanho_bloco]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# pylint: disable = wrong-import-position
+from tratar_serie_historica import sh_estado, sh_regiao, sh_estado_regiao
+
+def medir(funcao, *args, **kwargs):
+    """Run a function measuring wall time and tracemalloc peak.
+    Args:
+        funcao (callable): function to run.
+        args: positional arguments passed to funcao.
+        kwargs: keyword arguments passed to funcao.
+    Return:
+        tuple: (seconds, peak memory in MiB).
+    """
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    funcao(*args, **kwargs)
+    duracao = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return duracao, pico / 2**20
+
+def separado(nome_csv, pasta_dados, pasta_destino):
+    """Old path: two independent reads of the same semester file."""
+    sh_estado(nome_csv, pasta_dados, pasta_destino)
+    sh_regiao(nome_csv, pasta_dados, pasta_destino)
+
+def main(pasta_dados, nome_csv, tamanho_bloco=500_000):
+    """Print the comparison between both paths."""
+    with tempfile.TemporaryDirectory() as pasta_destino:
+        pasta_destino += os.sep
+        tempo_sep, pico_sep = medir(separado, nome_csv, pasta_dados, pasta_destino)
+        tempo_uni, pico_uni = medir(sh_estado_regiao, nome_csv, pasta_dados,
+                                    pasta_destino, pasta_destino)
+        tempo_blo, pico_blo = medir(sh_estado_regiao, nome_csv, pasta_dados,
+                                    pasta_destino, pasta_destino, tamanho_bloco=tamanho_bloco)
+
+    print(f"sh_estado + sh_regiao: {tempo_sep:8.2f} s  pico {pico_sep:8.1f} MiB")
+    print(f"sh_estado_regiao:      {tempo_uni:8.2f} s  pico {pico_uni:8.1f} MiB")
+    print(f"sh_estado_regiao em blocos de {tamanho_bloco}: "
+          f"{tempo_blo:8.2f} s  pico {pico_blo:8.1f} MiB")
+    print(f"ganho de tempo: {tempo_sep / tempo_uni:.2f}x")
+
+if __name__ == "__main__":
+    main(sys.argv[1], sys.argv[2], *map(int, sys.argv[3:4]))
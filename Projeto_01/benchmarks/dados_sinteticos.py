@@ -0,0 +1,145 @@
+"""
+Gera dados sintéticos para os benchmarks: arquivos no
+formato da série histórica da ANP, de 10 mil a dezenas
+de milhões de linhas, e versões ampliadas do imports-85
+usado na Atividade 3.
+
+Uso:
+    python benchmarks/dados_sinteticos.py anp destino.csv 1000000
+    python benchmarks/dados_sinteticos.py imports85 origem.data destino.data 100
+"""
+import sys
+
+import numpy as np
+import pandas as pd
+
+COLUNAS_ANP = ["Regiao - Sigla", "Estado - Sigla", "Municipio", "Revenda",
+               "CNPJ da Revenda", "Nome da Rua", "Numero Rua", "Complemento", "Bairro",
+               "Cep", "Produto", "Data da Coleta", "Valor de Venda", "Valor de Compra",
+               "Unidade de Medida", "Bandeira"]
+
+ESTADOS = {"N": ["AC", "AM", "AP", "PA", "RO", "RR", "TO"],
+           "NE": ["AL", "BA", "CE", "MA", "PB", "PE", "PI", "RN", "SE"],
+           "SE": ["ES", "MG", "RJ", "SP"],
+           "S": ["PR", "RS", "SC"],
+           "CO": ["DF", "GO", "MS", "MT"]}
+
+# preço médio aproximado de cada produto, em R$
+PRODUTOS = {"GASOLINA": 5.8, "GASOLINA ADITIVADA": 6.0, "ETANOL": 4.4,
+            "DIESEL": 4.6, "DIESEL S10": 4.7, "GNV": 4.2}
+BANDEIRAS = ["PETROBRAS DISTRIBUIDORA S.A.", "IPIRANGA", "RAIZEN", "BRANCA", "ALESAT"]
+
+MUNICIPIOS_POR_ESTADO = 40
+POSTOS = 40_000
+LINHAS_POR_BLOCO = 1_000_000
+
+def gerar_postos(rng, postos=POSTOS):
+    """Draw the gas stations every synthetic row is collected from.
+    Args:
+        rng (Generator): numpy random generator.
+        postos (int): number of stations.
+    Return:
+        df_postos (DataFrame): region, state, city, name, CNPJ, address
+        and brand of each station.
+    """
+    siglas = [(regiao, estado) for regiao, estados in ESTADOS.items() for estado in estados]
+    escolhidos = rng.integers(len(siglas), size=postos)
+    numeros = np.arange(postos)
+    return pd.DataFrame({
+        "Regiao - Sigla": [siglas[i][0] for i in escolhidos],
+        "Estado - Sigla": [siglas[i][1] for i in escolhidos],
+        "Municipio": [f"MUNICIPIO {siglas[i][1]} {m:02d}" for i, m in
+                      zip(escolhidos, rng.integers(MUNICIPIOS_POR_ESTADO, size=postos))],
+        "Revenda": [f"AUTO POSTO {n}" for n in numeros],
+        "CNPJ da Revenda": [f"{n // 1000:02d}.{n % 1000:03d}.000/0001-{n % 97:02d}"
+                            for n in numeros],
+        "Nome da Rua": "AVENIDA BRASIL",
+        "Numero Rua": (numeros % 2000 + 1).astype(str),
+        "Complemento": "",
+        "Bairro": "CENTRO",
+        "Cep": [f"{n % 100000:05d}-000" for n in numeros],
+        "Bandeira": rng.choice(BANDEIRAS, size=postos)})
+
+def gerar_bloco(rng, df_postos, linhas, ano, semestre):
+    """Draw one block of price collections.
+    Args:
+        rng (Generator): numpy random generator.
+        df_postos (DataFrame): stations returned by gerar_postos.
+        linhas (int): rows in the block.
+        ano (int): year of the collection dates.
+        semestre (int): 1 or 2, semester of the collection dates.
+    Return:
+        df_bloco (DataFrame): rows in the ANP column order.
+    """
+    df_bloco = df_postos.iloc[rng.integers(len(df_postos), size=linhas)]\
+                        .reset_index(drop=True)
+    produtos = np.array(list(PRODUTOS))
+    escolhidos = rng.integers(len(produtos), size=linhas)
+    df_bloco["Produto"] = produtos[escolhidos]
+    datas = pd.date_range(f"{ano}-{6 * semestre - 5:02d}-01", periods=181).strftime("%d/%m/%Y")
+    df_bloco["Data da Coleta"] = np.asarray(datas)[rng.integers(len(datas), size=linhas)]
+    precos = np.array(list(PRODUTOS.values()))[escolhidos] + rng.normal(scale=0.35, size=linhas)
+    df_bloco["Valor de Venda"] = np.round(precos, 2)
+    df_bloco["Valor de Compra"] = np.nan
+    df_bloco["Unidade de Medida"] = np.where(df_bloco["Produto"] == "GNV",
+                                             "R$ / m³", "R$ / litro")
+    return df_bloco[COLUNAS_ANP]
+
+def gerar_csv_anp(caminho, linhas, semente=1, ano=2021, semestre=1):
+    """Write a synthetic semester file in the ANP csv format
+    (";" separated, ISO-8859-1, decimal comma), block by block so
+    memory does not grow with the number of rows.
+    Args:
+        caminho (str): destination csv path.
+        linhas (int): number of rows.
+        semente (int): random seed, the same seed writes the same file.
+        ano (int): year of the collection dates.
+        semestre (int): 1 or 2, semester of the collection dates.
+    Return:
+        caminho (str): the csv path.
+    """
+    rng = np.random.default_rng(semente)
+    df_postos = gerar_postos(rng)
+    with open(caminho, "w", encoding="ISO-8859-1", newline="") as arquivo:
+        arquivo.write(";".join(COLUNAS_ANP) + "\n")
+        for inicio in range(0, linhas, LINHAS_POR_BLOCO):
+            bloco = gerar_bloco(rng, df_postos, min(LINHAS_POR_BLOCO, linhas - inicio),
+                                ano, semestre)
+            bloco.to_csv(arquivo, sep=";", decimal=",", float_format="%.2f",
+                         header=False, index=False)
+    return caminho
+
+def escalar_imports85(origem, destino, fator, semente=1):
+    """Write imports-85 resampled fator times. Numeric values of the
+    resampled rows get a jitter of 1% so the neighbor searches do not
+    only see exact duplicates; "?" values are kept as they are.
+    Args:
+        origem (str): original imports-85.data path.
+        destino (str): destination path, in the same format.
+        fator (int): how many times the number of rows is multiplied.
+        semente (int): random seed.
+    Return:
+        destino (str): the destination path.
+    """
+    rng = np.random.default_rng(semente)
+    df_carros = pd.read_csv(origem, header=None, dtype=str)
+    df_carros = df_carros.iloc[rng.integers(len(df_carros), size=len(df_carros) * fator)]\
+                         .reset_index(drop=True)
+    for coluna in df_carros.columns:
+        valores = pd.to_numeric(df_carros[coluna], errors="coerce")
+        if valores.notna().sum() < df_carros[coluna].ne("?").sum():
+            # coluna de texto, como "make" ou "body-style"
+            continue
+        inteiros = df_carros[coluna][valores.notna()].str.fullmatch(r"-?\d+").all()
+        ruido = valores * (1 + rng.normal(scale=0.01, size=len(valores)))
+        texto = ruido.round().astype("Int64") if inteiros else ruido.round(2)
+        texto = texto.astype(str)
+        df_carros[coluna] = texto.where(valores.notna(), "?")
+    df_carros.to_csv(destino, header=False, index=False)
+    return destino
+
+if __name__ == "__main__":
+    if sys.argv[1] == "anp":
+        print(gerar_csv_anp(sys.argv[2], int(sys.argv[3])))
+    else:
+        print(escalar_imports85(sys.argv[2], sys.argv[3], int(sys.argv[4])))
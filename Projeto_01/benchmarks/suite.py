@@ -0,0 +1,377 @@
+"""
+Suíte de benchmarks dos caminhos críticos do projeto:
+leitura dos csv da ANP (caminho antigo e leitor tipado,
+com os dois motores), tratamento da série histórica
+(sh_estado, sh_regiao e sh_estado_regiao), download_file, a renderização e a
+importação da partida do app.py e as varreduras de k
+do KNN da Atividade 3. Cada etapa roda em um processo novo e tem
+medidos o tempo, a vazão (linhas/s) e o pico de memória
+residente (RSS). Os resultados são gravados em JSON e
+duas execuções podem ser comparadas para apontar
+regressões.
+
+Uso (a partir da pasta Projeto_01):
+    python benchmarks/suite.py executar --linhas 1000000 --saida data/benchmarks/base.json
+    python benchmarks/suite.py executar --linhas 1000000 --saida data/benchmarks/novo.json
+    python benchmarks/suite.py comparar data/benchmarks/base.json data/benchmarks/novo.json \
+        --tolerancia 0.10
+"""
+# os módulos do projeto e os desta pasta são importados pelo sys.path, ajustado abaixo,
+# que o pylint não enxerga
+# pylint: disable = import-outside-toplevel, import-error
+import argparse
+import functools
+import importlib
+import importlib.util
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import runpy
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+PASTA_BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+PASTA_PROJETO = os.path.dirname(PASTA_BENCHMARKS)
+PASTA_KNN = os.path.join(os.path.dirname(PASTA_PROJETO), "Atividade 3 - Unidade 1")
+PASTA_SINTETICOS = os.path.join(PASTA_PROJETO, "data", "benchmarks")
+
+sys.path.insert(0, PASTA_PROJETO)
+sys.path.insert(0, PASTA_BENCHMARKS)
+
+# módulo da Atividade 3 -> módulos da mesma pasta que ele importa
+MODULOS_KNN = {"knn_preprocessing": [], "knn_engine": [], "knn_cv": ["knn_engine"]}
+
+K_VALUES = list(range(1, 25))
+TAMANHO_BLOCO = 500_000
+
+def rss_pico_mib():
+    """Peak resident memory of the current process.
+    Return:
+        float: peak RSS in MiB (ru_maxrss is in KiB on Linux and bytes on macOS).
+    """
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / 2**20 if sys.platform == "darwin" else pico / 2**10
+
+def etapa_leitura_anp_antiga(contexto):
+    """Synthetic semester read as text, with the prices and the date
+    converted in a second pass."""
+    from leitor_anp import ler_antigo
+    return len(ler_antigo(os.path.join(contexto["pasta_dados"], contexto["nome_csv"])))
+
+def etapa_leitura_anp(contexto):
+    """Typed read of the synthetic semester with the pandas C parser."""
+    from leitor_anp import ler_anp
+    return len(ler_anp(os.path.join(contexto["pasta_dados"], contexto["nome_csv"])))
+
+def etapa_leitura_anp_pyarrow(contexto):
+    """Typed read of the synthetic semester with the multithreaded pyarrow reader."""
+    from leitor_anp import ler_anp
+    return len(ler_anp(os.path.join(contexto["pasta_dados"], contexto["nome_csv"]),
+                       motor="pyarrow"))
+
+def etapa_sh_estado(contexto):
+    """States file of the synthetic semester."""
+    from tratar_serie_historica import sh_estado
+    sh_estado(contexto["nome_csv"], contexto["pasta_dados"], contexto["pasta_saida"])
+    return contexto["linhas"]
+
+def etapa_sh_regiao(contexto):
+    """Regions file of the synthetic semester."""
+    from tratar_serie_historica import sh_regiao
+    sh_regiao(contexto["nome_csv"], contexto["pasta_dados"], contexto["pasta_saida"])
+    return contexto["linhas"]
+
+def etapa_sh_estado_regiao(contexto):
+    """States and regions files with a single read."""
+    from tratar_serie_historica import sh_estado_regiao
+    sh_estado_regiao(contexto["nome_csv"], contexto["pasta_dados"],
+                     contexto["pasta_saida"], contexto["pasta_saida"])
+    return contexto["linhas"]
+
+def etapa_sh_estado_regiao_blocos(contexto):
+    """States and regions files streaming the csv in chunks."""
+    from tratar_serie_historica import sh_estado_regiao
+    sh_estado_regiao(contexto["nome_csv"], contexto["pasta_dados"],
+                     contexto["pasta_saida"], contexto["pasta_saida"],
+                     tamanho_bloco=TAMANHO_BLOCO)
+    return contexto["linhas"]
+
+class ServidorSilencioso(SimpleHTTPRequestHandler):
+    """Static file handler that does not log every request to stderr."""
+    def log_message(self, format, *args): # pylint: disable=redefined-builtin
+        pass
+
+def etapa_download_file(contexto):
+    """Download of the synthetic semester from a local http server."""
+    from baixar_serie_historica import download_file
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(
+        ServidorSilencioso, directory=contexto["pasta_dados"]))
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    try:
+        download_file(f"http://127.0.0.1:{servidor.server_port}/{contexto['nome_csv']}",
+                      contexto["pasta_saida"])
+    finally:
+        servidor.shutdown()
+    return contexto["linhas"]
+
+def etapa_app(contexto): # pylint: disable=unused-argument
+    """Run of app.py with its default section, as streamlit does on every
+    rerun. The app reads the project data, so its size does not follow --linhas."""
+    runpy.run_path(os.path.join(PASTA_PROJETO, "app.py"), run_name="__main__")
+
+def etapa_importacao_app(contexto): # pylint: disable=unused-argument
+    """Cold import of the modules app.py loads at start, in a fresh
+    interpreter with -X importtime (see tempo_importacao.py)."""
+    from tempo_importacao import CAMINHO_APP, importacoes_modulo, medir_importacao
+    medir_importacao(importacoes_modulo(CAMINHO_APP))
+
+def importar_knn(nome):
+    """Import a module of the KNN activity from its file, without putting
+    its folder, whose name has spaces, in sys.path.
+    Args:
+        nome (str): key of MODULOS_KNN.
+    Return:
+        module: the imported module, also registered in sys.modules so the
+        modules that import it find it.
+    """
+    if nome not in sys.modules:
+        for dependencia in MODULOS_KNN[nome]:
+            importar_knn(dependencia)
+        spec = importlib.util.spec_from_file_location(nome, os.path.join(PASTA_KNN, nome + ".py"))
+        modulo = importlib.util.module_from_spec(spec)
+        sys.modules[nome] = modulo
+        spec.loader.exec_module(modulo)
+    return sys.modules[nome]
+
+def carregar_carros(contexto):
+    """numeric_cars of the scaled imports-85, cached inside the run folder."""
+    return importar_knn("knn_preprocessing").load_numeric_cars(
+        contexto["imports85"], os.path.join(contexto["pasta_saida"], "cache_knn"))
+
+def etapa_knn_train_test_sweep(contexto):
+    """Holdout k sweep of every single feature, as knn_train_test_2 does."""
+    numeric_cars = carregar_carros(contexto)
+    knn_train_test_sweep = importar_knn("knn_engine").knn_train_test_sweep
+    for coluna in numeric_cars.columns.drop("price"):
+        knn_train_test_sweep(coluna, "price", numeric_cars, K_VALUES)
+    return len(numeric_cars)
+
+def etapa_knn_cross_validate(contexto):
+    """5-fold k sweep of every single feature."""
+    numeric_cars = carregar_carros(contexto)
+    knn_cross_validate = importar_knn("knn_cv").knn_cross_validate
+    for coluna in numeric_cars.columns.drop("price"):
+        knn_cross_validate(coluna, "price", numeric_cars, K_VALUES)
+    return len(numeric_cars)
+
+# etapa -> (função, módulos importados antes de começar a medir o tempo)
+ETAPAS = {"leitura_anp_antiga": (etapa_leitura_anp_antiga, ["leitor_anp"]),
+          "leitura_anp": (etapa_leitura_anp, ["leitor_anp"]),
+          "leitura_anp_pyarrow": (etapa_leitura_anp_pyarrow, ["leitor_anp", "pyarrow.csv"]),
+          "sh_estado": (etapa_sh_estado, ["tratar_serie_historica"]),
+          "sh_regiao": (etapa_sh_regiao, ["tratar_serie_historica"]),
+          "sh_estado_regiao": (etapa_sh_estado_regiao, ["tratar_serie_historica"]),
+          "sh_estado_regiao_blocos": (etapa_sh_estado_regiao_blocos,
+                                      ["tratar_serie_historica"]),
+          "download_file": (etapa_download_file, ["baixar_serie_historica"]),
+          "app": (etapa_app, ["streamlit", "plotly.express", "matplotlib.figure",
+                              "cache_parquet", "motor_precos"]),
+          "importacao_app": (etapa_importacao_app, ["tempo_importacao"]),
+          "knn_train_test_sweep": (etapa_knn_train_test_sweep,
+                                   ["knn_preprocessing", "knn_engine"]),
+          "knn_cross_validate": (etapa_knn_cross_validate, ["knn_preprocessing", "knn_cv"])}
+
+def medir_etapa(nome, contexto):
+    """Run one stage in the current process, measuring it.
+    Args:
+        nome (str): key of ETAPAS.
+        contexto (dict): input files and output folder of the run.
+    Return:
+        medida (dict): seconds, rows, RSS before the stage and peak RSS.
+    """
+    os.chdir(PASTA_PROJETO)
+    funcao, modulos = ETAPAS[nome]
+    for modulo in modulos:
+        if modulo in MODULOS_KNN:
+            importar_knn(modulo)
+        else:
+            importlib.import_module(modulo)
+    rss_inicial = rss_pico_mib()
+    with tempfile.TemporaryDirectory() as pasta_saida:
+        contexto = dict(contexto, pasta_saida=pasta_saida + os.sep)
+        inicio = time.perf_counter()
+        linhas = funcao(contexto)
+        segundos = time.perf_counter() - inicio
+    return {"segundos": segundos, "linhas": linhas,
+            "rss_inicial_mib": rss_inicial, "rss_pico_mib": rss_pico_mib()}
+
+def medir_em_processo_novo(nome, contexto):
+    """Run medir_etapa in a freshly spawned process, so the peak RSS of
+    a stage is not hidden by the stages that ran before it."""
+    with ProcessPoolExecutor(max_workers=1,
+                             mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(medir_etapa, nome, contexto).result()
+
+def preparar_dados(linhas, fator_knn, semente=1, pasta=PASTA_SINTETICOS):
+    """Generate the synthetic inputs of a run, reusing the files of
+    previous runs with the same size and seed.
+    Args:
+        linhas (int): rows of the synthetic ANP semester.
+        fator_knn (int): how many times imports-85 is scaled.
+        semente (int): random seed.
+        pasta (str): folder where the synthetic files are kept.
+    Return:
+        contexto (dict): paths and sizes handed to the stages.
+    """
+    from dados_sinteticos import escalar_imports85, gerar_csv_anp
+    os.makedirs(pasta, exist_ok=True)
+    # o nome não segue o padrão ca-AAAA-SS.csv para que o cache parquet não seja usado
+    nome_csv = f"ca-sintetico-{linhas}-{semente}.csv"
+    if not os.path.exists(os.path.join(pasta, nome_csv)):
+        gerar_csv_anp(os.path.join(pasta, nome_csv), linhas, semente)
+    imports85 = os.path.join(pasta, f"imports-85-x{fator_knn}-{semente}.data")
+    if not os.path.exists(imports85):
+        escalar_imports85(os.path.join(PASTA_KNN, "imports-85.data"), imports85,
+                          fator_knn, semente)
+    return {"nome_csv": nome_csv, "pasta_dados": pasta + os.sep, "linhas": linhas,
+            "imports85": imports85}
+
+def versao_codigo():
+    """Current git commit, None outside a repository."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PASTA_PROJETO,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def executar(etapas, linhas, fator_knn, repeticoes=3, semente=1):
+    """Measure the stages, keeping the fastest of some repetitions.
+    Args:
+        etapas (list): keys of ETAPAS to run.
+        linhas (int): rows of the synthetic ANP semester.
+        fator_knn (int): how many times imports-85 is scaled.
+        repeticoes (int): runs of each stage.
+        semente (int): random seed of the synthetic data.
+    Return:
+        resultados (dict): run metadata and one entry per stage.
+    """
+    contexto = preparar_dados(linhas, fator_knn, semente)
+    resultados = {"data": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": versao_codigo(),
+                  "python": platform.python_version(), "plataforma": platform.platform(),
+                  "cpus": os.cpu_count(), "linhas": linhas, "fator_knn": fator_knn,
+                  "repeticoes": repeticoes, "etapas": {}}
+    for nome in etapas:
+        try:
+            medidas = [medir_em_processo_novo(nome, contexto) for _ in range(repeticoes)]
+        except Exception as erro: # pylint: disable=broad-except
+            resultados["etapas"][nome] = {"erro": repr(erro)}
+            print(f"{nome:24} erro: {erro!r}")
+            continue
+        melhor = min(medidas, key=lambda medida: medida["segundos"])
+        melhor["tempos"] = [medida["segundos"] for medida in medidas]
+        melhor["rss_pico_mib"] = min(medida["rss_pico_mib"] for medida in medidas)
+        melhor["linhas_por_segundo"] = melhor["linhas"] / melhor["segundos"] \
+                                       if melhor["linhas"] else None
+        resultados["etapas"][nome] = melhor
+        print(formatar_medida(nome, melhor))
+    return resultados
+
+def formatar_medida(nome, medida):
+    """One line with the time, throughput and peak RSS of a stage."""
+    vazao = medida["linhas_por_segundo"]
+    vazao = f"{vazao:12,.0f} linhas/s" if vazao else " " * 21
+    return f"{nome:24} {medida['segundos']:9.3f} s {vazao}  pico {medida['rss_pico_mib']:8.1f} MiB"
+
+def comparar(base, novo, tolerancia=0.10):
+    """Compare two runs stage by stage.
+    Args:
+        base (dict): reference results, as written by executar.
+        novo (dict): results to check.
+        tolerancia (float): relative growth of time or peak RSS accepted
+            before a stage is flagged, 0.10 means 10%.
+    Return:
+        linhas (list): (stage, metric, base value, new value, ratio,
+        regression) for every metric present in both runs, plus an
+        "erro" line for stages that only fail in the new run.
+    """
+    linhas = []
+    for nome, medida_base in base["etapas"].items():
+        medida_nova = novo["etapas"].get(nome, {})
+        if "erro" in medida_nova and "erro" not in medida_base:
+            # a etapa funcionava na base e agora falha
+            linhas.append((nome, "erro", None, None, None, True))
+        for metrica in ("segundos", "rss_pico_mib"):
+            if metrica not in medida_base or metrica not in medida_nova:
+                continue
+            razao = medida_nova[metrica] / medida_base[metrica]
+            linhas.append((nome, metrica, medida_base[metrica], medida_nova[metrica],
+                           razao, razao > 1 + tolerancia))
+    return linhas
+
+def imprimir_comparacao(caminho_base, caminho_novo, tolerancia):
+    """Print the comparison of two result files.
+    Args:
+        caminho_base (str): reference results json.
+        caminho_novo (str): results json to check.
+        tolerancia (float): accepted relative growth, see comparar.
+    Return:
+        int: 1 when a regression was found, 0 otherwise.
+    """
+    with open(caminho_base, encoding="utf-8") as arquivo:
+        base = json.load(arquivo)
+    with open(caminho_novo, encoding="utf-8") as arquivo:
+        novo = json.load(arquivo)
+    if (base["linhas"], base["fator_knn"]) != (novo["linhas"], novo["fator_knn"]):
+        print("aviso: as execuções usaram dados de tamanhos diferentes")
+    linhas = comparar(base, novo, tolerancia)
+    for nome, metrica, valor_base, valor_novo, razao, regressao in linhas:
+        if razao is None:
+            print(f"{nome:24} {novo['etapas'][nome]['erro']}  REGRESSÃO")
+            continue
+        print(f"{nome:24} {metrica:13} {valor_base:10.3f} -> {valor_novo:10.3f} "
+              f"({razao:5.2f}x){'  REGRESSÃO' if regressao else ''}")
+    return 1 if any(linha[-1] for linha in linhas) else 0
+
+def main():
+    """Run or compare the benchmarks from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    parser_executar = comandos.add_parser("executar", help="mede as etapas")
+    parser_executar.add_argument("--linhas", type=int, default=100_000,
+                                 help="linhas do semestre sintético (10 mil a 50 milhões)")
+    parser_executar.add_argument("--fator-knn", type=int, default=10,
+                                 help="quantas vezes o imports-85 é ampliado")
+    parser_executar.add_argument("--etapas", nargs="+", choices=list(ETAPAS),
+                                 default=list(ETAPAS))
+    parser_executar.add_argument("--repeticoes", type=int, default=3)
+    parser_executar.add_argument("--semente", type=int, default=1)
+    parser_executar.add_argument("--saida", default="data/benchmarks/resultados.json",
+                                 help="json dos resultados (data/benchmarks/ não é versionada)")
+
+    parser_comparar = comandos.add_parser("comparar", help="aponta regressões")
+    parser_comparar.add_argument("base")
+    parser_comparar.add_argument("novo")
+    parser_comparar.add_argument("--tolerancia", type=float, default=0.10)
+    args = parser.parse_args()
+
+    if args.comando == "executar":
+        resultados = executar(args.etapas, args.linhas, args.fator_knn, args.repeticoes,
+                              args.semente)
+        os.makedirs(os.path.dirname(args.saida) or ".", exist_ok=True)
+        with open(args.saida, "w", encoding="utf-8") as arquivo:
+            json.dump(resultados, arquivo, indent=2)
+        print(f"resultados gravados em {args.saida}")
+        return 0
+
+    return imprimir_comparacao(args.base, args.novo, args.tolerancia)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""
+Mede o tempo de importação da partida do app.py com
+python -X importtime em um processo novo: são importados
+os módulos que o app.py importa no nível do módulo (as
+bibliotecas dos gráficos ficam dentro das seções e só
+são importadas quando a seção é aberta). O total é
+comparado com um orçamento, e os módulos mais caros são
+listados para achar quem estourou.
+
+Uso (a partir da pasta Projeto_01):
+    python benchmarks/tempo_importacao.py --orcamento 2000 --top 15
+    python benchmarks/tempo_importacao.py --modulos plotly.express matplotlib.figure
+"""
+import argparse
+import ast
+import os
+import subprocess
+import sys
+
+PASTA_PROJETO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CAMINHO_APP = os.path.join(PASTA_PROJETO, "app.py")
+
+# orçamento da partida do app.py, em milissegundos
+ORCAMENTO_MS = 2000
+
+def importacoes_modulo(caminho):
+    """Modules imported at the top level of a script.
+    Args:
+        caminho (str): python file path.
+    Return:
+        modulos (list): imported module names, in file order, without
+        repetitions; imports inside functions are left out.
+    """
+    with open(caminho, encoding="utf-8") as arquivo:
+        arvore = ast.parse(arquivo.read())
+    modulos = []
+    for no in arvore.body:
+        if isinstance(no, ast.Import):
+            modulos += [nome.name for nome in no.names]
+        elif isinstance(no, ast.ImportFrom) and no.level == 0:
+            modulos.append(no.module)
+    return list(dict.fromkeys(modulos))
+
+def medir_importacao(modulos):
+    """Import modules in a fresh interpreter with -X importtime.
+    Args:
+        modulos (list): module names to import.
+    Return:
+        medidas (list): (module, self microseconds, cumulative microseconds,
+        nesting level) per module loaded, in the order python reports them.
+    Raise:
+        RuntimeError: when the import fails, with the end of stderr.
+    """
+    processo = subprocess.run([sys.executable, "-X", "importtime", "-c",
+                               "import " + ", ".join(modulos)],
+                              cwd=PASTA_PROJETO, capture_output=True, text=True, check=False)
+    if processo.returncode != 0:
+        raise RuntimeError(processo.stderr.strip().splitlines()[-1])
+    medidas = []
+    for linha in processo.stderr.splitlines():
+        if not linha.startswith("import time:") or "[us]" in linha:
+            continue
+        proprio, cumulativo, nome = linha[len("import time:"):].split("|")
+        nivel = (len(nome) - len(nome.lstrip()) - 1) // 2
+        medidas.append((nome.strip(), int(proprio), int(cumulativo), nivel))
+    return medidas
+
+def mais_caros(medidas, top=15):
+    """Top level modules sorted by cumulative import time.
+    Args:
+        medidas (list): returned by medir_importacao.
+        top (int): modules kept.
+    Return:
+        tuple: (total milliseconds, [(module, cumulative milliseconds)]).
+    """
+    raizes = [(nome, cumulativo / 1000) for nome, _, cumulativo, nivel in medidas if nivel == 0]
+    return sum(ms for _, ms in raizes), sorted(raizes, key=lambda raiz: -raiz[1])[:top]
+
+def main():
+    """Check the import time of the app start against the budget."""
+    parser = argparse.ArgumentParser(description="Tempo de importação da partida do app.py.")
+    parser.add_argument("--modulos", nargs="+", default=None,
+                        help="módulos a medir, os do nível do módulo do app.py por padrão")
+    parser.add_argument("--orcamento", type=float, default=ORCAMENTO_MS,
+                        help="orçamento em milissegundos")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    modulos = args.modulos or importacoes_modulo(CAMINHO_APP)
+    try:
+        total, raizes = mais_caros(medir_importacao(modulos), args.top)
+    except RuntimeError as erro:
+        print(f"erro ao importar {', '.join(modulos)}: {erro}")
+        return 2
+    for nome, milissegundos in raizes:
+        print(f"{nome:40} {milissegundos:9.1f} ms")
+    print(f"{'total':40} {total:9.1f} ms (orçamento {args.orcamento:.0f} ms)")
+    if total > args.orcamento:
+        print("ORÇAMENTO ESTOURADO")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
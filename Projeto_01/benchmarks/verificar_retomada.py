@@ -0,0 +1,173 @@
+"""
+Verifica o download com retomada do baixar_serie_historica.py
+contra um servidor http local que atende requisições Range e
+If-Range: o download completo, o arquivo já completo ignorado,
+o arquivo parcial retomado com 206, o If-Range desatualizado
+respondido com o arquivo inteiro (200), o arquivo que mudou no
+servidor baixado de novo e o servidor sem Range. Em cada caso
+o arquivo local é comparado byte a byte com o do servidor.
+
+Uso (a partir da pasta Projeto_01):
+    python benchmarks/verificar_retomada.py --tamanho 5000000
+"""
+import argparse
+import functools
+import os
+import sys
+import tempfile
+import threading
+from http import HTTPStatus
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+PASTA_PROJETO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PASTA_PROJETO)
+
+# o módulo está na pasta do projeto, posta no sys.path acima (ele também importa o metricas);
+# o pylint só enxerga a pasta benchmarks
+from baixar_serie_historica import ( # pylint: disable=wrong-import-position, import-error
+    baixar_arquivo, criar_sessao, receber_arquivo)
+
+NOME_ARQUIVO = "ca-retomada.csv"
+
+class ServidorRange(SimpleHTTPRequestHandler):
+    """Static file handler with ETag, Range and If-Range, which
+    SimpleHTTPRequestHandler does not implement. Range support can be
+    turned off with the aceita_range class attribute."""
+    aceita_range = True
+
+    def log_message(self, format, *args): # pylint: disable=redefined-builtin
+        pass
+
+    def etag(self, caminho):
+        """Validator of a file, from its size and modification time."""
+        status = os.stat(caminho)
+        return f'"{status.st_size:x}-{status.st_mtime_ns:x}"'
+
+    def inicio_range(self, caminho, tamanho):
+        """First byte asked by a "bytes=N-" Range header, None when the
+        whole file must be sent (no Range, or an If-Range that does not match)."""
+        pedido = self.headers.get("Range", "")
+        if not self.aceita_range or not pedido.startswith("bytes="):
+            return None
+        validador = self.headers.get("If-Range")
+        if validador and validador != self.etag(caminho):
+            return None
+        inicio = int(pedido[len("bytes="):].split("-")[0])
+        return inicio if inicio < tamanho else None
+
+    def send_head(self):
+        caminho = self.translate_path(self.path)
+        if not os.path.isfile(caminho):
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return None
+        tamanho = os.path.getsize(caminho)
+        inicio = self.inicio_range(caminho, tamanho)
+        arquivo = open(caminho, "rb") # pylint: disable=consider-using-with
+        if inicio is None:
+            self.send_response(HTTPStatus.OK)
+            inicio = 0
+        else:
+            self.send_response(HTTPStatus.PARTIAL_CONTENT)
+            self.send_header("Content-Range", f"bytes {inicio}-{tamanho - 1}/{tamanho}")
+            arquivo.seek(inicio)
+        self.send_header("Content-Type", "text/csv")
+        self.send_header("Content-Length", str(tamanho - inicio))
+        self.send_header("ETag", self.etag(caminho))
+        if self.aceita_range:
+            self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        return arquivo
+
+def escrever_origem(caminho, tamanho, semente):
+    """Write a file of pseudo random csv rows on the server side."""
+    linhas = []
+    total = 0
+    numero = semente
+    while total < tamanho:
+        numero = (numero * 1103515245 + 12345) % 2**31
+        linha = f"RN;NATAL;GASOLINA;{numero % 1000 / 100 + 4:.2f}\n"
+        linhas.append(linha)
+        total += len(linha)
+    with open(caminho, "w", encoding="utf-8") as arquivo:
+        arquivo.write("".join(linhas)[:tamanho])
+
+def truncar(caminho, fracao):
+    """Keep only the first part of a downloaded file, as an interrupted download."""
+    with open(caminho, "r+b") as arquivo:
+        arquivo.truncate(int(os.path.getsize(caminho) * fracao))
+
+def iguais(caminho_a, caminho_b):
+    """Whether two files have the same bytes."""
+    with open(caminho_a, "rb") as arquivo_a, open(caminho_b, "rb") as arquivo_b:
+        return arquivo_a.read() == arquivo_b.read()
+
+def verificar(tamanho):
+    """Run every resume case against a local server.
+    Args:
+        tamanho (int): size in bytes of the file served.
+    Return:
+        casos (list): (case, expected status, result of baixar_arquivo or
+        receber_arquivo, whether the local file matches the server's).
+    """
+    with tempfile.TemporaryDirectory() as pasta_servidor, \
+         tempfile.TemporaryDirectory() as pasta_local:
+        origem = os.path.join(pasta_servidor, NOME_ARQUIVO)
+        destino = os.path.join(pasta_local, NOME_ARQUIVO)
+        escrever_origem(origem, tamanho, 1)
+
+        servidor = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(
+            ServidorRange, directory=pasta_servidor))
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{servidor.server_port}/{NOME_ARQUIVO}"
+        sessao = criar_sessao(1)
+        casos = []
+
+        def baixar(caso, esperado):
+            resultado = baixar_arquivo(url, pasta_local + os.sep, sessao)
+            casos.append((caso, esperado, resultado, iguais(origem, destino)))
+
+        try:
+            baixar("download completo", "baixado")
+            baixar("arquivo já completo", "ignorado")
+            truncar(destino, 0.4)
+            baixar("arquivo parcial", "retomado")
+
+            # o validador mudou entre o HEAD e o GET: o servidor ignora o Range
+            truncar(destino, 0.4)
+            transferido, retomado = receber_arquivo(
+                url, destino, sessao,
+                {"Range": f"bytes={os.path.getsize(destino)}-", "If-Range": '"antigo"'})
+            casos.append(("If-Range desatualizado", "baixado",
+                          {"status": "retomado" if retomado else "baixado",
+                           "bytes": transferido}, iguais(origem, destino)))
+
+            truncar(destino, 0.4)
+            escrever_origem(origem, tamanho, 2)
+            baixar("arquivo mudou no servidor", "baixado")
+
+            ServidorRange.aceita_range = False
+            truncar(destino, 0.4)
+            baixar("servidor sem Range", "baixado")
+        finally:
+            ServidorRange.aceita_range = True
+            servidor.shutdown()
+            servidor.server_close()
+    return casos
+
+def main():
+    """Check the download resume from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--tamanho", type=int, default=5_000_000,
+                        help="bytes do arquivo servido")
+    args = parser.parse_args()
+
+    falhas = 0
+    for caso, esperado, resultado, conteudo_igual in verificar(args.tamanho):
+        ok = resultado["status"] == esperado and conteudo_igual
+        falhas += not ok
+        print(f"{caso:28} {resultado['status']:9} {resultado['bytes']:12,} bytes  "
+              f"{'ok' if ok else f'FALHA (esperado {esperado}, conteúdo igual: {conteudo_igual})'}")
+    return 1 if falhas else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
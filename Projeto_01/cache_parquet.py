@@ -0,0 +1,430 @@
+"""
+Autor: Matheus Silva
+Data: Maio 2022
+Este projeto converte os arquivos csv da série
+histórica do preço dos combustíveis em um cache
+parquet tipado, particionado por ano e semestre,
+para que os leitores não precisem interpretar os
+csv novamente a cada execução.
+
+Cada partição tem também um índice (indice.parquet)
+com as faixas de linhas de cada município e de cada
+revenda (CNPJ), para que uma consulta leia apenas os
+grupos de linhas onde eles estão.
+
+Uso:
+    python cache_parquet.py [pasta_dados] [pasta_cache]
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+
+import numpy as np
+import pandas as pd
+
+from leitor_anp import blocos_anp, ler_anp
+from metricas import instrumentar
+
+PASTA_DADOS = "data/serie_historica_combustiveis/"
+PASTA_CACHE = "data/cache_parquet/"
+
+COLUNAS_CATEGORICAS = ["Regiao - Sigla", "Estado - Sigla", "Municipio", "Produto",
+                       "Unidade de Medida", "Bandeira"]
+
+LINHAS_POR_GRUPO = 50_000
+# mudou a ordem das linhas ou o índice: partições de versões antigas são refeitas
+VERSAO_CACHE = 2
+
+COLUNAS_ORDEM = ["Produto", "Estado - Sigla", "Municipio", "CNPJ da Revenda"]
+# tipo de chave do índice -> colunas cujas linhas iguais ficam contíguas
+CHAVES_INDICE = {"Municipio": COLUNAS_ORDEM[:3], "CNPJ da Revenda": COLUNAS_ORDEM}
+
+def caminho_cache(file_path, pasta_cache=PASTA_CACHE):
+    """Partition directory of a semester file inside the cache.
+    Args:
+        file_path (str): semester csv path, e.g. ".../ca-2021-02.csv".
+        pasta_cache (str): cache root folder.
+    Return:
+        string: partition folder, None when the name is not a semester file.
+    """
+    semestre = re.search(r"ca-(\d{4})-(\d{2})\.csv$", file_path)
+    if semestre is None:
+        return None
+    return os.path.join(pasta_cache, f"ano={semestre.group(1)}",
+                        f"semestre={semestre.group(2)}")
+
+def hash_arquivo(file_path):
+    """Sha256 of a file, read in blocks.
+    Args:
+        file_path (str): file path to hash.
+    Return:
+        string: hex digest.
+    """
+    sha = hashlib.sha256()
+    with open(file_path, "rb") as arquivo:
+        for bloco in iter(lambda: arquivo.read(1024 * 1024), b""):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+def ler_manifesto(pasta):
+    """Read the manifest of a cache partition.
+    Args:
+        pasta (str): partition folder.
+    Return:
+        manifesto (dict): saved manifest, empty when there is none.
+    """
+    try:
+        with open(os.path.join(pasta, "manifesto.json"), encoding="utf-8") as arquivo:
+            return json.load(arquivo)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def escrever_manifesto(pasta, manifesto):
+    """Write the manifest of a cache partition.
+    Args:
+        pasta (str): partition folder.
+        manifesto (dict): source size, mtime and hash.
+    """
+    with open(os.path.join(pasta, "manifesto.json"), "w", encoding="utf-8") as arquivo:
+        json.dump(manifesto, arquivo)
+
+def manifesto_fonte(file_path):
+    """Manifest fields that identify the source csv of a partition.
+    Args:
+        file_path (str): semester csv path.
+    Return:
+        manifesto (dict): source size, mtime and hash.
+    """
+    estado = os.stat(file_path)
+    return {"tamanho": estado.st_size, "mtime": estado.st_mtime_ns,
+            "sha256": hash_arquivo(file_path)}
+
+def manifesto_valido(file_path, pasta, nome_arquivo, versao=None, sem_fonte=True):
+    """Check whether a file derived from a semester still matches its
+    source csv. Size and mtime are compared first; the hash is only
+    recomputed when they changed.
+    Args:
+        file_path (str): semester csv path.
+        pasta (str): partition folder, with the manifest written from
+            manifesto_fonte.
+        nome_arquivo (str): derived file inside the partition, e.g. "dados.parquet".
+        versao (int): layout version the manifest must record, any when None.
+        sem_fonte (bool): whether the derived file is used when the csv is
+            missing (e.g. deleted after the conversion to save space); there
+            is then nothing to compare it with, so only the version is checked.
+    Return:
+        bool: True when the derived file can be used instead of the csv.
+    """
+    if pasta is None or not os.path.exists(os.path.join(pasta, nome_arquivo)):
+        return False
+    manifesto = ler_manifesto(pasta)
+    if not manifesto or (versao is not None and manifesto.get("versao") != versao):
+        return False
+    if not os.path.exists(file_path):
+        return sem_fonte
+    estado = os.stat(file_path)
+    if manifesto.get("tamanho") == estado.st_size and \
+       manifesto.get("mtime") == estado.st_mtime_ns:
+        return True
+    if manifesto.get("sha256") != hash_arquivo(file_path):
+        return False
+    manifesto.update({"tamanho": estado.st_size, "mtime": estado.st_mtime_ns})
+    escrever_manifesto(pasta, manifesto)
+    return True
+
+def cache_valido(file_path, pasta_cache=PASTA_CACHE, sem_fonte=True):
+    """Check whether the cached partition still matches the source csv and
+    was written with the current layout (VERSAO_CACHE).
+    Args:
+        file_path (str): semester csv path.
+        pasta_cache (str): cache root folder.
+        sem_fonte (bool): whether a partition whose csv is missing is used.
+    Return:
+        bool: True when the parquet file can be used instead of the csv.
+    """
+    return manifesto_valido(file_path, caminho_cache(file_path, pasta_cache), "dados.parquet",
+                            versao=VERSAO_CACHE, sem_fonte=sem_fonte)
+
+def tipar_semestre(df_file):
+    """Sort a typed semester into the cache layout.
+    Args:
+        df_file (DataFrame): semester read by leitor_anp.ler_anp, with
+            float32 prices and datetime collection date.
+    Return:
+        df_file (DataFrame): sorted by COLUNAS_ORDEM so each product sits
+        in few row groups and each city and station in contiguous rows,
+        with COLUNAS_CATEGORICAS as categories.
+    """
+    df_file = df_file.sort_values(COLUNAS_ORDEM, kind="stable")\
+                     .reset_index(drop=True)
+    for coluna in COLUNAS_CATEGORICAS:
+        df_file[coluna] = df_file[coluna].astype("category")
+    return df_file
+
+def indexar_semestre(df_file):
+    """Row ranges of every city and station of a typed semester.
+    Args:
+        df_file (DataFrame): semester returned by tipar_semestre.
+    Return:
+        df_indice (DataFrame): "tipo" (key column), "chave", "Estado - Sigla",
+        "Produto" and the [inicio, fim) rows of each run of equal keys,
+        sorted by tipo and chave.
+    """
+    partes = []
+    for tipo, colunas in CHAVES_INDICE.items():
+        codigos = np.column_stack([pd.factorize(df_file[coluna])[0] for coluna in colunas])
+        inicios = np.flatnonzero(np.r_[True, (codigos[1:] != codigos[:-1]).any(axis=1)])
+        fins = np.r_[inicios[1:], len(df_file)]
+        partes.append(pd.DataFrame({
+            "tipo": tipo,
+            "chave": df_file[tipo].iloc[inicios].astype(str).to_numpy(),
+            "Estado - Sigla": df_file["Estado - Sigla"].iloc[inicios].astype(str).to_numpy(),
+            "Produto": df_file["Produto"].iloc[inicios].astype(str).to_numpy(),
+            "inicio": inicios, "fim": fins}))
+    return pd.concat(partes, ignore_index=True).sort_values(["tipo", "chave"], kind="stable")
+
+def converter_semestre(file_path, pasta_cache=PASTA_CACHE, motor="pyarrow"):
+    """Write a semester csv to the parquet cache, unless it is up to date.
+    Args:
+        file_path (str): semester csv path.
+        pasta_cache (str): cache root folder.
+        motor (str): csv engine of leitor_anp.ler_anp; the semesters are
+            converted one at a time, so the multithreaded one by default.
+    Return:
+        string: success message.
+    """
+    pasta = caminho_cache(file_path, pasta_cache)
+    if cache_valido(file_path, pasta_cache, sem_fonte=False):
+        return "Cache de " + file_path + " atualizado"
+
+    df_file = tipar_semestre(ler_anp(file_path, motor=motor))
+    os.makedirs(pasta, exist_ok=True)
+    df_file.to_parquet(os.path.join(pasta, "dados.parquet"), index=False,
+                       row_group_size=LINHAS_POR_GRUPO)
+    indexar_semestre(df_file).to_parquet(os.path.join(pasta, "indice.parquet"), index=False,
+                                         row_group_size=LINHAS_POR_GRUPO)
+
+    escrever_manifesto(pasta, {**manifesto_fonte(file_path), "versao": VERSAO_CACHE})
+    return "Escrevendo cache de " + file_path + " na pasta " + pasta
+
+def lista_produtos(produto):
+    """Products of a filter as a list, None when there is no filter."""
+    if not produto:
+        return None
+    return [produto] if isinstance(produto, str) else list(produto)
+
+def ler_cache(file_path, colunas=None, produto=None, pasta_cache=PASTA_CACHE):
+    """Read a semester from the parquet cache.
+    Args:
+        file_path (str): semester csv path.
+        colunas (list): columns to read, all of them when None.
+        produto (str or list): when given, only row groups holding this
+            "Produto" (or one of these) are read.
+        pasta_cache (str): cache root folder.
+    Return:
+        df_file (DataFrame): the cached semester, None when the cache is
+        missing or stale.
+    """
+    if not cache_valido(file_path, pasta_cache):
+        return None
+    produtos = lista_produtos(produto)
+    filtros = [("Produto", "in", produtos)] if produtos else None
+    try:
+        return pd.read_parquet(os.path.join(caminho_cache(file_path, pasta_cache),
+                                            "dados.parquet"),
+                               columns=colunas, filters=filtros)
+    except ImportError:
+        logging.error("Error read_parquet. pyarrow is not installed, using %s", file_path)
+        return None
+
+def blocos_cache(file_path, tamanho_bloco, colunas=None, produto=None,
+                 pasta_cache=PASTA_CACHE):
+    """Read a semester from the parquet cache in chunks of rows, so a
+    whole semester is never held in memory.
+    Args:
+        file_path (str): semester csv path.
+        tamanho_bloco (int): rows per chunk at most.
+        colunas (list): columns to read, all of them when None.
+        produto (str or list): when given, only the rows of this "Produto"
+            (or of one of these) are read, skipping the other row groups.
+        pasta_cache (str): cache root folder.
+    Return:
+        generator: DataFrame chunks, None when the cache is missing or stale.
+    """
+    if not cache_valido(file_path, pasta_cache):
+        return None
+    try:
+        from pyarrow import dataset # pylint: disable=import-outside-toplevel
+    except ImportError:
+        logging.error("Error read_parquet. pyarrow is not installed, using %s", file_path)
+        return None
+    produtos = lista_produtos(produto)
+    lotes = dataset.dataset(os.path.join(caminho_cache(file_path, pasta_cache), "dados.parquet"),
+                            format="parquet")\
+                   .to_batches(columns=colunas, batch_size=tamanho_bloco,
+                               filter=dataset.field("Produto").isin(produtos) if produtos else None)
+    return (lote.to_pandas() for lote in lotes)
+
+# lendo o semestre, do cache ou do csv
+@instrumentar(arquivo=lambda args: args["file_path"])
+def read_data(file_path, colunas=None, produto=None):
+    """Read data from the parquet cache, or from csv when it is not cached.
+    Args:
+        file_path (str): file path to read.
+        colunas (list): columns to read, all when None.
+        produto (str or list): when given, only the rows of this product (or
+            of one of these) are read; from the csv they are filtered on the
+            "Produto" column, which must then be among colunas.
+    Return:
+        df_file (DataFrame): returns the file read as a dataframe.
+    """
+    df_file = ler_cache(file_path, colunas, produto)
+    if df_file is not None:
+        return df_file
+    try:
+        df_file = ler_anp(file_path, colunas)
+    except: # pylint: disable=bare-except
+        logging.error("Error read_csv. We were not able to find %s", file_path)
+        return pd.DataFrame()
+    produtos = lista_produtos(produto)
+    return df_file if produtos is None else df_file[df_file["Produto"].isin(produtos)]
+
+def blocos_semestre(file_path, tamanho_bloco, colunas=None, produto=None):
+    """Read a semester in chunks of rows, from the parquet cache when it is
+    up to date and from the csv otherwise.
+    Args:
+        file_path (str): semester csv path.
+        tamanho_bloco (int): rows per chunk at most.
+        colunas (list): columns to read, all of them when None.
+        produto (str or list): only the rows of this product (or of one of
+            these), as in read_data.
+    Yield:
+        df_bloco (DataFrame): colunas of a chunk of rows.
+    """
+    blocos = blocos_cache(file_path, tamanho_bloco, colunas, produto)
+    if blocos is not None:
+        yield from blocos
+        return
+    produtos = lista_produtos(produto)
+    for bloco in blocos_anp(file_path, colunas, tamanho_bloco):
+        yield bloco if produtos is None else bloco[bloco["Produto"].isin(produtos)]
+
+def particoes(pasta_cache=PASTA_CACHE):
+    """Every partition folder of the cache, in semester order."""
+    return sorted(os.path.join(pasta_cache, ano, semestre)
+                  for ano in os.listdir(pasta_cache) if ano.startswith("ano=")
+                  for semestre in os.listdir(os.path.join(pasta_cache, ano))
+                  if semestre.startswith("semestre=")) if os.path.isdir(pasta_cache) else []
+
+def ler_indice(tipo="Municipio", chave=None, estado=None, pasta_cache=PASTA_CACHE):
+    """Read the index entries of every partition written with the
+    current layout (VERSAO_CACHE).
+    Args:
+        tipo (str): key column, "Municipio" or "CNPJ da Revenda".
+        chave (str): only entries of this city or station, all when None.
+        estado (str): only entries of this state, all when None.
+        pasta_cache (str): cache root folder.
+    Return:
+        df_indice (DataFrame): index entries plus the "particao" folder.
+    """
+    filtros = [("tipo", "==", tipo)]
+    if chave is not None:
+        filtros.append(("chave", "==", chave))
+    if estado is not None:
+        filtros.append(("Estado - Sigla", "==", estado))
+    partes = []
+    for pasta in particoes(pasta_cache):
+        if os.path.exists(os.path.join(pasta, "indice.parquet")) and \
+           ler_manifesto(pasta).get("versao") == VERSAO_CACHE:
+            df_indice = pd.read_parquet(os.path.join(pasta, "indice.parquet"), filters=filtros)
+            partes.append(df_indice.assign(particao=pasta))
+    if not partes:
+        return pd.DataFrame(columns=["tipo", "chave", "Estado - Sigla", "Produto",
+                                     "inicio", "fim", "particao"])
+    return pd.concat(partes, ignore_index=True)
+
+def recortes(deslocamentos, inicio, fim):
+    """Row groups covered by a [inicio, fim) range of rows.
+    Args:
+        deslocamentos (ndarray): first row of each row group, plus the
+            total number of rows.
+        inicio (int): first row of the range.
+        fim (int): row after the last one of the range.
+    Yield:
+        tuple: (row group, first row, row after the last) inside the group.
+    """
+    primeiro = np.searchsorted(deslocamentos, inicio, side="right") - 1
+    ultimo = np.searchsorted(deslocamentos, fim - 1, side="right") - 1
+    for grupo in range(primeiro, ultimo + 1):
+        yield grupo, max(inicio, deslocamentos[grupo]) - deslocamentos[grupo], \
+              min(fim, deslocamentos[grupo + 1]) - deslocamentos[grupo]
+
+def ler_faixas(pasta, faixas, colunas=None):
+    """Read row ranges of a partition, touching only their row groups.
+    Args:
+        pasta (str): partition folder.
+        faixas (list): [inicio, fim) row ranges of dados.parquet.
+        colunas (list): columns to read, all of them when None.
+    Return:
+        tabela (pyarrow.Table): rows of every range, in order.
+    """
+    import pyarrow as pa # pylint: disable=import-outside-toplevel
+    import pyarrow.parquet as pq # pylint: disable=import-outside-toplevel
+
+    arquivo = pq.ParquetFile(os.path.join(pasta, "dados.parquet"))
+    deslocamentos = np.cumsum([0] + [arquivo.metadata.row_group(grupo).num_rows
+                                     for grupo in range(arquivo.num_row_groups)])
+    grupos_lidos = {}
+    pedacos = []
+    for inicio, fim in faixas:
+        for grupo, de, ate in recortes(deslocamentos, inicio, fim):
+            if grupo not in grupos_lidos:
+                grupos_lidos[grupo] = arquivo.read_row_group(grupo, columns=colunas)
+            pedacos.append(grupos_lidos[grupo].slice(de, ate - de))
+    return pa.concat_tables(pedacos)
+
+def ler_linhas(df_indice, colunas=None):
+    """Rows pointed to by index entries, reading only their row groups.
+    Args:
+        df_indice (DataFrame): entries returned by ler_indice, possibly
+            filtered further (e.g. by "Produto").
+        colunas (list): columns to read, all of them when None.
+    Return:
+        df_linhas (DataFrame): matching rows, in semester order.
+    """
+    tabelas = [ler_faixas(pasta, faixas[["inicio", "fim"]].to_numpy(), colunas)
+               for pasta, faixas in df_indice.groupby("particao", sort=True)]
+    if not tabelas:
+        return pd.DataFrame(columns=colunas)
+    return pd.concat([tabela.to_pandas() for tabela in tabelas], ignore_index=True)
+
+def buscar(chave, tipo="Municipio", *, estado=None, produto=None, colunas=None, # pylint: disable=too-many-arguments
+           pasta_cache=PASTA_CACHE):
+    """Rows of a city or station in every cached semester, read through
+    the index so only the row groups holding them are decoded.
+    Args:
+        chave (str): city name (e.g. "NATAL") or CNPJ of the station.
+        tipo (str): key column, "Municipio" or "CNPJ da Revenda".
+        estado (str): state of the city, to tell apart homonymous cities.
+        produto (str): only rows of this product, all when None.
+        colunas (list): columns to read, all of them when None.
+        pasta_cache (str): cache root folder.
+    Return:
+        df_linhas (DataFrame): matching rows, in semester order.
+    """
+    df_indice = ler_indice(tipo, chave, estado, pasta_cache)
+    if produto is not None:
+        df_indice = df_indice[df_indice["Produto"] == produto]
+    return ler_linhas(df_indice, colunas)
+
+def main(pasta_dados=PASTA_DADOS, pasta_cache=PASTA_CACHE):
+    """Convert every semester file of a folder to the parquet cache."""
+    for arquivo in sorted(os.listdir(pasta_dados)):
+        if caminho_cache(arquivo, pasta_cache):
+            print(converter_semestre(os.path.join(pasta_dados, arquivo), pasta_cache))
+
+if __name__ == "__main__":
+    main(*sys.argv[1:3])
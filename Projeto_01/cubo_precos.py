@@ -0,0 +1,215 @@
+"""
+Autor: Matheus Silva
+Data: Maio 2022
+Este módulo pré-agrega a série histórica do preço dos
+combustíveis em um cubo com soma, contagem, mínimo e
+máximo do "Valor de Venda" no menor agrupamento
+(semestre x região x estado x produto x bandeira).
+Cada semestre é lido uma única vez; qualquer média
+por estado, região, produto, bandeira ou período é
+obtida combinando as células do cubo, sem ler os csv
+de novo. Os valores são guardados em milésimos de
+real inteiros, então as médias combinadas são exatas.
+
+Uso (gera o cubo de todos os semestres em paralelo):
+    python cubo_precos.py --workers 4
+"""
+import argparse
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from cache_parquet import blocos_semestre, escrever_manifesto, manifesto_fonte, \
+    manifesto_valido, read_data
+from metricas import etapa
+
+PASTA_DADOS = "data/serie_historica_combustiveis/"
+PASTA_CUBO = "data/cubo_precos/"
+
+DIMENSOES = ["Semestre", "Regiao - Sigla", "Estado - Sigla", "Produto", "Bandeira"]
+COLUNAS_LIDAS = ["Regiao - Sigla", "Estado - Sigla", "Produto", "Bandeira", "Valor de Venda"]
+
+def nome_semestre(file_path):
+    """Semester label of a file, e.g. "2021-02" for ".../ca-2021-02.csv"."""
+    return os.path.basename(file_path)[3:-4]
+
+def ler_blocos(file_path, tamanho_bloco=None, produtos=None):
+    """Read the columns of the cube from a semester, from the parquet
+    cache when it is up to date and from the csv otherwise.
+    Args:
+        file_path (str): semester csv path.
+        tamanho_bloco (int): rows per chunk, the whole file at once when None.
+        produtos (list): products to read, all of them when None; the
+            cache skips the row groups of the other products.
+    Yield:
+        df_bloco (DataFrame): COLUNAS_LIDAS of a chunk of rows.
+    """
+    if tamanho_bloco is None:
+        yield read_data(file_path, COLUNAS_LIDAS, produtos)
+    else:
+        yield from blocos_semestre(file_path, tamanho_bloco, COLUNAS_LIDAS, produtos)
+
+def agregar_celulas(df_bloco):
+    """Sum, count, min and max of the sale price per cell of a chunk.
+    Args:
+        df_bloco (DataFrame): chunk returned by ler_blocos.
+    Return:
+        df_celulas (DataFrame): one row per region, state, product and brand,
+        with the prices in thousandths of real.
+    """
+    milesimos = (df_bloco["Valor de Venda"].astype(float) * 1000).round().astype("int64")
+    return milesimos.groupby([df_bloco[coluna] for coluna in DIMENSOES[1:]], observed=True,
+                             dropna=False).agg(["sum", "count", "min", "max"])
+
+def cubo_semestre(file_path, tamanho_bloco=None, produtos=None):
+    """Build the cube cells of one semester in a single pass over the file.
+    The rows read and the cells written are logged by metricas.etapa.
+    Args:
+        file_path (str): semester csv path.
+        tamanho_bloco (int): rows per chunk, None to read the file whole.
+        produtos (list): products to aggregate, all of them when None.
+    Return:
+        df_cubo (DataFrame): DIMENSOES plus "Soma" and "Minimo"/"Maximo"
+        (thousandths of R$) and "Contagem".
+    """
+    with etapa("cubo_semestre", linhas_entrada=0) as registro:
+        parciais = []
+        for bloco in ler_blocos(file_path, tamanho_bloco, produtos):
+            registro["linhas_entrada"] += len(bloco)
+            parciais.append(agregar_celulas(bloco))
+        df_cubo = pd.concat(parciais).groupby(level=[0, 1, 2, 3], observed=True, dropna=False)\
+                    .agg({"sum": "sum", "count": "sum", "min": "min", "max": "max"})
+        df_cubo.columns = ["Soma", "Contagem", "Minimo", "Maximo"]
+        df_cubo = df_cubo.reset_index()
+        df_cubo.insert(0, "Semestre", nome_semestre(file_path))
+        registro["linhas_saida"] = len(df_cubo)
+        if os.path.isfile(file_path):
+            registro["bytes_lidos"] = os.path.getsize(file_path)
+    return tipar_cubo(df_cubo)
+
+def tipar_cubo(df_cubo):
+    """Store the dimensions as categories, so the cube stays small."""
+    for coluna in DIMENSOES:
+        df_cubo[coluna] = df_cubo[coluna].astype("category")
+    return df_cubo
+
+def caminho_cubo(file_path, pasta_cubo=PASTA_CUBO):
+    """Folder of the cube partition of a semester."""
+    return os.path.join(pasta_cubo, nome_semestre(file_path))
+
+def cubo_valido(file_path, pasta_cubo=PASTA_CUBO):
+    """Check whether the saved partition was built from the current csv.
+    Args:
+        file_path (str): semester csv path.
+        pasta_cubo (str): cube root folder.
+    Return:
+        bool: True when the partition can be used instead of the csv.
+    """
+    return manifesto_valido(file_path, caminho_cubo(file_path, pasta_cubo), "cubo.parquet")
+
+def salvar_cubo_semestre(file_path, pasta_cubo=PASTA_CUBO, tamanho_bloco=None):
+    """Build and save the cube partition of a semester, unless it is up to date.
+    Args:
+        file_path (str): semester csv path.
+        pasta_cubo (str): cube root folder.
+        tamanho_bloco (int): rows per chunk, None to read the file whole.
+    Return:
+        tuple: (success message, seconds).
+    """
+    inicio = time.perf_counter()
+    pasta = caminho_cubo(file_path, pasta_cubo)
+    if cubo_valido(file_path, pasta_cubo):
+        return "Cubo de " + file_path + " atualizado", time.perf_counter() - inicio
+
+    df_cubo = cubo_semestre(file_path, tamanho_bloco)
+    os.makedirs(pasta, exist_ok=True)
+    df_cubo.to_parquet(os.path.join(pasta, "cubo.parquet"), index=False)
+    escrever_manifesto(pasta, manifesto_fonte(file_path))
+    return "Escrevendo cubo de " + file_path + " na pasta " + pasta, \
+           time.perf_counter() - inicio
+
+def ler_cubo_semestre(file_path, tamanho_bloco=None, pasta_cubo=PASTA_CUBO, produtos=None):
+    """Cube cells of a semester, from the saved partition when it is up to
+    date and built from the file otherwise (without saving it).
+    Args:
+        file_path (str): semester csv path.
+        tamanho_bloco (int): rows per chunk when the file must be read.
+        pasta_cubo (str): cube root folder.
+        produtos (list): products needed, all of them when None; when the
+            file must be read, only their rows are read.
+    Return:
+        df_cubo (DataFrame): cells as returned by cubo_semestre.
+    """
+    if cubo_valido(file_path, pasta_cubo):
+        return pd.read_parquet(os.path.join(caminho_cubo(file_path, pasta_cubo),
+                                            "cubo.parquet"))
+    return cubo_semestre(file_path, tamanho_bloco, produtos)
+
+def ler_cubo(pasta_cubo=PASTA_CUBO, semestres=None):
+    """Read the saved cube of the whole series.
+    Args:
+        pasta_cubo (str): cube root folder.
+        semestres (list): semester labels to read, all of them when None.
+    Return:
+        df_cubo (DataFrame): cells of every semester, in semester order.
+    """
+    particoes = sorted(os.listdir(pasta_cubo)) if os.path.isdir(pasta_cubo) else []
+    partes = [pd.read_parquet(os.path.join(pasta_cubo, semestre, "cubo.parquet"))
+              for semestre in particoes
+              if (semestres is None or semestre in semestres) and
+              os.path.exists(os.path.join(pasta_cubo, semestre, "cubo.parquet"))]
+    if not partes:
+        return tipar_cubo(pd.DataFrame(columns=DIMENSOES + ["Soma", "Contagem",
+                                                           "Minimo", "Maximo"]))
+    return tipar_cubo(pd.concat(partes, ignore_index=True))
+
+def consultar(df_cubo, por, filtros=None):
+    """Roll the cube up to the given dimensions.
+    Args:
+        df_cubo (DataFrame): cells returned by ler_cubo or cubo_semestre.
+        por (list): dimensions kept in the answer, e.g. ["Semestre", "Produto"];
+            an empty list gives a single overall row.
+        filtros (dict): dimension -> value or list of values to keep, e.g.
+            {"Produto": "ETANOL", "Estado - Sigla": ["RN", "PB"]}.
+    Return:
+        df_resposta (DataFrame): "Media", "Minimo" and "Maximo" in R$,
+        "Contagem" and "Soma" (thousandths of R$, which can still be added
+        up) per combination of the dimensions.
+    """
+    for coluna, valores in (filtros or {}).items():
+        valores = [valores] if isinstance(valores, str) else list(valores)
+        df_cubo = df_cubo[df_cubo[coluna].isin(valores)]
+
+    medidas = {"Soma": "sum", "Contagem": "sum", "Minimo": "min", "Maximo": "max"}
+    if por:
+        df_resposta = df_cubo.groupby(list(por), observed=True).agg(medidas).reset_index()
+    else:
+        df_resposta = df_cubo.agg(medidas).to_frame().T
+    df_resposta["Media"] = df_resposta["Soma"] / df_resposta["Contagem"] / 1000
+    df_resposta["Minimo"] = df_resposta["Minimo"] / 1000
+    df_resposta["Maximo"] = df_resposta["Maximo"] / 1000
+    return df_resposta[list(por) + ["Media", "Minimo", "Maximo", "Contagem", "Soma"]]
+
+def main():
+    """Build the cube of the whole historical series from the command line."""
+    parser = argparse.ArgumentParser(description="Cubo de preços da série histórica.")
+    parser.add_argument("--dados", default=PASTA_DADOS)
+    parser.add_argument("--cubo", default=PASTA_CUBO)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--bloco", type=int, default=None,
+                        help="linhas por bloco ao ler os csv")
+    args = parser.parse_args()
+
+    arquivos = sorted(os.path.join(args.dados, arquivo) for arquivo in os.listdir(args.dados)
+                      if re.fullmatch(r"ca-\d{4}-0[12]\.csv", arquivo))
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        for mensagem, segundos in executor.map(salvar_cubo_semestre, arquivos,
+                                               [args.cubo] * len(arquivos),
+                                               [args.bloco] * len(arquivos)):
+            print(f"{mensagem} ({segundos:.2f} s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Autor: Matheus Silva
+Data: Maio 2022
+Este módulo lê os csv da série histórica do preço dos
+combustíveis (ANP) com um esquema de colunas declarado:
+as siglas, o município, o produto e a bandeira viram
+categorias, os preços são lidos direto como float com a
+vírgula decimal e a data da coleta é convertida na
+leitura, sem uma segunda passada com str.replace sobre
+o "Valor de Venda".
+
+Há dois motores: o parser C do pandas, que também lê em
+blocos, e o leitor csv do pyarrow, que usa várias threads.
+O formato de um arquivo é detectado pela sua primeira
+linha, em um registro de formatos (FORMATOS), e não pelo
+nome do arquivo.
+
+Uso (compara a vazão dos leitores em um semestre):
+    python leitor_anp.py data/serie_historica_combustiveis/ca-2021-02.csv
+"""
+import argparse
+import logging
+import time
+
+import pandas as pd
+
+ENCODING_ANP = "ISO-8859-1"
+SEPARADOR_ANP = ";"
+FORMATO_DATA = "%d/%m/%Y"
+COLUNA_DATA = "Data da Coleta"
+
+# coluna -> tipo lógico; colunas fora do esquema são lidas como texto
+ESQUEMA_ANP = {"Regiao - Sigla": "categoria", "Estado - Sigla": "categoria",
+               "Municipio": "categoria", "Revenda": "texto", "CNPJ da Revenda": "texto",
+               "Nome da Rua": "texto", "Numero Rua": "texto", "Complemento": "texto",
+               "Bairro": "texto", "Cep": "texto", "Produto": "categoria", COLUNA_DATA: "data",
+               "Valor de Venda": "preco", "Valor de Compra": "preco",
+               "Unidade de Medida": "categoria", "Bandeira": "categoria"}
+# tipo lógico -> dtype do parser C; a data é convertida depois, com FORMATO_DATA
+TIPOS_C = {"categoria": "category", "texto": str, "preco": "float32"}
+
+MOTORES = ["c", "pyarrow"]
+MOTOR_PADRAO = "c"
+
+def primeira_linha(file_path):
+    """First line of a text file, without the line break and the BOM.
+    Args:
+        file_path (str): file path.
+    Return:
+        string: the header of a csv.
+    """
+    with open(file_path, encoding=ENCODING_ANP) as arquivo:
+        return arquivo.readline().rstrip("\r\n").lstrip("\ufeff\xef\xbb\xbf")
+
+def nomes_anp(file_path):
+    """Column names of an ANP file. Some semesters have a BOM or a
+    different spelling in the first column, which is always the region.
+    Args:
+        file_path (str): semester csv path.
+    Return:
+        nomes (list): column names, the first one as "Regiao - Sigla".
+    """
+    nomes = primeira_linha(file_path).split(SEPARADOR_ANP)
+    return ["Regiao - Sigla"] + nomes[1:]
+
+def converter_datas(df_file):
+    """Parse the collection date of a chunk read by the C engine."""
+    if COLUNA_DATA in df_file.columns:
+        df_file[COLUNA_DATA] = pd.to_datetime(df_file[COLUNA_DATA], format=FORMATO_DATA)
+    return df_file
+
+def opcoes_c(file_path, colunas=None):
+    """Keyword arguments of pd.read_csv for an ANP file.
+    Args:
+        file_path (str): semester csv path.
+        colunas (list): columns to read, all of them when None.
+    Return:
+        opcoes (dict): separator, encoding, names, usecols, dtype and
+        decimal comma.
+    """
+    nomes = nomes_anp(file_path)
+    lidas = colunas or nomes
+    return {"sep": SEPARADOR_ANP, "encoding": ENCODING_ANP, "header": 0, "names": nomes,
+            "usecols": lidas, "decimal": ",",
+            "dtype": {coluna: TIPOS_C[ESQUEMA_ANP.get(coluna, "texto")] for coluna in lidas
+                      if ESQUEMA_ANP.get(coluna) != "data"}}
+
+def ler_anp_pyarrow(file_path, colunas=None):
+    """Read an ANP file with the multithreaded pyarrow csv reader.
+    Args:
+        file_path (str): semester csv path.
+        colunas (list): columns to read, all of them when None.
+    Return:
+        df_file (DataFrame): typed columns, as ler_anp.
+    """
+    import pyarrow as pa # pylint: disable=import-outside-toplevel
+    from pyarrow import csv # pylint: disable=import-outside-toplevel
+
+    tipos = {"categoria": pa.dictionary(pa.int32(), pa.string()), "texto": pa.string(),
+             "preco": pa.float32(), "data": pa.timestamp("ns")}
+    nomes = nomes_anp(file_path)
+    tabela = csv.read_csv(
+        file_path,
+        read_options=csv.ReadOptions(encoding=ENCODING_ANP, column_names=nomes, skip_rows=1,
+                                     use_threads=True),
+        parse_options=csv.ParseOptions(delimiter=SEPARADOR_ANP),
+        convert_options=csv.ConvertOptions(
+            column_types={coluna: tipos[ESQUEMA_ANP.get(coluna, "texto")] for coluna in nomes},
+            include_columns=colunas or nomes, decimal_point=",",
+            timestamp_parsers=[FORMATO_DATA], strings_can_be_null=True))
+    df_file = tabela.to_pandas()
+    # o pyarrow guarda as categorias na ordem em que aparecem; o parser C, em ordem alfabética
+    for coluna in df_file.select_dtypes("category").columns:
+        df_file[coluna] = df_file[coluna].cat.reorder_categories(
+            df_file[coluna].cat.categories.sort_values())
+    return df_file
+
+def ler_anp(file_path, colunas=None, nrows=None, motor=MOTOR_PADRAO):
+    """Read an ANP semester file with its declared schema.
+    Args:
+        file_path (str): semester csv path.
+        colunas (list): columns to read, all of them when None.
+        nrows (int): number of rows to read, the whole file when None;
+            always read by the C engine.
+        motor (str): one of MOTORES; "pyarrow" falls back to "c" when
+            pyarrow is not installed.
+    Return:
+        df_file (DataFrame): categorical, string, float32 prices and
+        datetime collection date, the first column named "Regiao - Sigla".
+    """
+    if motor == "pyarrow" and nrows is None:
+        try:
+            return ler_anp_pyarrow(file_path, colunas)
+        except ImportError:
+            logging.error("Error read_csv. pyarrow is not installed, reading %s with the C engine",
+                          file_path)
+    return converter_datas(pd.read_csv(file_path, nrows=nrows, **opcoes_c(file_path, colunas)))
+
+def blocos_anp(file_path, colunas=None, tamanho_bloco=None):
+    """Read an ANP semester file in chunks, with the C engine.
+    Args:
+        file_path (str): semester csv path.
+        colunas (list): columns to read, all of them when None.
+        tamanho_bloco (int): rows per chunk, the whole file at once when None.
+    Yield:
+        df_bloco (DataFrame): typed columns of a chunk of rows.
+    """
+    if tamanho_bloco is None:
+        yield ler_anp(file_path, colunas)
+        return
+    for bloco in pd.read_csv(file_path, chunksize=tamanho_bloco, **opcoes_c(file_path, colunas)):
+        yield converter_datas(bloco)
+
+def eh_anp(cabecalho):
+    """Header of a file of the ANP historical series."""
+    return SEPARADOR_ANP in cabecalho and "Valor de Venda" in cabecalho
+
+def ler_csv(file_path, nrows=None, motor=MOTOR_PADRAO):
+    """Read a comma separated file of the project (e.g. the price series)."""
+    if motor == "pyarrow" and nrows is None:
+        return pd.read_csv(file_path, engine="pyarrow")
+    return pd.read_csv(file_path, nrows=nrows)
+
+# formato -> (reconhece a primeira linha do arquivo, leitor chamado com nrows e motor);
+# o primeiro formato que reconhecer o arquivo é usado
+FORMATOS = {"anp": (eh_anp, ler_anp),
+            "csv": (lambda cabecalho: True, ler_csv)}
+
+def detectar_formato(file_path):
+    """Format of a file, from its first line.
+    Args:
+        file_path (str): file path.
+    Return:
+        string: key of FORMATOS.
+    """
+    cabecalho = primeira_linha(file_path)
+    return next(nome for nome, (reconhece, _) in FORMATOS.items() if reconhece(cabecalho))
+
+def ler_arquivo(file_path, nrows=None, motor=MOTOR_PADRAO):
+    """Read a data file with the reader of its detected format.
+    Args:
+        file_path (str): file path.
+        nrows (int): number of rows to read, the whole file when None.
+        motor (str): one of MOTORES.
+    Return:
+        df_file (DataFrame): the file read as a dataframe.
+    """
+    return FORMATOS[detectar_formato(file_path)][1](file_path, nrows=nrows, motor=motor)
+
+def ler_antigo(file_path):
+    """Previous path: every column as text, then the prices and the date
+    converted in a second pass."""
+    df_file = pd.read_csv(file_path, sep=SEPARADOR_ANP, encoding=ENCODING_ANP)
+    for coluna in ["Valor de Venda", "Valor de Compra"]:
+        df_file[coluna] = pd.to_numeric(df_file[coluna].astype(str).str.replace(",", "."),
+                                        errors="coerce")
+    df_file[COLUNA_DATA] = pd.to_datetime(df_file[COLUNA_DATA], format=FORMATO_DATA)
+    return df_file
+
+def main():
+    """Print the throughput of the old and the typed readers on a file."""
+    parser = argparse.ArgumentParser(description="Vazão dos leitores dos csv da ANP.")
+    parser.add_argument("arquivo", help="semestre da série histórica, e.g. ca-2021-02.csv")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args()
+
+    leitores = {"antigo": ler_antigo,
+                **{f"tipado ({motor})": lambda caminho, motor=motor: ler_anp(caminho, motor=motor)
+                   for motor in MOTORES}}
+    for nome, leitor in leitores.items():
+        tempos = []
+        for _ in range(args.repeticoes):
+            inicio = time.perf_counter()
+            linhas = len(leitor(args.arquivo))
+            tempos.append(time.perf_counter() - inicio)
+        print(f"{nome:18} {min(tempos):8.2f} s {linhas / min(tempos):12,.0f} linhas/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+Autor: Matheus Silva
+Data: Maio 2022
+Este módulo mede as etapas do projeto (leitura,
+escrita, agrupamento, download e gráficos) e grava
+cada medida como um registro JSON no mesmo log do
+logging (results.log), com o logger "metricas". As
+medidas ficam desligadas por padrão; quando desligadas
+cada chamada custa apenas um teste de um booleano.
+
+Para ligar, defina METRICAS=1 (e METRICAS_TRACEMALLOC=1
+para medir também o pico de memória) ou chame ativar().
+O pico do tracemalloc é um só para o processo, então ele
+é medido apenas nas etapas da thread principal; as etapas
+de outras threads (e.g. os downloads em paralelo) gravam
+só o tempo.
+
+Uma etapa aberta dentro de outra, na mesma thread, grava
+o nome dela (pai): o tempo da etapa externa já inclui o
+da interna, então o relatório mostra também o tempo
+próprio de cada etapa, sem as internas.
+
+Uso (relatório das etapas mais lentas):
+    python metricas.py [results.log] [--top 10]
+"""
+import argparse
+import contextlib
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+
+import pandas as pd
+
+LOGGER = logging.getLogger("metricas")
+PREFIXO_REGISTRO = "metricas - INFO - "
+
+_CONFIG = {"ativo": os.environ.get("METRICAS", "") not in ("", "0"),
+           "tracemalloc": os.environ.get("METRICAS_TRACEMALLOC", "") not in ("", "0")}
+# picos de memória das etapas abertas na thread principal, da mais externa para a mais interna
+_PILHA = []
+# nomes das etapas abertas em cada thread, da mais externa para a mais interna
+_ABERTAS = threading.local()
+
+def ativar(medir_memoria=False):
+    """Turn the measurements on. The environment variables are set too,
+    so worker processes started afterwards measure as well.
+    Args:
+        medir_memoria (bool): also record tracemalloc peaks, which slows
+            every allocation down while on.
+    """
+    _CONFIG["ativo"] = True
+    _CONFIG["tracemalloc"] = medir_memoria
+    os.environ["METRICAS"] = "1"
+    os.environ["METRICAS_TRACEMALLOC"] = "1" if medir_memoria else "0"
+
+def desativar():
+    """Turn the measurements off."""
+    _CONFIG["ativo"] = False
+    os.environ["METRICAS"] = "0"
+
+def ativo():
+    """Whether the measurements are on."""
+    return _CONFIG["ativo"]
+
+@contextlib.contextmanager
+def etapa(nome, **campos):
+    """Measure a block of code and log one record when it ends.
+    Args:
+        nome (str): stage name.
+        campos: initial record fields, e.g. linhas_entrada.
+    Yield:
+        registro (dict): the record, which the block may complete with
+        linhas_entrada, linhas_saida or bytes_lidos; when the measurements
+        are off it is not logged. It holds the enclosing stage of the same
+        thread as "pai", when there is one.
+    """
+    registro = {"etapa": nome, "pid": os.getpid(), **campos}
+    if not _CONFIG["ativo"]:
+        yield registro
+        return
+
+    if not hasattr(_ABERTAS, "nomes"):
+        _ABERTAS.nomes = []
+    abertas = _ABERTAS.nomes
+    if abertas:
+        registro["pai"] = abertas[-1]
+    abertas.append(nome)
+
+    # o pico do tracemalloc é do processo inteiro: outras threads não o zeram
+    medir_memoria = _CONFIG["tracemalloc"] and \
+        threading.current_thread() is threading.main_thread()
+    if medir_memoria:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        _PILHA.append(0)
+    inicio = time.perf_counter()
+    try:
+        yield registro
+    except BaseException:
+        registro["erro"] = True
+        raise
+    finally:
+        registro["segundos"] = time.perf_counter() - inicio
+        abertas.pop()
+        if medir_memoria:
+            # uma etapa interna zera o pico; o maior pico delas é guardado na pilha
+            pico = max(_PILHA.pop(), tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            if _PILHA:
+                _PILHA[-1] = max(_PILHA[-1], pico)
+            registro["pico_mib"] = pico / 2**20
+        LOGGER.info(json.dumps(registro, ensure_ascii=False))
+
+def contar_linhas(valor):
+    """Rows of a dataframe, None for anything else."""
+    return len(valor) if isinstance(valor, pd.DataFrame) else None
+
+def instrumentar(nome=None, arquivo=None):
+    """Decorator that measures every call of a function with etapa.
+    Rows in are taken from the first dataframe argument and rows out
+    from a dataframe result.
+    Args:
+        nome (str): stage name, the function name when None.
+        arquivo (callable): receives the call arguments by name and returns
+            the path of the file the stage reads; its size is logged as
+            bytes_lidos after the call.
+    Return:
+        decorator (callable): the decorator.
+    """
+    def decorator(funcao):
+        assinatura = inspect.signature(funcao)
+
+        @functools.wraps(funcao)
+        def medida(*args, **kwargs):
+            if not _CONFIG["ativo"]:
+                return funcao(*args, **kwargs)
+            argumentos = assinatura.bind(*args, **kwargs).arguments
+            entradas = [contar_linhas(valor) for valor in argumentos.values()]
+            with etapa(nome or funcao.__name__,
+                       linhas_entrada=next((n for n in entradas if n is not None), None))\
+                    as registro:
+                resultado = funcao(*args, **kwargs)
+                registro["linhas_saida"] = contar_linhas(resultado)
+                caminho = arquivo(argumentos) if arquivo else None
+                if caminho and os.path.isfile(caminho):
+                    registro["bytes_lidos"] = os.path.getsize(caminho)
+            return resultado
+        return medida
+    return decorator
+
+def ler_registros(caminho_log):
+    """Read the records written by etapa from a log file.
+    Args:
+        caminho_log (str): log file path.
+    Return:
+        df_registros (DataFrame): one row per record.
+    """
+    registros = []
+    with open(caminho_log, encoding="utf-8", errors="replace") as arquivo:
+        for linha in arquivo:
+            if linha.startswith(PREFIXO_REGISTRO):
+                registros.append(json.loads(linha[len(PREFIXO_REGISTRO):]))
+    return pd.DataFrame(registros, columns=["etapa", "pai", "segundos", "linhas_entrada",
+                                           "linhas_saida", "bytes_lidos", "pico_mib"])
+
+def resumir(df_registros, top=10):
+    """Rank the stages by total time.
+    Args:
+        df_registros (DataFrame): records returned by ler_registros.
+        top (int): stages kept in the report.
+    Return:
+        df_resumo (DataFrame): calls, total, own, mean and max seconds, rows,
+        MiB read, MiB/s and peak memory of the slowest stages. The total of
+        a stage includes the stages nested in it (e.g. sh_estado_regiao
+        includes cubo_semestre), so the totals overlap; the own seconds
+        (proprio_s) leave them out and add up to the time of the outer stages.
+    """
+    df_resumo = df_registros.groupby("etapa").agg(
+        chamadas=("segundos", "size"), total_s=("segundos", "sum"),
+        media_s=("segundos", "mean"), max_s=("segundos", "max"),
+        linhas_entrada=("linhas_entrada", "sum"), linhas_saida=("linhas_saida", "sum"),
+        mib_lidos=("bytes_lidos", "sum"), pico_mib=("pico_mib", "max"))
+    internas = df_registros.groupby("pai")["segundos"].sum()
+    df_resumo.insert(2, "proprio_s", df_resumo["total_s"] -
+                     internas.reindex(df_resumo.index, fill_value=0))
+    df_resumo["mib_lidos"] = df_resumo["mib_lidos"] / 2**20
+    df_resumo["mib_por_s"] = df_resumo["mib_lidos"] / df_resumo["total_s"]
+    return df_resumo.sort_values("total_s", ascending=False).head(top).round(3)
+
+def main():
+    """Print the slowest stages of a log file."""
+    parser = argparse.ArgumentParser(description="Etapas mais lentas registradas no log.")
+    parser.add_argument("log", nargs="?", default="./results.log")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    df_registros = ler_registros(args.log)
+    if df_registros.empty:
+        print(f"Nenhuma medida em {args.log}; rode com METRICAS=1.")
+        return
+    print(resumir(df_registros, args.top).to_string())
+    externas = df_registros.loc[df_registros["pai"].isna(), "segundos"]
+    print(f"\nTempo das etapas externas: {externas.sum():.3f} s "
+          "(total_s inclui as etapas internas; proprio_s não)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+Autor: Matheus Silva
+Data: Maio 2022
+Este módulo guarda em memória as séries de preço
+médio por produto, local (estado ou região) e semestre
+como vetores NumPy ordenados, com as posições de início
+de cada grupo e as somas acumuladas já calculadas.
+Uma consulta do dashboard (produto, locais e faixa de
+anos) é respondida com fatias e searchsorted, sem
+máscaras booleanas sobre DataFrames.
+
+As séries vêm do cubo de preços (cubo_precos.py) quando
+ele existe, com todos os produtos, e dos arquivos por
+estado e por região da gasolina caso contrário; as duas
+fontes nunca são misturadas. Com o cubo, a média de
+vários semestres é ponderada pelo número de coletas de
+cada semestre; com os arquivos, que só guardam a média,
+cada semestre pesa o mesmo (média simples das médias).
+"""
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+
+from cubo_precos import PASTA_CUBO, consultar, ler_cubo
+
+PASTA_ESTADOS = "data/preco_gasolina_estados/"
+PASTA_REGIOES = "data/preco_gasolina_regioes/"
+
+COLUNAS_SERIE = ["Produto", "Local", "Semestre", "Soma", "Contagem"]
+ESTADOS_REGIAO = {"N": ["AC", "AM", "AP", "PA", "RO", "RR", "TO"],
+                  "NE": ["AL", "BA", "CE", "MA", "PB", "PE", "PI", "RN", "SE"],
+                  "SE": ["ES", "MG", "RJ", "SP"],
+                  "S": ["PR", "RS", "SC"],
+                  "CO": ["DF", "GO", "MS", "MT"]}
+
+def series_cubo(df_cubo, coluna):
+    """Sum and count of the sale price per product, place and semester.
+    Args:
+        df_cubo (DataFrame): cells returned by ler_cubo.
+        coluna (str): place column, "Estado - Sigla" or "Regiao - Sigla".
+    Return:
+        df_series (DataFrame): COLUNAS_SERIE, "Soma" in thousandths of R$.
+    """
+    df_series = consultar(df_cubo, ["Produto", coluna, "Semestre"])
+    return df_series.rename(columns={coluna: "Local"})[COLUNAS_SERIE]
+
+def series_arquivos(pasta, coluna):
+    """Gasoline series of the per-semester files, one mean per place.
+    Args:
+        pasta (str): folder of the preco_gasolina_<estados|regioes>_*.csv files.
+        coluna (str): place column of the files, "Estado_Sigla" or "Regiao_Sigla".
+    Return:
+        df_series (DataFrame): COLUNAS_SERIE, each semester mean weighted as
+        a single observation ("Contagem" 1), since the files do not keep the
+        number of collections; a mean over several semesters is then the
+        unweighted mean of the semester means, unlike the cube series.
+    """
+    partes = []
+    for caminho in sorted(glob.glob(os.path.join(pasta, "preco_gasolina_*.csv"))):
+        df_file = pd.read_csv(caminho)
+        partes.append(pd.DataFrame({
+            "Produto": "GASOLINA", "Local": df_file[coluna],
+            "Semestre": os.path.basename(caminho)[-11:-4],
+            "Soma": (df_file["Preco_Media"] * 1000).round().astype("int64"),
+            "Contagem": 1}))
+    if not partes:
+        return pd.DataFrame(columns=COLUNAS_SERIE)
+    return pd.concat(partes, ignore_index=True)
+
+def carregar_series(pasta_cubo=PASTA_CUBO, pasta_estados=PASTA_ESTADOS,
+                    pasta_regioes=PASTA_REGIOES):
+    """Series per state and per region, from the cube when it exists.
+    Args:
+        pasta_cubo (str): cube root folder.
+        pasta_estados (str): folder of the per-state gasoline files.
+        pasta_regioes (str): folder of the per-region gasoline files.
+    Return:
+        tuple: (state series, region series) as returned by series_cubo; the
+        region series also has the national "Total". Both come from the same
+        source, never mixed: the weighted cube series or, without a cube, the
+        unweighted series of series_arquivos.
+    """
+    df_cubo = ler_cubo(pasta_cubo)
+    if not df_cubo.empty:
+        return series_cubo(df_cubo, "Estado - Sigla"), \
+               pd.concat([series_cubo(df_cubo, "Regiao - Sigla"),
+                          series_cubo(df_cubo.assign(Total="Total"), "Total")],
+                         ignore_index=True)
+    return series_arquivos(pasta_estados, "Estado_Sigla"), \
+           series_arquivos(pasta_regioes, "Regiao_Sigla")
+
+def montar_motor(df_series):
+    """Sort the series and precompute the offsets and running sums.
+    Args:
+        df_series (DataFrame): COLUNAS_SERIE, as returned by series_cubo.
+    Return:
+        motor (dict): "produtos", "locais" and "semestres" (sorted labels),
+        "chave" (sorted product, place and semester code of each row),
+        "semestre" (semester code of each row), "inicios" (first row of each
+        product and place group, plus the row count) and "soma_acumulada" /
+        "contagem_acumulada" (running totals with a leading zero).
+    """
+    # sem observed, categorias combinadas que não ocorrem viram linhas de Contagem 0
+    df_series = df_series.groupby(["Produto", "Local", "Semestre"], observed=True)\
+                         [["Soma", "Contagem"]].sum().reset_index()
+    rotulos = {coluna: np.array(sorted(df_series[coluna].astype(str).unique()), dtype=object)
+               for coluna in ["Produto", "Local", "Semestre"]}
+    codigos = {coluna: np.searchsorted(rotulos[coluna], df_series[coluna].astype(str).to_numpy())
+               for coluna in rotulos}
+    n_locais, n_semestres = len(rotulos["Local"]), len(rotulos["Semestre"])
+    grupos = codigos["Produto"] * n_locais + codigos["Local"]
+    chave = grupos * n_semestres + codigos["Semestre"]
+    return {
+        "produtos": rotulos["Produto"], "locais": rotulos["Local"],
+        "semestres": rotulos["Semestre"], "chave": chave, "semestre": codigos["Semestre"],
+        "inicios": np.searchsorted(grupos, np.arange(len(rotulos["Produto"]) * n_locais + 1)),
+        "soma_acumulada": np.r_[0, np.cumsum(df_series["Soma"].to_numpy(dtype="int64"))],
+        "contagem_acumulada": np.r_[0, np.cumsum(df_series["Contagem"].to_numpy(dtype="int64"))]}
+
+def faixa_semestres(motor, ano_inicial, ano_final):
+    """Semester codes of a range of years.
+    Args:
+        motor (dict): engine returned by montar_motor.
+        ano_inicial (int): first year of the range.
+        ano_final (int): last year of the range.
+    Return:
+        tuple: (first, last) semester codes, both included.
+    """
+    return np.searchsorted(motor["semestres"], f"{ano_inicial}-01"), \
+           np.searchsorted(motor["semestres"], f"{ano_final}-99") - 1
+
+def grupos_consulta(motor, produto, locais):
+    """Group codes of a product and a list of places, skipping unknown ones.
+    Args:
+        motor (dict): engine returned by montar_motor.
+        produto (str): product, e.g. "GASOLINA".
+        locais (list): places, e.g. ["RN", "PB"].
+    Return:
+        tuple: (places found, their group codes).
+    """
+    locais = np.array(sorted(set(locais) & set(motor["locais"])), dtype=object)
+    produto_codigo = np.searchsorted(motor["produtos"], produto)
+    if produto_codigo == len(motor["produtos"]) or motor["produtos"][produto_codigo] != produto:
+        locais = locais[:0]
+    return locais, produto_codigo * len(motor["locais"]) + \
+                   np.searchsorted(motor["locais"], locais).astype("int64")
+
+def medias_periodo(motor, produto, locais, ano_inicial, ano_final):
+    """Mean price of each place over a range of years, from the running sums.
+    Args:
+        motor (dict): engine returned by montar_motor.
+        produto (str): product, e.g. "GASOLINA".
+        locais (list): places, e.g. ["RN", "PB"].
+        ano_inicial (int): first year of the range.
+        ano_final (int): last year of the range.
+    Return:
+        df_medias (DataFrame): "Local" and "Preco_Media" (R$) of each place
+        with prices in the range.
+    """
+    locais, grupos = grupos_consulta(motor, produto, locais)
+    inicio, fim = faixa_semestres(motor, ano_inicial, ano_final)
+    n_semestres = len(motor["semestres"])
+    de = np.searchsorted(motor["chave"], grupos * n_semestres + inicio)
+    ate = np.searchsorted(motor["chave"], grupos * n_semestres + fim, side="right")
+    soma = motor["soma_acumulada"][ate] - motor["soma_acumulada"][de]
+    contagem = motor["contagem_acumulada"][ate] - motor["contagem_acumulada"][de]
+    com_precos = contagem > 0
+    return pd.DataFrame({"Local": locais[com_precos],
+                         "Preco_Media": soma[com_precos] / contagem[com_precos] / 1000})
+
+def linhas_grupo(motor, grupo, inicio, fim):
+    """Rows of a group whose semesters fall in [inicio, fim].
+    Args:
+        motor (dict): engine returned by montar_motor.
+        grupo (int): product and place group code.
+        inicio (int): first semester code.
+        fim (int): last semester code.
+    Return:
+        linhas (ndarray): row positions, in semester order.
+    """
+    de, ate = motor["inicios"][grupo], motor["inicios"][grupo + 1]
+    semestres = motor["semestre"][de:ate]
+    return np.arange(de + np.searchsorted(semestres, inicio),
+                     de + np.searchsorted(semestres, fim, side="right"))
+
+def serie_periodo(motor, produto, locais, ano_inicial, ano_final):
+    """Mean price per semester of each place over a range of years.
+    Args:
+        motor (dict): engine returned by montar_motor.
+        produto (str): product, e.g. "GASOLINA".
+        locais (list): places, e.g. ["RN", "PB"].
+        ano_inicial (int): first year of the range.
+        ano_final (int): last year of the range.
+    Return:
+        df_serie (DataFrame): "Local", "Semestre" and "Preco_Media" (R$).
+    """
+    locais, grupos = grupos_consulta(motor, produto, locais)
+    inicio, fim = faixa_semestres(motor, ano_inicial, ano_final)
+    linhas = [linhas_grupo(motor, grupo, inicio, fim) for grupo in grupos]
+    rotulos = np.repeat(locais, [len(linhas_local) for linhas_local in linhas])
+    linhas = np.concatenate([np.array([], dtype="int64")] + linhas)
+    soma = motor["soma_acumulada"][linhas + 1] - motor["soma_acumulada"][linhas]
+    contagem = motor["contagem_acumulada"][linhas + 1] - motor["contagem_acumulada"][linhas]
+    return pd.DataFrame({"Local": rotulos,
+                         "Semestre": motor["semestres"][motor["semestre"][linhas]],
+                         "Preco_Media": soma / contagem / 1000})
@@ -0,0 +1,70 @@
+"""
+Autor: Matheus Silva
+Data: Maio 2022
+Este módulo divide uma série temporal em períodos
+nomeados (por exemplo, os mandatos presidenciais) com
+uma única busca binária (searchsorted) sobre o índice
+de datas ordenado, em vez de uma máscara booleana por
+período. Cada período é uma fatia contígua da série
+(sem cópia), e o mínimo e o máximo de cada período são
+calculados a partir dessas fatias.
+
+Os intervalos são fechados nas duas pontas, então a data
+que encerra um mandato e abre o seguinte aparece nas
+duas fatias, e as linhas dos gráficos ficam contínuas.
+"""
+import numpy as np
+import pandas as pd
+
+MANDATOS = pd.DataFrame({
+    "Periodo": ["Lula", "Dilma", "Temer", "Bolsonaro"],
+    "Inicio": pd.to_datetime(["2003-01-01", "2010-12-01", "2016-06-01", "2018-12-01"]),
+    "Fim": pd.to_datetime(["2010-12-01", "2016-06-01", "2018-12-01", "2021-12-01"]),
+    "Cor": ["#49be25", "#be4d25", "#9925be", "#2596be"]})
+
+def limites(indice, periodos=MANDATOS):
+    """Row bounds of each period in a sorted date index.
+    Args:
+        indice (DatetimeIndex): sorted dates of the series.
+        periodos (DataFrame): "Periodo", "Inicio" and "Fim", sorted by "Inicio".
+    Return:
+        ndarray: (periods x 2) first row and row after the last of each period.
+    """
+    datas = indice.to_numpy()
+    return np.column_stack([
+        np.searchsorted(datas, periodos["Inicio"].to_numpy(datas.dtype), side="left"),
+        np.searchsorted(datas, periodos["Fim"].to_numpy(datas.dtype), side="right")])
+
+def fatias(df_serie, periodos=MANDATOS):
+    """Zero-copy slice of the series for each period.
+    Args:
+        df_serie (DataFrame): series indexed by sorted dates.
+        periodos (DataFrame): "Periodo", "Inicio" and "Fim", sorted by "Inicio".
+    Return:
+        dict: period name -> rows of the series in it.
+    """
+    return {nome: df_serie.iloc[de:ate]
+            for nome, (de, ate) in zip(periodos["Periodo"], limites(df_serie.index, periodos))}
+
+def extremos(df_serie, coluna, periodos=MANDATOS):
+    """Minimum and maximum of a column in each period.
+    Args:
+        df_serie (DataFrame): series indexed by sorted dates.
+        coluna (str): column to reduce.
+        periodos (DataFrame): "Periodo", "Inicio" and "Fim", sorted by "Inicio".
+    Return:
+        df_extremos (DataFrame): "Periodo", "Minimo", "Tempo_Minimo", "Maximo"
+        and "Tempo_Maximo" of each period with rows.
+    """
+    valores = df_serie[coluna].to_numpy()
+    linhas = []
+    for nome, (de, ate) in zip(periodos["Periodo"], limites(df_serie.index, periodos)):
+        if de == ate:
+            continue
+        minimo = de + np.argmin(valores[de:ate])
+        maximo = de + np.argmax(valores[de:ate])
+        linhas.append({"Periodo": nome,
+                       "Minimo": valores[minimo], "Tempo_Minimo": df_serie.index[minimo],
+                       "Maximo": valores[maximo], "Tempo_Maximo": df_serie.index[maximo]})
+    return pd.DataFrame(linhas, columns=["Periodo", "Minimo", "Tempo_Minimo",
+                                         "Maximo", "Tempo_Maximo"])
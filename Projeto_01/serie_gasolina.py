@@ -0,0 +1,106 @@
+"""
+Autor: Matheus Silva
+Data: Maio 2022
+Este projeto monta a série temporal semestral do
+preço médio da gasolina a partir dos arquivos por
+região gerados em tratar_serie_historica.py. Quando
+a série já existe, apenas os semestres novos são
+acrescentados.
+
+Uso:
+    python serie_gasolina.py [pasta_dados] [caminho_serie]
+"""
+import logging
+import os
+import re
+import sys
+
+import pandas as pd
+
+PASTA_DADOS = "data/preco_gasolina_regioes/"
+CAMINHO_SERIE = "data/gasolina_precos-2004-2021.csv"
+
+PADRAO_ARQUIVO = re.compile(r"preco_gasolina_regioes_(\d{4})-0([12])\.csv")
+
+def data_semestre(nome_arquivo):
+    """Date that represents a semester file in the series.
+    Args:
+        nome_arquivo (str): e.g. "preco_gasolina_regioes_2021-02.csv".
+    Return:
+        Timestamp: June 1st for the first semester, December 1st for the
+        second one, None when the name is not a semester file.
+    """
+    semestre = PADRAO_ARQUIVO.fullmatch(nome_arquivo)
+    if semestre is None:
+        return None
+    mes = 6 if semestre.group(2) == "1" else 12
+    return pd.Timestamp(int(semestre.group(1)), mes, 1)
+
+def ler_total(file_path):
+    """Read the national mean price (the "Total" row) of a semester file.
+    Args:
+        file_path (str): per-region semester file.
+    Return:
+        float: mean gasoline price of the semester.
+    """
+    df_file = pd.read_csv(file_path)
+    return df_file.loc[df_file["Regiao_Sigla"] == "Total", "Preco_Media"].iloc[0]
+
+def montar_linhas(pasta_dados, datas_conhecidas=()):
+    """Series rows of the semester files not yet in the series.
+    Args:
+        pasta_dados (str): folder with the per-region files.
+        datas_conhecidas (iterable): dates already in the series.
+    Return:
+        df_linhas (DataFrame): "Tempo" and "Preco_Media", sorted by date.
+    """
+    conhecidas = set(datas_conhecidas)
+    linhas = []
+    for arquivo in os.listdir(pasta_dados):
+        tempo = data_semestre(arquivo)
+        if tempo is not None and tempo not in conhecidas:
+            linhas.append({"Tempo": tempo,
+                           "Preco_Media": ler_total(os.path.join(pasta_dados, arquivo))})
+    df_linhas = pd.DataFrame(linhas, columns=["Tempo", "Preco_Media"])
+    return df_linhas.sort_values("Tempo", ignore_index=True)
+
+def construir_serie(pasta_dados=PASTA_DADOS):
+    """Build the whole semester series from the per-region files.
+    Args:
+        pasta_dados (str): folder with the per-region files.
+    Return:
+        gasolina_precos (DataFrame): "Tempo" and "Preco_Media" per semester.
+    """
+    return montar_linhas(pasta_dados)
+
+def atualizar_serie(pasta_dados=PASTA_DADOS, caminho_serie=CAMINHO_SERIE):
+    """Append the new semesters to the saved series, building it when missing.
+    Args:
+        pasta_dados (str): folder with the per-region files.
+        caminho_serie (str): csv with the series.
+    Return:
+        gasolina_precos (DataFrame): the updated series.
+    """
+    try:
+        gasolina_precos = pd.read_csv(caminho_serie, parse_dates=["Tempo"])
+    except FileNotFoundError:
+        logging.info("%s not found, building the whole series", caminho_serie)
+        gasolina_precos = pd.DataFrame({"Tempo": pd.Series(dtype="datetime64[ns]"),
+                                        "Preco_Media": pd.Series(dtype=float)})
+
+    novas = montar_linhas(pasta_dados, gasolina_precos["Tempo"])
+    if novas.empty:
+        return gasolina_precos
+
+    if not gasolina_precos.empty and novas["Tempo"].min() > gasolina_precos["Tempo"].max():
+        # semestres novos no fim da série: basta acrescentar as linhas ao arquivo
+        novas.to_csv(caminho_serie, mode="a", header=False, index=False)
+        return pd.concat([gasolina_precos, novas], ignore_index=True)
+
+    gasolina_precos = pd.concat([gasolina_precos, novas], ignore_index=True)\
+                        .sort_values("Tempo", ignore_index=True)
+    gasolina_precos.to_csv(caminho_serie, index=False)
+    return gasolina_precos
+
+if __name__ == "__main__":
+    print(atualizar_serie(*sys.argv[1:3]))
@@ -0,0 +1,108 @@
+"""
+Autor: Matheus Silva
+Data: Maio 2022
+Este módulo lê as séries temporais do projeto (preço da
+gasolina, inflação e preços ajustados) uma única vez para
+um índice datetime64 ordenado e as combina pelo tempo,
+em vez de depender da ordem e do tamanho das linhas de
+cada csv.
+
+As séries podem ser alinhadas com uma junção "as-of"
+(cada linha recebe o último valor da outra série até a
+sua data) e convertidas entre as resoluções semestral,
+mensal e diária. Na resolução semestral cada semestre é
+representado pelo dia 1º de junho ou de dezembro, como
+nos arquivos gerados pelo tratamento dos dados.
+"""
+import numpy as np
+import pandas as pd
+
+from metricas import instrumentar
+
+RESOLUCOES = ["semestral", "mensal", "diaria"]
+FREQUENCIAS = {"mensal": "MS", "diaria": "D"}
+
+@instrumentar(arquivo=lambda args: args["caminho"])
+def ler_serie(caminho, coluna_tempo="Tempo"):
+    """Read a time series csv into a sorted datetime index.
+    Args:
+        caminho (str): csv path.
+        coluna_tempo (str): date column, with or without zero padding
+            (e.g. "2004-6-1" or "2004-06-01").
+    Return:
+        df_serie (DataFrame): the other columns, indexed by "Tempo".
+    """
+    df_serie = pd.read_csv(caminho)
+    df_serie[coluna_tempo] = pd.to_datetime(df_serie[coluna_tempo], format="%Y-%m-%d")
+    return df_serie.set_index(coluna_tempo).rename_axis("Tempo").sort_index()
+
+def chave_semestre(indice):
+    """Date that represents the semester of each date.
+    Args:
+        indice (DatetimeIndex): dates.
+    Return:
+        DatetimeIndex: June 1st for dates of the first semester and
+        December 1st for dates of the second one.
+    """
+    meses = np.where(indice.month <= 6, 6, 12)
+    return pd.DatetimeIndex(pd.to_datetime(pd.DataFrame({"year": indice.year, "month": meses,
+                                                         "day": 1})), name="Tempo")
+
+def resolucao(df_serie):
+    """Resolution of a series, inferred from the typical spacing of its dates.
+    Args:
+        df_serie (DataFrame): series indexed by date.
+    Return:
+        string: one of RESOLUCOES.
+    """
+    if len(df_serie) < 2:
+        return "diaria"
+    dias = np.median(np.diff(df_serie.index.to_numpy()).astype("timedelta64[D]").astype(int))
+    if dias >= 90:
+        return "semestral"
+    return "mensal" if dias >= 28 else "diaria"
+
+def reamostrar(df_serie, destino, agregacao="mean"):
+    """Convert a series to another resolution.
+    Coarser resolutions aggregate the rows of each period; finer ones
+    repeat the value of the period each new date falls in.
+    Args:
+        df_serie (DataFrame): series indexed by date, numeric columns.
+        destino (str): one of RESOLUCOES.
+        agregacao (str or dict): reduction used when the resolution gets
+            coarser, or column -> reduction.
+    Return:
+        df_serie (DataFrame): the series at the new resolution.
+    """
+    origem = resolucao(df_serie)
+    if RESOLUCOES.index(destino) <= RESOLUCOES.index(origem):
+        # mesma resolução ou mais grossa: agrega as linhas de cada período
+        if destino == "semestral":
+            return df_serie.groupby(chave_semestre(df_serie.index)).agg(agregacao)
+        return df_serie.resample(FREQUENCIAS[destino]).agg(agregacao).dropna(how="all")
+
+    inicio = df_serie.index[0] - pd.DateOffset(months=5) if origem == "semestral" \
+             else df_serie.index[0]
+    fim = df_serie.index[-1] + pd.offsets.MonthEnd(0)
+    datas = pd.date_range(inicio.replace(day=1), fim, freq=FREQUENCIAS[destino], name="Tempo")
+    if origem == "semestral":
+        # cada data recebe o valor do seu semestre
+        return df_serie.reindex(chave_semestre(datas)).set_axis(datas)
+    return df_serie.reindex(datas, method="ffill")
+
+def alinhar(df_esquerda, df_direita, tolerancia=None, direcao="backward"):
+    """As-of join of two series on their time index.
+    Args:
+        df_esquerda (DataFrame): series whose dates are kept.
+        df_direita (DataFrame): series whose columns are added.
+        tolerancia (str): largest gap accepted between matched dates,
+            e.g. "31D"; any gap when None.
+        direcao (str): "backward" takes the last right row up to each
+            date, "forward" the next one and "nearest" the closest.
+    Return:
+        df_alinhado (DataFrame): left rows with the matched right columns,
+        NaN where no right row is close enough.
+    """
+    return pd.merge_asof(df_esquerda, df_direita, left_index=True, right_index=True,
+                         direction=direcao,
+                         tolerance=pd.Timedelta(tolerancia) if tolerancia else None)
@@ -4,38 +4,50 @@ Data: Maio 2022
 Este projeto recebe os arquivos csv da database
 do governo federal sobre a série histórica do preço
 dos combustíveis e edita esses arquivos, agrupando
-as informações do valor de venda da gasolina por
-estado ou região.
+as informações do valor de venda da gasolina (ou de
+outros produtos, todos na mesma leitura) por estado
+ou região. As médias são obtidas do cubo de
+preços (cubo_precos.py): o cubo salvo do semestre é
+usado quando está atualizado e, se não estiver, o
+semestre é lido uma vez, do cache parquet
+(cache_parquet.py) ou do csv.
+
+Uso (processa todos os semestres em paralelo):
+    python tratar_serie_historica.py --workers 4
+    python tratar_serie_historica.py --produtos GASOLINA ETANOL "DIESEL S10" GNV
 """
 # pylint: disable = no-member
 
 # importando bibliotecas
+import argparse
+import functools
 import logging
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
+# read_data fica no cache_parquet, que o cubo_precos também usa; reexportado aqui
+from cache_parquet import read_data # pylint: disable=unused-import
+from cubo_precos import ler_cubo_semestre
+from metricas import ativar, instrumentar
 
-# configurando o logging
+# configurando o logging; os processos filhos acrescentam ao log do processo principal
 logging.basicConfig(
     filename="./results.log",
     level=logging.INFO,
-    filemode="w",
+    filemode="w" if multiprocessing.parent_process() is None else "a",
     format="%(name)s - %(levelname)s - %(message)s")
 
-# lendo csv
-def read_data(file_path):
-    """Read data from csv.
-    Args:
-        file_path (str): file path to read.
-    Return:
-        df_file (DataFrame): returns the file read as a dataframe.
-    """
-    try:
-        df_file = pd.read_csv(file_path, sep = ";", encoding="ISO-8859-1")
-        return df_file
-    except: # pylint: disable=bare-except
-        logging.error("Error read_csv. We were not able to find %s", file_path)
-        return pd.Dataframe()
+PASTA_DADOS = "data/serie_historica_combustiveis/"
+PASTA_ESTADOS = "data/preco_gasolina_estados/"
+PASTA_REGIOES = "data/preco_gasolina_regioes/"
+
+PRODUTOS_PADRAO = ("GASOLINA",)
 
 # escrevendo csv
+@instrumentar()
 def write_data(df_file, file_path):
     """Write data to csv.
     Args:
@@ -47,66 +59,269 @@ def write_data(df_file, file_path):
     except: # pylint: disable=bare-except
         logging.error("Error to_csv. We were not able to find %s", file_path)
 
-def sh_estado(nome_csv, pasta_dados, pasta_destino):
-    """Csv file of fuel prices grouped by states.
+def nome_saida(nome_csv, tipo, produto=None):
+    """Name of an output file of a semester.
     Args:
-        nome_csv (str): file to read.
-        pasta_dados (str): folder path with the data.
-        pasta_destino (str): destination folder path.
+        nome_csv (str): semester file name, e.g. "ca-2021-02.csv".
+        tipo (str): "estados" or "regioes".
+        produto (str): product of a per-product file, e.g. "DIESEL S10";
+            None for the long-format file holding every product.
     Return:
-        string: success message.
+        string: e.g. "preco_diesel_s10_estados_2021-02.csv", or
+        "precos_estados_2021-02.csv" for the long format.
     """
-    df_combustiveis = read_data(pasta_dados + nome_csv)
+    if produto is None:
+        return "precos_" + tipo + "_" + nome_csv[3:]
+    return "preco_" + produto.lower().replace(" ", "_") + "_" + tipo + "_" + nome_csv[3:]
 
-    df_combustiveis = df_combustiveis.rename(columns={df_combustiveis.columns[0]: "Regiao - Sigla"})
+def nomes_saida(nome_csv, tipo, produtos, longo=False):
+    """Every output file name of a semester, see nome_saida."""
+    return [nome_saida(nome_csv, tipo)] if longo else \
+           [nome_saida(nome_csv, tipo, produto) for produto in produtos]
 
-    df_combustiveis["Valor de Venda"] = df_combustiveis["Valor de Venda"]\
-                                        .str.replace(",",".").astype(float)
-    df_combustiveis = df_combustiveis[df_combustiveis["Produto"] == "GASOLINA"]
+def agrupar_produtos(df_cubo, produtos, coluna_grupo, coluna_destino):
+    """Mean price per product and group from the cube sums and counts,
+    computed for every product in one grouped reduction.
+    Args:
+        df_cubo (DataFrame): semester cube cells (cubo_precos.py).
+        produtos (list): products to aggregate, e.g. ["GASOLINA", "ETANOL"].
+        coluna_grupo (str): column to group by, e.g. "Estado - Sigla".
+        coluna_destino (str): name of the group column in the output.
+    Return:
+        df_grupos (DataFrame): "Produto", coluna_destino and "Preco_Media",
+        each product followed by its overall "Total" row. Products that do
+        not occur in the semester are left out.
+    """
+    df_cubo = df_cubo[df_cubo["Produto"].isin(produtos)]
+    somas = df_cubo.groupby(["Produto", coluna_grupo], observed=True)[["Soma", "Contagem"]].sum()
+    precos = (somas["Soma"] / somas["Contagem"] / 1000).round(2)
+    totais = somas.groupby(level=0, observed=True).sum()
 
-    df_estados = df_combustiveis.groupby("Estado - Sigla")[["Valor de Venda"]].mean().round(2)\
-                 .reset_index()
-    df_estados = df_estados.rename(columns = {"Estado - Sigla": "Estado_Sigla",
-                                              "Valor de Venda": "Preco_Media"})
+    partes = [pd.DataFrame(columns=["Produto", coluna_destino, "Preco_Media"])]
+    for produto in produtos:
+        if produto not in totais.index:
+            continue
+        precos_produto = precos.loc[produto]
+        partes.append(pd.DataFrame({"Produto": produto,
+                                    coluna_destino: precos_produto.index.astype(str),
+                                    "Preco_Media": precos_produto.values}))
+        partes.append(pd.DataFrame([{"Produto": produto, coluna_destino: "Total",
+                                     "Preco_Media": round(totais.loc[produto, "Soma"] /
+                                                          totais.loc[produto, "Contagem"] /
+                                                          1000, 2)}]))
+    return pd.concat(partes, ignore_index = True)
 
-    nova_linha = {"Estado_Sigla": "Total", "Preco_Media":
-                  round(df_combustiveis["Valor de Venda"].mean(), 2)}
-    df_estados = df_estados.append(nova_linha, ignore_index = True)
+def escrever_saidas(df_grupos, nome_csv, tipo, pasta_destino, longo=False):
+    """Write the aggregation of a semester, one file per product or a
+    single long-format file with the "Produto" column.
+    Args:
+        df_grupos (DataFrame): output of agrupar_produtos.
+        nome_csv (str): semester file name.
+        tipo (str): "estados" or "regioes".
+        pasta_destino (str): destination folder path.
+        longo (bool): write the long-format file.
+    Return:
+        nomes (list): names of the files written.
+    """
+    if longo:
+        nome_arquivo = nome_saida(nome_csv, tipo)
+        write_data(df_grupos, pasta_destino + nome_arquivo)
+        return [nome_arquivo]
 
-    nome_arquivo = "preco_gasolina_estados_" + nome_csv[3:]
+    nomes = []
+    for produto, df_produto in df_grupos.groupby("Produto", sort=False):
+        nomes.append(nome_saida(nome_csv, tipo, produto))
+        write_data(df_produto.drop(columns="Produto"), pasta_destino + nomes[-1])
+    return nomes
 
-    write_data(df_estados, pasta_destino + nome_arquivo)
+@instrumentar(arquivo=lambda args: args["pasta_dados"] + args["nome_csv"])
+def sh_estado(nome_csv, pasta_dados, pasta_destino, *, produtos=PRODUTOS_PADRAO, longo=False):
+    """Csv file of fuel prices grouped by states.
+    Args:
+        nome_csv (str): file to read.
+        pasta_dados (str): folder path with the data.
+        pasta_destino (str): destination folder path.
+        produtos (list): products to aggregate, only gasoline by default.
+        longo (bool): one long-format file instead of one file per product.
+    Return:
+        string: success message.
+    """
+    df_cubo = ler_cubo_semestre(pasta_dados + nome_csv, produtos=produtos)
+    df_estados = agrupar_produtos(df_cubo, produtos, "Estado - Sigla", "Estado_Sigla")
+    nomes = escrever_saidas(df_estados, nome_csv, "estados", pasta_destino, longo)
 
-    return "Escrevendo " + nome_arquivo + " na pasta " + pasta_destino
+    return "Escrevendo " + ", ".join(nomes) + " na pasta " + pasta_destino
 
-def sh_regiao(nome_csv, pasta_dados, pasta_destino):
+@instrumentar(arquivo=lambda args: args["pasta_dados"] + args["nome_csv"])
+def sh_regiao(nome_csv, pasta_dados, pasta_destino, *, produtos=PRODUTOS_PADRAO, longo=False):
     """Csv file of fuel prices grouped by regions.
     Args:
         nome_csv (str): file to read.
         pasta_dados (str): folder path with the data.
         pasta_destino (str): destination folder path.
+        produtos (list): products to aggregate, only gasoline by default.
+        longo (bool): one long-format file instead of one file per product.
     Return:
         string: success message.
     """
-    df_combustiveis = read_data(pasta_dados + nome_csv)
+    df_cubo = ler_cubo_semestre(pasta_dados + nome_csv, produtos=produtos)
+    df_regioes = agrupar_produtos(df_cubo, produtos, "Regiao - Sigla", "Regiao_Sigla")
+    nomes = escrever_saidas(df_regioes, nome_csv, "regioes", pasta_destino, longo)
 
-    df_combustiveis = df_combustiveis.rename(columns={df_combustiveis.columns[0]: "Regiao - Sigla"})
+    return "Escrevendo " + ", ".join(nomes) + " na pasta " + pasta_destino
 
-    df_combustiveis["Valor de Venda"] = df_combustiveis["Valor de Venda"]\
-                                        .str.replace(",",".").astype(float)
-    df_combustiveis = df_combustiveis[df_combustiveis["Produto"] == "GASOLINA"]
+@instrumentar(arquivo=lambda args: args["pasta_dados"] + args["nome_csv"])
+def sh_estado_regiao(nome_csv, pasta_dados, pasta_estados, pasta_regioes, # pylint: disable=too-many-arguments
+                     *, tamanho_bloco=None, produtos=PRODUTOS_PADRAO, longo=False):
+    """Csv files of fuel prices grouped by states and by regions,
+    reading the semester file only once for every product.
+    Args:
+        nome_csv (str): file to read.
+        pasta_dados (str): folder path with the data.
+        pasta_estados (str): destination folder path for the states files.
+        pasta_regioes (str): destination folder path for the regions files.
+        tamanho_bloco (int): when given, the file is streamed in chunks of
+            this many rows instead of being loaded whole.
+        produtos (list): products to aggregate, only gasoline by default.
+        longo (bool): one long-format file per grouping instead of one
+            file per product.
+    Return:
+        string: success message.
+    """
+    df_cubo = ler_cubo_semestre(pasta_dados + nome_csv, tamanho_bloco, produtos=produtos)
+    df_estados = agrupar_produtos(df_cubo, produtos, "Estado - Sigla", "Estado_Sigla")
+    df_regioes = agrupar_produtos(df_cubo, produtos, "Regiao - Sigla", "Regiao_Sigla")
+
+    nomes_estados = escrever_saidas(df_estados, nome_csv, "estados", pasta_estados, longo)
+    nomes_regioes = escrever_saidas(df_regioes, nome_csv, "regioes", pasta_regioes, longo)
 
-    df_regioes = df_combustiveis.groupby("Regiao - Sigla")[["Valor de Venda"]].mean().round(2)\
-                 .reset_index()
-    df_regioes = df_regioes.rename(columns = {"Regiao - Sigla": "Regiao_Sigla",
-                                              "Valor de Venda": "Preco_Media"})
+    return "Escrevendo " + ", ".join(nomes_estados) + " na pasta " + pasta_estados + \
+           " e " + ", ".join(nomes_regioes) + " na pasta " + pasta_regioes
 
-    nova_linha = {"Regiao_Sigla": "Total", "Preco_Media":
-                  round(df_combustiveis["Valor de Venda"].mean(), 2)}
-    df_regioes = df_regioes.append(nova_linha, ignore_index = True)
+def desatualizado(nome_csv, pasta_dados, pasta_estados, pasta_regioes, # pylint: disable=too-many-arguments
+                  *, produtos=PRODUTOS_PADRAO, longo=False):
+    """Check whether the outputs of a semester must be rebuilt.
+    Args:
+        nome_csv (str): semester file name.
+        pasta_dados (str): folder path with the data.
+        pasta_estados (str): destination folder path for the states files.
+        pasta_regioes (str): destination folder path for the regions files.
+        produtos (list): products aggregated.
+        longo (bool): whether the long-format files are written.
+    Return:
+        bool: True when an output is missing or older than its input.
+    """
+    mtime_origem = os.path.getmtime(pasta_dados + nome_csv)
+    destinos = [pasta_estados + nome for nome in
+                nomes_saida(nome_csv, "estados", produtos, longo)] + \
+               [pasta_regioes + nome for nome in
+                nomes_saida(nome_csv, "regioes", produtos, longo)]
+    for destino in destinos:
+        if not os.path.exists(destino) or os.path.getmtime(destino) < mtime_origem:
+            return True
+    return False
+
+def semestres_pendentes(pasta_dados, pasta_estados, pasta_regioes, *, # pylint: disable=too-many-arguments
+                        forcar=False, produtos=PRODUTOS_PADRAO, longo=False):
+    """List the semester files of the folder whose outputs must be rebuilt.
+    Args:
+        pasta_dados (str): folder path with the data.
+        pasta_estados (str): destination folder path for the states files.
+        pasta_regioes (str): destination folder path for the regions files.
+        forcar (bool): also list semesters whose outputs are up to date.
+        produtos (list): products aggregated.
+        longo (bool): whether the long-format files are written.
+    Return:
+        pendentes (list): semester file names, in semester order.
+    """
+    arquivos = sorted(arquivo for arquivo in os.listdir(pasta_dados)
+                      if re.fullmatch(r"ca-\d{4}-0[12]\.csv", arquivo))
+    pendentes = [arquivo for arquivo in arquivos if forcar or
+                 desatualizado(arquivo, pasta_dados, pasta_estados, pasta_regioes,
+                               produtos=produtos, longo=longo)]
+    for arquivo in sorted(set(arquivos) - set(pendentes)):
+        logging.info("%s ignorado, saídas mais novas que a entrada", arquivo)
+    return pendentes
+
+def processar_semestre(nome_csv, pasta_dados, pasta_estados, pasta_regioes, # pylint: disable=too-many-arguments
+                       *, tamanho_bloco=None, produtos=PRODUTOS_PADRAO, longo=False):
+    """Run sh_estado_regiao for one semester, measuring its wall time.
+    Args:
+        nome_csv (str): file to read.
+        pasta_dados (str): folder path with the data.
+        pasta_estados (str): destination folder path for the states files.
+        pasta_regioes (str): destination folder path for the regions files.
+        tamanho_bloco (int): chunk size, None to read the file whole.
+        produtos (list): products to aggregate.
+        longo (bool): write long-format files.
+    Return:
+        tuple: (nome_csv, success message, seconds).
+    """
+    inicio = time.perf_counter()
+    mensagem = sh_estado_regiao(nome_csv, pasta_dados, pasta_estados, pasta_regioes,
+                                tamanho_bloco=tamanho_bloco, produtos=produtos, longo=longo)
+    return nome_csv, mensagem, time.perf_counter() - inicio
+
+def processar_serie(pasta_dados=PASTA_DADOS, pasta_estados=PASTA_ESTADOS, # pylint: disable=too-many-arguments
+                    pasta_regioes=PASTA_REGIOES, workers=None, *, tamanho_bloco=None,
+                    forcar=False, produtos=PRODUTOS_PADRAO, longo=False):
+    """Aggregate every semester of the folder in a process pool.
+    Args:
+        pasta_dados (str): folder path with the data.
+        pasta_estados (str): destination folder path for the states files.
+        pasta_regioes (str): destination folder path for the regions files.
+        workers (int): worker processes, os.cpu_count() when None.
+        tamanho_bloco (int): chunk size, None to read each file whole.
+        forcar (bool): rebuild outputs that are already up to date.
+        produtos (list): products to aggregate.
+        longo (bool): write long-format files.
+    Return:
+        resultados (list): (nome_csv, message, seconds) in semester order.
+    """
+    pendentes = semestres_pendentes(pasta_dados, pasta_estados, pasta_regioes,
+                                    forcar=forcar, produtos=produtos, longo=longo)
+    inicio = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        resultados = list(executor.map(functools.partial(
+            processar_semestre, pasta_dados=pasta_dados, pasta_estados=pasta_estados,
+            pasta_regioes=pasta_regioes, tamanho_bloco=tamanho_bloco, produtos=produtos,
+            longo=longo), pendentes))
+    for nome_csv, _, segundos in resultados:
+        logging.info("%s processado em %.2f s", nome_csv, segundos)
+    logging.info("%d semestres processados em %.2f s", len(resultados),
+                 time.perf_counter() - inicio)
+    return resultados
 
-    nome_arquivo = "preco_gasolina_regioes_" + nome_csv[3:]
+def main():
+    """Aggregate the whole historical series from the command line."""
+    parser = argparse.ArgumentParser(description="Preço médio dos combustíveis por estado "
+                                                 "e região de cada semestre.")
+    parser.add_argument("--dados", default=PASTA_DADOS)
+    parser.add_argument("--estados", default=PASTA_ESTADOS)
+    parser.add_argument("--regioes", default=PASTA_REGIOES)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--bloco", type=int, default=None,
+                        help="linhas por bloco no modo em blocos")
+    parser.add_argument("--forcar", action="store_true",
+                        help="refaz também as saídas atualizadas")
+    parser.add_argument("--produtos", nargs="+", default=list(PRODUTOS_PADRAO),
+                        help='produtos agregados na mesma leitura, ex.: GASOLINA ETANOL '
+                             '"DIESEL S10" GNV')
+    parser.add_argument("--longo", action="store_true",
+                        help="um único arquivo com a coluna Produto em vez de um por produto")
+    parser.add_argument("--metricas", action="store_true",
+                        help="grava a medida de cada etapa no results.log")
+    parser.add_argument("--memoria", action="store_true",
+                        help="com --metricas, mede também o pico de memória")
+    args = parser.parse_args()
+    if args.metricas:
+        ativar(args.memoria)
 
-    write_data(df_regioes, pasta_destino + nome_arquivo)
+    for _, mensagem, segundos in processar_serie(args.dados, args.estados, args.regioes,
+                                                 args.workers, tamanho_bloco=args.bloco,
+                                                 forcar=args.forcar, produtos=args.produtos,
+                                                 longo=args.longo):
+        print(f"{mensagem} ({segundos:.2f} s)")
 
-    return "Escrevendo " + nome_arquivo + " na pasta " + pasta_destino
+if __name__ == "__main__":
+    main()